@@ -21,13 +21,15 @@ from gym.envs.registration import register
 
 from .strategy import BTgymBaseStrategy
 from .server import BTgymServer
-from .datafeed import BTgymDataset, BTgymRandomDataDomain, BTgymSequentialDataDomain
+from .datafeed import BTgymDataset, BTgymRandomDataDomain, BTgymSequentialDataDomain, BTgymSyntheticDataDomain
+from .datafeed import BTgymTickDataDomain
 from .datafeed import DataSampleConfig, EnvResetConfig
 from .dataserver import BTgymDataFeedServer
 # from .monitor import BTgymMonitor
 from .rendering import BTgymRendering
 from .spaces import DictSpace
 from .envs.backtrader import BTgymEnv
+from .envs.vector import BTgymVecEnv
 
 register(
     id='backtrader-v0000',
@@ -33,6 +33,7 @@ import numpy as np
 import copy
 
 from btgym.algorithms.worker import Worker
+from btgym.protocol import make_address, clear_address
 from btgym.algorithms.aac import A3C
 from btgym.algorithms.policy import BaseAacPolicy
 
@@ -88,6 +89,9 @@ class Launcher():
                                 - 'num_envs':     number of environments to run in parallel for each worker, def: 1
                                 - 'log_dir':      directory to save model and summaries, def: './tmp/btgym_aac_log'
 
+            Set `data_shards` env. kwarg to split dataset among several data servers by time range,
+            those get started by data-master environment at `data_port`, `data_port - 1`, ... .
+
         """
 
         self.env_config = dict(
@@ -187,8 +191,14 @@ class Launcher():
         # Configure workers:
         self.workers_config_list = self.make_workers_spec()
 
-        # Ensure data_server port is clear:
-        self.clear_port(self.env_config['kwargs']['data_port'])
+        # Ensure data_server ports are clear, one per dataset shard:
+        self.clear_env_port(
+            [
+                self.env_config['kwargs']['data_port'] - shard
+                for shard in range(self.env_config['kwargs'].get('data_shards', 1))
+            ],
+            address_key='data_network_address',
+        )
 
         self.log.debug('Launcher ready.')
 
@@ -244,7 +254,7 @@ class Launcher():
                         'random_seed': self.workers_rnd_seeds.pop()
                     }
                 )
-                self.clear_port(env_config['kwargs']['port'])
+                self.clear_env_port(env_config['kwargs']['port'])
                 workers_config_list.append(worker_config)
                 task_index += 1
 
@@ -288,6 +298,25 @@ class Launcher():
                 p = psutil.Popen(['kill', pid])
                 self.log.info('port {} cleared'.format(port))
 
+    def clear_env_port(self, port_list, address_key='network_address'):
+        """
+        Kills process holding environment server or data_server endpoint on specified ports list, if any.
+        Endpoint address is composed same way environment does: Unix domain socket for local host by default.
+
+        Args:
+            port_list:      port or list of ports;
+            address_key:    str, environment address attribute: `network_address` or `data_network_address`.
+        """
+        if not isinstance(port_list, list):
+            port_list = [port_list]
+
+        env_class = self.env_config['class_ref']
+        address = self.env_config['kwargs'].get(address_key, getattr(env_class, address_key, 'tcp://127.0.0.1:'))
+        transport = self.env_config['kwargs'].get('transport', getattr(env_class, 'transport', 'auto'))
+
+        for port in port_list:
+            clear_address(make_address(address, port, transport), port)
+
     def _update_config_dict(self, old_dict, new_dict=None):
         """
         Service, updates nested dictionary with values from other one of same structure.
@@ -21,3 +21,5 @@
 from .base import BTgymBaseData, DataSampleConfig, EnvResetConfig
 from .derivative import BTgymEpisode, BTgymDataTrial, BTgymRandomDataDomain, BTgymDataset
 from .stateful import BTgymSequentialDataDomain
+from .synthetic import BTgymSyntheticDataDomain
+from .ticks import BTgymTickDataDomain
@@ -20,15 +20,58 @@
 from logbook import Logger, StreamHandler, WARNING
 
 import datetime
-import random
-from numpy.random import beta as random_beta
 import copy
+import io
 import os
 import sys
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import backtrader.feeds as btfeeds
+import numpy as np
 import pandas as pd
 
+from .cache import cache_key, read_frame, write_frame
+from .shared import create_segment, attach_segment, detach_segment, release_segment
+from .chunked import ChunkedDataFrame, write_chunks, list_chunks
+from .stats import RangeStat
+from .features import compute_features, features_cache_key, features_feed_class
+from .feeds import BTgymArrayData
+
+def parse_csv_file(filename, csv_params, cache_path=None, dtype=None):
+    """
+    Parses single source file: CSV file --> pandas dataframe, duplicate records removed.
+    Top-level function, so it can run in worker process.
+
+    Args:
+        filename:       csv data filename as string;
+        csv_params:     dict of pandas.read_csv kwargs;
+        cache_path:     str or None, if given - dataframe is stored as binary cache entry instead of being returned;
+        dtype:          float type to cast data columns to, None - keep parsed types.
+
+    Returns:
+        dataframe or None if cached, number of duplicated records removed.
+    """
+    dataframe = pd.read_csv(filename, **csv_params)
+
+    # Check and remove duplicate datetime indexes:
+    duplicates = dataframe.index.duplicated(keep='first')
+    how_bad = int(duplicates.sum())
+    if how_bad > 0:
+        dataframe = dataframe[~duplicates]
+
+    if dtype is not None:
+        dataframe = dataframe.astype(dtype, copy=False)
+
+    if cache_path is not None:
+        write_frame(cache_path, dataframe)
+        return None, how_bad
+
+    return dataframe, how_bad
+
+
 DataSampleConfig = dict(
     get_new=True,
     sample_type=0,
@@ -73,6 +116,10 @@ class BTgymBaseData:
             name='base_data',
             task=0,
             log_level=WARNING,
+            cache_dir=None,
+            chunked=False,
+            chunk_size=1000000,
+            compact=False,
             _config_stack=None,
             **kwargs
     ):
@@ -100,6 +147,14 @@ class BTgymBaseData:
             close:                          4
             volume:                         -1
             openinterest:                   -1
+            pyramid:                        None - optional list of coarser timeframes in minutes, e.g. [5, 15, 60, 1440]:
+                                            for every one, in-progress coarse bar OHLC[V] values are computed once per
+                                            dataset for every record and added as `open_5m, high_5m, ...` columns;
+                                            samples carry those along and expose them as extra feeds named `5m`, ...
+            features:                       None - optional dict of features specifications, e.g.
+                                            {'sma_4': {'type': 'sma', 'period': 4}}, see `features` module:
+                                            computed once per dataset, stored as extra columns (and in `cache_dir`),
+                                            exposed by sample bt.feeds as data lines of same names.
 
             specific_params Sampling
 
@@ -123,6 +178,20 @@ class BTgymBaseData:
                                             [0_record<-train_data->split_point_record<-test_data->last_record].
             sample_expanding:               None, reserved for child classes.
 
+            cache_dir:                      str or None, if given - parsed source files are stored in this directory
+                                            as memory-mappable binary arrays and loaded from there unless source file
+                                            or parsing params change.
+
+            chunked:                        bool, if True - keep data out of memory: source files are parsed
+                                            in pieces of `chunk_size` records and stored in `cache_dir`
+                                            (system temporary directory by default); only records covering
+                                            requested samples are read.
+            chunk_size:                     int, number of records per chunk.
+
+            compact:                        bool, if True - data columns are stored as float32 instead of float64:
+                                            halves memory, cache, shared segments and trials transfer size;
+                                            ample precision for price data.
+
         Note:
             - CSV file can contain duplicate records, checks will be performed and all duplicates will be removed;
 
@@ -189,8 +258,16 @@ class BTgymBaseData:
         self.name = name
         self.task = task
         self.log_level = log_level
+        self.cache_dir = cache_dir
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.compact = compact
 
         self.data = None  # Will hold actual data as pandas dataframe
+        self.segment = None  # Shared data segment descriptor: dict(path, first_row, last_row), if any
+        self._segment_owner = False
+        self._retired_segment = None  # Segment replaced on last append, kept for samples already sent
+        self._source_offsets = dict()  # {source filename: number of bytes read}
         self.is_ready = False
         self.data_stat = None  # Dataset descriptive statistic as pandas dataframe
         self.data_range_delta = None  # Dataset total duration timedelta
@@ -199,6 +276,10 @@ class BTgymBaseData:
         self.max_sample_len_delta = None
         self.sample_duration = None
         self.sample_num_records = 0
+        self.sample_index = None  # Valid sample start rows, sorted
+        self._rng = None  # Sampling random generator, created on first use
+        self.range_stat = None  # Precomputed statistic over own data
+        self.parent_stat = None  # (parent range_stat, first row offset) for samples
         self.start_weekdays = None
         self.start_00 = None
         self.expanding = None
@@ -216,6 +297,12 @@ class BTgymBaseData:
         self.sample_num = 0
         self.task = 0
         self.metadata = {'sample_num': 0, 'type': None}
+        self.pyramid = None
+        self.features = None
+        self.shard = None  # (shard_index, num_shards) of domain to hold, if any
+        self.shard_starts = None  # [first, last) valid sample starts owned by shard, as source data rows
+        self.shard_interval = None  # [first, last) source data rows held by shard
+        self.source_num_records = None  # Number of source data records, if sharded
 
         self.set_params(self.parsing_params)
         self.set_params(self.sampling_params)
@@ -277,6 +364,128 @@ class BTgymBaseData:
         if level is not None:
             self.log = Logger('{}_{}'.format(self.name, self.task), level=level)
 
+    def __getstate__(self):
+        """
+        Instances backed by shared data segment get pickled as lightweight descriptors,
+        data itself is not copied.
+        """
+        state = self.__dict__.copy()
+        # Only part of parent statistic covering own data is passed along, statistic data rows never are:
+        if self.parent_stat is not None and self.data is not None:
+            range_stat, first_row = self.parent_stat
+            state['parent_stat'] = (range_stat.slice(first_row, first_row + self.data.shape[0]), first_row)
+
+        if self.segment is not None:
+            state['data'] = None
+            state['_segment_owner'] = False
+            state['_retired_segment'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.segment is not None:
+            self.data = self._segment_data()
+
+        if self.data is not None:
+            if self.parent_stat is not None:
+                self.parent_stat[0].attach(self.data, origin=self.parent_stat[-1])
+
+            if self.range_stat is not None:
+                self.range_stat.attach(self.data)
+
+    def share(self, segment_dir=None):
+        """
+        Moves instance data to shared memory segment. Since then, instance itself and every sample derived from it
+        are passed between processes as (segment, first_row, last_row) descriptors and attached as data views
+        on receiving side. Receiving side should run on same host.
+
+        Args:
+            segment_dir:    str, directory to place segment in, def. is shared memory filesystem.
+
+        Returns:
+            segment descriptor as dictionary.
+        """
+        try:
+            assert self.data is not None and not self.data.empty
+
+        except AssertionError:
+            self.log.exception('Instance holds no data. Hint: forgot to call .read_csv()?')
+            raise AssertionError
+
+        if self.segment is not None:
+            self.log.debug('Data is already shared as <{}>.'.format(self.segment['path']))
+            return self.segment
+
+        if isinstance(self.data, ChunkedDataFrame):
+            self.log.warning('Chunked data is memory-mapped from disk already, not shared.')
+            return None
+
+        path = create_segment(self.data, name=self.name, segment_dir=segment_dir)
+        self.segment = dict(path=path, first_row=0, last_row=self.data.shape[0])
+        self._segment_owner = True
+        self.data = self._segment_data()
+        self.log.info('Data moved to shared segment <{}>.'.format(path))
+
+        return self.segment
+
+    def unshare(self):
+        """
+        Detaches instance from shared data segment and removes segment if it has been created by this instance.
+        Data already loaded remains available to instance.
+        """
+        if self.segment is not None:
+            if self._segment_owner:
+                release_segment(self.segment['path'])
+                self.log.info('Shared segment <{}> released.'.format(self.segment['path']))
+
+            else:
+                detach_segment(self.segment['path'])
+
+        if self._retired_segment is not None:
+            release_segment(self._retired_segment)
+
+        self.segment = None
+        self._segment_owner = False
+        self._retired_segment = None
+
+    def _segment_data(self):
+        """
+        Returns:
+            dataframe view of shared data segment instance is backed by.
+        """
+        return attach_segment(self.segment['path'])[self.segment['first_row']: self.segment['last_row']]
+
+    def _sample_stat(self, first_row):
+        """
+        Returns:
+            (range statistic, offset) pair to describe sample starting at first_row of instance data with,
+            if there is one; None otherwise.
+        """
+        if self.parent_stat is not None:
+            return self.parent_stat[0], self.parent_stat[-1] + first_row
+
+        elif self.range_stat is not None:
+            return self.range_stat, first_row
+
+        else:
+            return None
+
+    def _sample_segment(self, first_row, last_row):
+        """
+        Returns:
+            shared segment descriptor for sample of [first_row, last_row) rows of instance data, if shared; None otherwise.
+        """
+        if self.segment is None:
+            return None
+
+        else:
+            return dict(
+                path=self.segment['path'],
+                first_row=self.segment['first_row'] + first_row,
+                last_row=self.segment['first_row'] + last_row,
+            )
+
     def reset(self, data_filename=None, **kwargs):
         """
         Gets instance ready.
@@ -306,7 +515,15 @@ class BTgymBaseData:
         self.train_range_delta = datetime.timedelta(**self.sample_duration) - datetime.timedelta(**self.test_period)
 
         self.test_num_records = round(self.test_range_delta.total_seconds() / (60 * self.timeframe))
-        self.train_num_records = self.data.shape[0] - self.test_num_records
+
+        # Intervals are set over source data, shard gets them mapped to rows it holds:
+        if self.shard_interval is None:
+            num_records = self.data.shape[0]
+
+        else:
+            num_records = self.source_num_records
+
+        self.train_num_records = num_records - self.test_num_records
 
         break_point = self.train_num_records
 
@@ -332,11 +549,265 @@ class BTgymBaseData:
                 raise AssertionError
 
         self.train_interval = [0, break_point]
-        self.test_interval = [break_point, self.data.shape[0]]
+        self.test_interval = [break_point, num_records]
+
+        self.prepare()
 
         self.sample_num = 0
         self.is_ready = True
 
+    def prepare(self):
+        """
+        Precomputes data-dependent structures used for sampling and describing:
+        valid sample starts table and range statistic over in-memory data.
+        Called on reset; override to add more.
+        """
+        self._build_sample_index()
+
+        if self.shard is not None:
+            self._select_shard()
+
+        if self.range_stat is None and self.parent_stat is None and isinstance(self.data, pd.DataFrame):
+            self.range_stat = RangeStat(self.data)
+
+    def _build_sample_index(self, first_row=0):
+        """
+        Builds table of valid sample start rows, i.e. ones satisfying `start_weekdays`, `start_00` and `time_gap`
+        conditions for sample of `sample_num_records` length. Computed once per reset over int64 timestamps,
+        so drawing a sample start is a single lookup.
+
+        Args:
+            first_row:  int, if positive - only starts from this row on are (re)computed, earlier ones are kept.
+        """
+        num_records = self.data.shape[0]
+        sample_num_records = max(self.sample_num_records, 1)
+        stamps = np.asarray(self.data.index.values, dtype='datetime64[ns]').view(np.int64)
+        day = pd.Timedelta(days=1).value
+
+        # 01.01.1970 is Thursday:
+        weekday_match = np.isin((stamps[first_row:] // day + 3) % 7, list(self.start_weekdays))
+
+        if self.start_00:
+            # Every record maps to first record of that day:
+            first_rows = np.searchsorted(stamps, stamps[first_row:] - stamps[first_row:] % day, side='left')
+
+        else:
+            first_rows = np.arange(first_row, num_records)
+
+        first_rows = np.unique(first_rows[weekday_match])
+        first_rows = first_rows[(first_rows >= first_row) & (first_rows <= num_records - sample_num_records)]
+
+        sample_len = stamps[first_rows + sample_num_records - 1] - stamps[first_rows]
+        time_gap = sample_len - pd.Timedelta(self.max_sample_len_delta).value
+        sample_index = first_rows[time_gap < pd.Timedelta(self.max_time_gap).value]
+
+        if first_row > 0 and self.sample_index is not None:
+            sample_index = np.concatenate([self.sample_index[self.sample_index < first_row], sample_index])
+
+        self.sample_index = sample_index
+
+        self.log.debug(
+            'Valid sample starts: {} of {} records.'.format(self.sample_index.shape[0], num_records)
+        )
+
+    def set_shard(self, index, num_shards):
+        """
+        Makes instance hold only a time-range shard of the domain, taking effect on next reset:
+        valid sample starts are split into `num_shards` time-contiguous parts of equal size and instance keeps
+        part `index` of those along with records samples starting there span; rest of data gets released.
+        Sampling from shard chosen with probability proportional to its `sample_weights()` preserves domain
+        sampling distribution.
+
+        Args:
+            index:      int, shard number in [0, num_shards);
+            num_shards: int, number of shards domain is split into.
+        """
+        assert 0 <= index < num_shards, 'Expected shard index in [0, {}), got: {}'.format(num_shards, index)
+
+        if (index, num_shards) != self.shard and self.shard_interval is not None:
+            # Source data is needed to split it other way:
+            self.data = None
+            self.shard_interval = None
+
+        self.shard = (index, num_shards)
+        self.is_ready = False
+
+    def _select_shard(self):
+        """
+        Restricts valid sample starts to ones owned by shard, trims data to rows they span if data has just been
+        loaded and maps train/test intervals to rows held.
+        """
+        index, num_shards = self.shard
+        if self.shard_interval is None:
+            bounds = np.linspace(0, self.sample_index.shape[0], num_shards + 1).astype(int)
+            starts = self.sample_index[bounds[index]: bounds[index + 1]]
+
+            if starts.shape[0] == 0:
+                msg = 'Shard {} of {} holds no valid sample start, use fewer shards.'.format(index, num_shards)
+                self.log.error(msg)
+                raise RuntimeError(msg)
+
+            self.shard_starts = [int(starts[0]), int(starts[-1]) + 1]
+            self.source_num_records = self.data.shape[0]
+
+            if isinstance(self.data, ChunkedDataFrame):
+                # Chunks are kept on disk anyway:
+                self.shard_interval = [0, self.source_num_records]
+
+            else:
+                self.shard_interval = [
+                    self.shard_starts[0],
+                    min(self.shard_starts[-1] - 1 + max(self.sample_num_records, 1), self.source_num_records)
+                ]
+                self.unshare()
+                self.range_stat = None
+                self.data = self.data[self.shard_interval[0]: self.shard_interval[-1]].copy()
+                self.data_range_delta = (self.data.index[-1] - self.data.index[0]).to_pytimedelta()
+
+            self.sample_index = starts - self.shard_interval[0]
+            self.log.info(
+                'Shard {} of {}: {} valid sample starts, holds records {} to {} of {}.'.format(
+                    index,
+                    num_shards,
+                    starts.shape[0],
+                    self.shard_interval[0],
+                    self.shard_interval[-1],
+                    self.source_num_records,
+                )
+            )
+
+        else:
+            # Starts table is built over rows held, keep owned ones:
+            lower, upper = np.searchsorted(
+                self.sample_index,
+                [row - self.shard_interval[0] for row in self.shard_starts],
+                side='left'
+            )
+            self.sample_index = self.sample_index[lower: upper]
+
+        offset = self.shard_interval[0]
+        self.train_interval = [min(max(row - offset, 0), self.data.shape[0]) for row in self.train_interval]
+        self.test_interval = [min(max(row - offset, 0), self.data.shape[0]) for row in self.test_interval]
+
+    def sample_weights(self):
+        """
+        Returns:
+            list of two integers: numbers of valid train and test sample starts, i.e. relative
+            train and test sampling weights of instance among shards of the domain.
+        """
+        if self.sample_index is None:
+            self._build_sample_index()
+
+        weights = []
+        for interval in [self.train_interval, self.test_interval]:
+            lower = np.searchsorted(self.sample_index, interval[0], side='left')
+            upper = np.searchsorted(self.sample_index, interval[-1] - self.sample_num_records, side='right')
+            weights.append(int(max(upper - lower, 0)))
+
+        return weights
+
+    @property
+    def rng(self):
+        """
+        Instance sampling random generator. Unless set explicitly, seeded from global numpy random state
+        on first use, so `np.random.seed()` keeps sampling reproducible.
+        """
+        if self._rng is None:
+            self._rng = np.random.default_rng(np.random.randint(2 ** 31))
+
+        return self._rng
+
+    def set_random_seed(self, seed=None):
+        """
+        Reseeds instance sampling random generator.
+
+        Args:
+            seed:   int or None, `None` - draw fresh entropy from OS.
+        """
+        self._rng = np.random.default_rng(seed)
+
+    def get_random_state(self):
+        """
+        Returns:
+            dict, serializable state of sampling random generator; use with `set_random_state()`
+            to resume sampling sequence after restart.
+        """
+        return copy.deepcopy(self.rng.bit_generator.state)
+
+    def set_random_state(self, state):
+        """
+        Restores sampling random generator state.
+
+        Args:
+            state:  dict, as returned by `get_random_state()`.
+        """
+        try:
+            assert state['bit_generator'] == type(self.rng.bit_generator).__name__
+
+        except (AssertionError, KeyError, TypeError):
+            self.log.exception(
+                'Expected random state of <{}> bit generator, got: {}'.format(
+                    type(self.rng.bit_generator).__name__,
+                    state
+                )
+            )
+            raise AssertionError
+
+        self.rng.bit_generator.state = copy.deepcopy(state)
+
+    def _sample_first_rows(self, interval, size, b_alpha=1.0, b_beta=1.0, rng=None):
+        """
+        Draws `size` sample start rows at once from valid starts table, such as entire sample lies within interval.
+        Positions are drawn from beta-distribution over valid starts ordered by time.
+
+        Args:
+            interval:       list of two integers: [lower_row_number, upper_row_number];
+            size:           int, number of rows to draw;
+            b_alpha:        float > 0, sampling B-distribution alpha param;
+            b_beta:         float > 0, sampling B-distribution beta param;
+            rng:            numpy random Generator to draw with, def. is instance one;
+
+        Returns:
+            int64 array of first rows of samples;
+            None, if there is no valid start within interval.
+        """
+        if self.sample_index is None:
+            self._build_sample_index()
+
+        lower = np.searchsorted(self.sample_index, interval[0], side='left')
+        upper = np.searchsorted(self.sample_index, interval[-1] - self.sample_num_records, side='right')
+
+        if upper <= lower:
+            return None
+
+        if rng is None:
+            rng = self.rng
+
+        positions = ((upper - lower) * rng.beta(b_alpha, b_beta, size=size)).astype(np.int64)
+
+        return self.sample_index[lower + np.minimum(positions, upper - lower - 1)].astype(np.int64)
+
+    def _sample_first_row(self, interval, b_alpha=1.0, b_beta=1.0, rng=None):
+        """
+        Draws sample start row from valid starts table, such as entire sample lies within interval.
+        Position is drawn from beta-distribution over valid starts ordered by time.
+
+        Args:
+            interval:       list of two integers: [lower_row_number, upper_row_number];
+            b_alpha:        float > 0, sampling B-distribution alpha param;
+            b_beta:         float > 0, sampling B-distribution beta param;
+            rng:            numpy random Generator to draw with, def. is instance one;
+
+        Returns:
+            int, first row of sample;
+            None, if there is no valid start within interval.
+        """
+        rows = self._sample_first_rows(interval, 1, b_alpha=b_alpha, b_beta=b_beta, rng=rng)
+        if rows is None:
+            return None
+
+        return int(rows[0])
+
     def read_csv(self, data_filename=None, force_reload=False):
         """
         Populates instance by loading data: CSV file --> pandas dataframe.
@@ -353,38 +824,480 @@ class BTgymBaseData:
         if type(self.filename) == str:
             self.filename = [self.filename]
 
-        dataframes = []
-        for filename in self.filename:
+        # Data gets replaced, drop shared copy of old one, statistic and valid starts:
+        self.unshare()
+        self.range_stat = None
+        self.sample_index = None
+        self.shard_interval = None
+
+        filenames = self._source_files(self.filename)
+        for filename in filenames:
             try:
                 assert filename and os.path.isfile(filename)
-                current_dataframe = pd.read_csv(
-                    filename,
-                    sep=self.sep,
-                    header=self.header,
-                    index_col=self.index_col,
-                    parse_dates=self.parse_dates,
-                    names=self.names
-                )
 
-                # Check and remove duplicate datetime indexes:
-                duplicates = current_dataframe.index.duplicated(keep='first')
+            except AssertionError:
+                msg = 'Data file <{}> not specified / not found.'.format(str(filename))
+                self.log.error(msg)
+                raise FileNotFoundError(msg)
+
+        # Sizes are taken before parsing, records written meanwhile get read again by append() and dropped:
+        self._source_offsets = {filename: os.path.getsize(filename) for filename in filenames}
+
+        if self.chunked:
+            chunks = []
+            for filename in filenames:
+                try:
+                    chunks += self._read_csv_chunks(filename)
+                    self.log.info('Indexed <{}>, {} chunks total.'.format(filename, len(chunks)))
+
+                except:
+                    msg = 'Data file <{}> not specified / not found.'.format(str(filename))
+                    self.log.error(msg)
+                    raise FileNotFoundError(msg)
+
+            if self.pyramid:
+                self.log.warning('Timeframes pyramid is not supported for chunked data, skipped.')
+
+            if self.features:
+                self.log.warning('Features are not supported for chunked data, skipped.')
+
+            self.data = ChunkedDataFrame(chunks)
+            self.log.info('Indexed {} records in {} chunks.'.format(self.data.shape[0], len(chunks)))
+
+        else:
+            dataframes = self._read_csv_files(filenames)
+            self.data = pd.concat(dataframes)
+
+            # Files are expected to be listed ascending by time, merge if not and remove cross-file duplicates:
+            if len(dataframes) > 1:
+                if not self.data.index.is_monotonic_increasing:
+                    self.log.warning('Data files are not listed ascending by time, merging.')
+                    self.data = self.data.sort_index(kind='mergesort')
+
+                duplicates = self.data.index.duplicated(keep='first')
                 how_bad = duplicates.sum()
                 if how_bad > 0:
-                    current_dataframe = current_dataframe[~duplicates]
+                    self.data = self.data[~duplicates]
+                    self.log.warning(
+                        'Found {} date_time records duplicated across files. Removed all but first occurrences.'.
+                        format(how_bad)
+                    )
+
+            if self.pyramid:
+                self.data = self._add_pyramid(self.data)
+
+            if self.features:
+                self.data = self._add_features(self.data, filenames)
+
+        range = pd.to_datetime(self.data.index)
+        self.data_range_delta = (range[-1] - range[0]).to_pytimedelta()
+
+    @staticmethod
+    def _source_files(names):
+        """
+        Args:
+            names:  list of data filenames and directories.
+
+        Returns:
+            list of data filenames, directories expanded to regular non-hidden files they contain, sorted by name.
+        """
+        filenames = []
+        for name in names:
+            if name and os.path.isdir(name):
+                filenames += [
+                    os.path.join(name, entry) for entry in sorted(os.listdir(name))
+                    if not entry.startswith('.') and os.path.isfile(os.path.join(name, entry))
+                ]
+
+            else:
+                filenames.append(name)
+
+        return filenames
+
+    def append(self, data_filename=None):
+        """
+        Extends loaded data with records newer than last one, with no full reload:
+        files data has been read from are read on from where they have been read up to, new files are read entirely;
+        incomplete last line of growing file is left for next call.
+        If instance has been reset, train/test intervals, valid sample starts and range statistic get extended
+        as well;
+        shared data segment, if any, gets replaced.
+
+        Args:
+            data_filename:  [opt] csv data filename or directory as string or list of such strings,
+                            def. is sources data has been loaded from; directories are scanned for new files.
+
+        Returns:
+            int, number of records appended.
+        """
+        try:
+            assert self.data is not None
+
+        except AssertionError:
+            self.log.exception('Instance holds no data. Hint: forgot to call .read_csv()?')
+            raise AssertionError
+
+        if isinstance(self.data, ChunkedDataFrame):
+            self.log.warning('Appending to chunked data is not supported, reload it instead.')
+            return 0
+
+        if self.shard is not None:
+            self.log.warning('Appending to domain shard is not supported, reload it instead.')
+            return 0
+
+        if data_filename is None:
+            data_filename = self.filename
+
+        if type(data_filename) == str:
+            data_filename = [data_filename]
+
+        dataframes = []
+        for filename in self._source_files(data_filename):
+            try:
+                dataframe = self._read_tail(filename)
+
+            except (OSError, ValueError) as e:
+                msg = 'Failed to read data file <{}>: {}'.format(filename, e)
+                self.log.error(msg)
+                raise FileNotFoundError(msg)
+
+            if dataframe is not None and dataframe.shape[0] > 0:
+                dataframes.append(dataframe)
+
+        # Sources given explicitly get reloaded along with others from now on:
+        for name in data_filename:
+            if name not in self.filename:
+                self.filename.append(name)
+
+        if len(dataframes) == 0:
+            return 0
+
+        new_data = pd.concat(dataframes)
+        new_data = new_data.astype(self.data.dtypes[new_data.columns].to_dict(), copy=False)
+
+        if not new_data.index.is_monotonic_increasing:
+            new_data = new_data.sort_index(kind='mergesort')
+
+        # Keep only records newer than ones loaded:
+        new_data = new_data[~new_data.index.duplicated(keep='first') & (new_data.index > self.data.index[-1])]
+        if new_data.shape[0] == 0:
+            return 0
+
+        if self.pyramid:
+            new_data = self._extend_pyramid(new_data)
+
+        if self.features:
+            new_data = self._extend_features(new_data)
+
+        num_records = self.data.shape[0]
+        self.data = pd.concat([self.data, new_data])
+        self.data_range_delta = (self.data.index[-1] - self.data.index[0]).to_pytimedelta()
+
+        if self.segment is not None:
+            segment_owner = self._segment_owner
+            segment_dir = os.path.dirname(self.segment['path'])
+            retired_segment = self._retired_segment
+            # Keep replaced segment until next append: samples sent before may be not attached yet:
+            if segment_owner:
+                self._retired_segment = self.segment['path']
+                self._segment_owner = False
+
+            self.segment = None
+            if retired_segment is not None:
+                release_segment(retired_segment)
+
+            if segment_owner:
+                self.share(segment_dir=segment_dir)
+
+        # Been reset, not necessarily ready: stateful domains get ready again once exhausted ones have new data:
+        if self.sample_index is not None:
+            self.train_num_records = self.data.shape[0] - self.test_num_records
+            self.train_interval = [0, self.train_num_records]
+            self.test_interval = [self.train_num_records, self.data.shape[0]]
+            self._build_sample_index(first_row=max(num_records - self.sample_num_records + 1, 0))
+
+            if self.range_stat is not None:
+                self.range_stat.extend(self.data)
+
+        self.log.info('Appended {} records, {} total.'.format(new_data.shape[0], self.data.shape[0]))
+
+        return new_data.shape[0]
+
+    def _extend_pyramid(self, new_data):
+        """
+        Computes pyramid columns for records being appended: coarse bars in progress at data end get continued.
+
+        Args:
+            new_data:   pandas dataframe of base timeframe records following instance data.
+
+        Returns:
+            pandas dataframe with pyramid columns added.
+        """
+        stamps = np.asarray(self.data.index.values, dtype='datetime64[ns]').view(np.int64)
+        first_stamp = np.asarray(new_data.index.values[:1], dtype='datetime64[ns]').view(np.int64)[0]
+        bucket_start = min(
+            first_stamp - first_stamp % pd.Timedelta(minutes=timeframe).value for timeframe in self.pyramid
+        )
+        first_row = int(np.searchsorted(stamps, bucket_start, side='left'))
+        data = pd.concat([self.data[new_data.columns][first_row:], new_data])
+
+        return self._add_pyramid(data)[data.shape[0] - new_data.shape[0]:]
+
+    def _read_tail(self, filename):
+        """
+        Parses source file part not read yet, up to last complete line.
+
+        Args:
+            filename:   csv data filename as string.
+
+        Returns:
+            pandas dataframe or None if there is nothing new.
+        """
+        offset = self._source_offsets.get(filename, 0)
+        size = os.path.getsize(filename)
+        if size < offset:
+            self.log.warning('Data file <{}> got truncated, reading from start.'.format(filename))
+            offset = 0
+
+        if size == offset:
+            return None
+
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            tail = f.read(size - offset)
+
+        # Leave incomplete last line for next time:
+        tail = tail[:tail.rfind(b'\n') + 1]
+        if len(tail) == 0:
+            return None
+
+        csv_params = self._csv_params()
+        if offset > 0:
+            # Header, if any, has been read already:
+            csv_params['header'] = None
+
+        dataframe = pd.read_csv(io.BytesIO(tail), **csv_params)
+        self._source_offsets[filename] = offset + len(tail)
+
+        self.log.debug('Read {} records from <{}> tail.'.format(dataframe.shape[0], filename))
+
+        return dataframe
+
+    def _read_csv_chunks(self, filename):
+        """
+        Parses single source file in pieces of `chunk_size` records and stores those as binary chunks,
+        unless done already.
+
+        Args:
+            filename:   csv data filename as string.
+
+        Returns:
+            list of chunk paths.
+        """
+        cache_dir = self.cache_dir
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), 'btgym_cache')
+
+        chunked_params = dict(chunk_size=self.chunk_size, **self._cache_params())
+        cache_path = os.path.join(cache_dir, cache_key(filename, chunked_params))
+        if os.path.isdir(cache_path):
+            self.log.debug('Found chunks of <{}> in <{}>.'.format(filename, cache_path))
+            return list_chunks(cache_path)
+
+        def parse():
+            last_time = None
+            for dataframe in pd.read_csv(filename, chunksize=self.chunk_size, **self._csv_params()):
+                # Check and remove duplicate datetime indexes, including ones across chunks boundary:
+                duplicates = dataframe.index.duplicated(keep='first')
+                if last_time is not None:
+                    duplicates |= dataframe.index == last_time
+
+                how_bad = duplicates.sum()
+                if how_bad > 0:
+                    dataframe = dataframe[~duplicates]
                     self.log.warning('Found {} duplicated date_time records in <{}>.\
                      Removed all but first occurrences.'.format(how_bad, filename))
 
-                dataframes += [current_dataframe]
-                self.log.info('Loaded {} records from <{}>.'.format(dataframes[-1].shape[0], filename))
+                if self.compact:
+                    dataframe = dataframe.astype(self._dtype(), copy=False)
+
+                if dataframe.shape[0] > 0:
+                    last_time = dataframe.index[-1]
+                    yield dataframe
+
+        chunks = write_chunks(cache_path, parse())
+        self.log.debug('Stored <{}> as {} chunks in <{}>.'.format(filename, len(chunks), cache_path))
+
+        return chunks
+
+    def _csv_params(self):
+        """
+        Returns:
+            dict of pandas.read_csv kwargs.
+        """
+        return dict(
+            sep=self.sep,
+            header=self.header,
+            index_col=self.index_col,
+            parse_dates=self.parse_dates,
+            names=self.names
+        )
+
+    def _dtype(self):
+        """
+        Returns:
+            float type data columns are cast to, None if kept as parsed.
+        """
+        return np.float32 if self.compact else None
+
+    def _cache_params(self):
+        """
+        Returns:
+            dict of options cache entries depend on.
+        """
+        # Features are stored as separate entry:
+        params = {key: value for key, value in self.parsing_params.items() if key != 'features'}
+        if self.compact:
+            params['compact'] = True
+
+        return params
+
+    def _cache_path(self, filename):
+        """
+        Returns:
+            binary cache entry path for source file, None if caching is off.
+        """
+        if self.cache_dir is None:
+            return None
+
+        return os.path.join(self.cache_dir, cache_key(filename, self._cache_params()))
+
+    def _read_cached(self, filename, cache_path):
+        """
+        Returns:
+            dataframe loaded from binary cache, None if there is no valid cache entry.
+        """
+        if cache_path is not None and os.path.isdir(cache_path):
+            try:
+                dataframe = read_frame(cache_path, mmap=True)
+                self.log.debug('Loaded <{}> from cache <{}>.'.format(filename, cache_path))
+                return dataframe
+
+            except (AssertionError, OSError, ValueError, KeyError) as e:
+                self.log.warning('Failed to load cache <{}>: {}, parsing source.'.format(cache_path, e))
+
+        return None
+
+    def _read_csv_file(self, filename):
+        """
+        Loads single source file: CSV file --> pandas dataframe, duplicate records removed.
+        If `cache_dir` is set, tries cached binary copy first and caches parsed data otherwise.
+
+        Args:
+            filename:   csv data filename as string.
+
+        Returns:
+            pandas dataframe.
+        """
+        cache_path = self._cache_path(filename)
+        dataframe = self._read_cached(filename, cache_path)
+        if dataframe is not None:
+            return dataframe
+
+        dataframe, how_bad = parse_csv_file(filename, self._csv_params(), dtype=self._dtype())
+        if how_bad > 0:
+            self.log.warning('Found {} duplicated date_time records in <{}>.\
+             Removed all but first occurrences.'.format(how_bad, filename))
+
+        if cache_path is not None:
+            try:
+                write_frame(cache_path, dataframe)
+                self.log.debug('Cached <{}> as <{}>.'.format(filename, cache_path))
+                # Serve cached version for consistency:
+                dataframe = read_frame(cache_path, mmap=True)
+
+            except (OSError, ValueError, TypeError) as e:
+                self.log.warning('Failed to cache <{}>: {}'.format(filename, e))
+
+        return dataframe
+
+    def _read_csv_files(self, filenames):
+        """
+        Loads list of source files, parsing ones not found in cache concurrently in process pool.
+
+        Args:
+            filenames:  list of csv data filenames.
+
+        Returns:
+            list of pandas dataframes, same order as filenames.
+        """
+        dataframes = [None] * len(filenames)
+        cache_paths = [self._cache_path(filename) for filename in filenames]
+        to_parse = []
+        for i, filename in enumerate(filenames):
+            dataframes[i] = self._read_cached(filename, cache_paths[i])
+            if dataframes[i] is None:
+                to_parse.append(i)
+
+        num_workers = min(len(to_parse), os.cpu_count() or 1)
+
+        # Daemonic processes are not allowed to have children; forking while other threads run
+        # can leave children with locks held by threads that do not exist there, so parse in place then:
+        if num_workers > 1 and not multiprocessing.current_process().daemon and threading.active_count() > 1:
+            self.log.debug('Other threads are running, parsing {} files one by one.'.format(len(to_parse)))
+
+        elif num_workers > 1 and not multiprocessing.current_process().daemon:
+            self.log.debug('Parsing {} files with {} processes.'.format(len(to_parse), num_workers))
+            csv_params = self._csv_params()
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                # Worker processes get started on submit, failing to start any means parsing in place;
+                # errors raised by workers themselves are not caught here:
+                try:
+                    futures = [
+                        (i, pool.submit(parse_csv_file, filenames[i], csv_params, cache_paths[i], self._dtype()))
+                        for i in to_parse
+                    ]
+
+                except (OSError, BrokenProcessPool) as e:
+                    self.log.warning('Failed to start parsing processes: {}, parsing one by one.'.format(e))
+                    futures = []
+
+                for i, future in futures:
+                    try:
+                        dataframe, how_bad = future.result()
+
+                    except BrokenProcessPool as e:
+                        self.log.warning('Parsing processes terminated: {}, parsing one by one.'.format(e))
+                        break
+
+                    except Exception as e:
+                        msg = 'Failed to parse data file <{}>: {}'.format(filenames[i], e)
+                        self.log.error(msg)
+                        raise FileNotFoundError(msg)
+
+                    if how_bad > 0:
+                        self.log.warning('Found {} duplicated date_time records in <{}>.\
+                         Removed all but first occurrences.'.format(how_bad, filenames[i]))
+
+                    if dataframe is None:
+                        dataframe = read_frame(cache_paths[i], mmap=True)
+
+                    dataframes[i] = dataframe
+                    self.log.info('Loaded {} records from <{}>.'.format(dataframe.shape[0], filenames[i]))
+
+            to_parse = [i for i in to_parse if dataframes[i] is None]
+
+        for i in to_parse:
+            try:
+                dataframes[i] = self._read_csv_file(filenames[i])
+                self.log.info('Loaded {} records from <{}>.'.format(dataframes[i].shape[0], filenames[i]))
 
             except:
-                msg = 'Data file <{}> not specified / not found.'.format(str(filename))
+                msg = 'Data file <{}> not specified / not found.'.format(str(filenames[i]))
                 self.log.error(msg)
                 raise FileNotFoundError(msg)
 
-        self.data = pd.concat(dataframes)
-        range = pd.to_datetime(self.data.index)
-        self.data_range_delta = (range[-1] - range[0]).to_pytimedelta()
+        return dataframes
 
     def describe(self):
         """
@@ -401,6 +1314,18 @@ class BTgymBaseData:
 
         for every data column.
         """
+        # Samples and prepared instances get statistic from precomputed range statistic:
+        if self.parent_stat is not None or self.range_stat is not None:
+            if self.parent_stat is not None:
+                range_stat, first_row = self.parent_stat
+
+            else:
+                range_stat, first_row = self.range_stat, 0
+
+            self.data_stat = range_stat.describe(first_row, first_row + self.data.shape[0])
+            self.log.info('Data summary:\n{}'.format(self.data_stat.to_string()))
+            return self.data_stat
+
         # Pretty straightforward, using standard pandas utility.
         # The only caveat here is that if actual data has not been loaded yet, need to load, describe and unload again,
         # thus avoiding passing big files to BT server:
@@ -431,7 +1356,14 @@ class BTgymBaseData:
         """
         try:
             assert not self.data.empty
-            btfeed = btfeeds.PandasDirectData(
+            feed_class = BTgymArrayData
+            feature_lines = dict()
+            if self.features:
+                # Features get exposed as data lines:
+                feed_class = features_feed_class(self.features.keys())
+                feature_lines = {name: self.data.columns.get_loc(name) + 1 for name in self.features.keys()}
+
+            btfeed = feed_class(
                 dataname=self.data,
                 timeframe=self.timeframe,
                 datetime=self.datetime,
@@ -440,7 +1372,8 @@ class BTgymBaseData:
                 low=self.low,
                 close=self.close,
                 volume=self.volume,
-                openinterest=self.openinterest
+                openinterest=self.openinterest,
+                **feature_lines
             )
             btfeed.numrecords = self.data.shape[0]
             return btfeed
@@ -450,6 +1383,127 @@ class BTgymBaseData:
             self.log.error(msg)
             raise AssertionError(msg)
 
+    def _add_features(self, data, filenames=None):
+        """
+        Appends features columns, loads them from `cache_dir` if computed before.
+
+        Args:
+            data:       pandas dataframe;
+            filenames:  list of source files data has been loaded from, if any; features are not cached otherwise.
+
+        Returns:
+            pandas dataframe with features columns added.
+        """
+        dtype = np.float32 if self.compact else np.float64
+        cache_path = None
+        if self.cache_dir is not None and filenames:
+            source_keys = [cache_key(filename, self._cache_params()) for filename in filenames]
+            cache_path = os.path.join(self.cache_dir, features_cache_key(source_keys, self.features, dtype))
+
+        features = self._read_cached('features', cache_path)
+        if features is None or not features.index.equals(data.index):
+            features = compute_features(data, self.features, dtype)
+            self.log.debug('Computed {} features.'.format(features.shape[-1]))
+            if cache_path is not None:
+                try:
+                    write_frame(cache_path, features)
+
+                except (OSError, ValueError, TypeError) as e:
+                    self.log.warning('Failed to cache features: {}'.format(e))
+
+        return pd.concat([data, features], axis=1)
+
+    def _extend_features(self, new_data):
+        """
+        Computes features columns for records being appended.
+
+        Args:
+            new_data:   pandas dataframe of records following instance data.
+
+        Returns:
+            pandas dataframe with features columns added.
+        """
+        dtype = np.float32 if self.compact else np.float64
+        data = pd.concat([self.data[new_data.columns], new_data])
+        features = compute_features(data, self.features, dtype)[data.shape[0] - new_data.shape[0]:]
+
+        return pd.concat([new_data, features], axis=1)
+
+    def _pyramid_fields(self):
+        """
+        Returns:
+            list of (bt.feed line name, base data column name) pairs.
+        """
+        fields = []
+        for line in ['open', 'high', 'low', 'close', 'volume']:
+            position = getattr(self, line)
+            if position is not None and position > 0:
+                fields.append((line, self.names[position - 1]))
+
+        return fields
+
+    def _add_pyramid(self, data):
+        """
+        Appends coarse timeframes columns: for every record and timeframe, holds values of the coarse bar
+        that record belongs to, as of that record (no look-ahead): open of bucket first record,
+        high and low so far, current close and volume so far.
+
+        Args:
+            data:   pandas dataframe of base timeframe.
+
+        Returns:
+            pandas dataframe with pyramid columns added.
+        """
+        stamps = np.asarray(data.index.values, dtype='datetime64[ns]').view(np.int64)
+        reduce = dict(open='first', high='cummax', low='cummin', close=None, volume='cumsum')
+        columns = dict()
+
+        for timeframe in self.pyramid:
+            bucket = stamps // pd.Timedelta(minutes=timeframe).value
+            for line, column in self._pyramid_fields():
+                name = '{}_{}m'.format(line, timeframe)
+                if reduce[line] is None:
+                    columns[name] = data[column].values
+
+                elif reduce[line] == 'first':
+                    columns[name] = data[column].groupby(bucket).transform('first').values
+
+                else:
+                    columns[name] = getattr(data[column].groupby(bucket), reduce[line])().values
+
+        self.log.debug('Added {} timeframes pyramid columns.'.format(len(columns)))
+
+        return pd.concat([data, pd.DataFrame(columns, index=data.index)], axis=1)
+
+    def to_pyramid_btfeeds(self):
+        """
+        Performs BTgymData-->bt.feed conversion for every timeframe of pyramid, if set.
+        Coarse feeds are aligned with base one: every record holds coarse bar in progress.
+
+        Returns:
+            dict of bt.datafeed instances, keyed by timeframe name: {'5m': feed, ...}.
+        """
+        feeds = dict()
+        if not self.pyramid:
+            return feeds
+
+        for timeframe in self.pyramid:
+            lines = dict(open=-1, high=-1, low=-1, close=-1, volume=-1)
+            for line, _ in self._pyramid_fields():
+                lines[line] = self.data.columns.get_loc('{}_{}m'.format(line, timeframe)) + 1
+
+            btfeed = BTgymArrayData(
+                dataname=self.data,
+                timeframe=self.timeframe,
+                datetime=self.datetime,
+                openinterest=-1,
+                **lines
+            )
+            btfeed.numrecords = self.data.shape[0]
+            feeds['{}m'.format(timeframe)] = btfeed
+
+        return feeds
+
     def sample(self, **kwargs):
         return self._sample(**kwargs)
 
@@ -499,28 +1553,7 @@ class BTgymBaseData:
             raise AssertionError
 
         if self.sample_instance is None or get_new:
-            if sample_type == 0:
-                # Get beta_distributed sample in train interval:
-                self.sample_instance = self._sample_interval(
-                    self.train_interval,
-                    b_alpha=b_alpha,
-                    b_beta=b_beta,
-                    name='train_' + self.sample_name
-                )
-
-            else:
-                # Get uniform sample in test interval:
-                self.sample_instance = self._sample_interval(
-                    self.test_interval,
-                    b_alpha=1,
-                    b_beta=1,
-                    name='test_' + self.sample_name
-                )
-            self.sample_instance.metadata['type'] = sample_type
-            self.sample_instance.metadata['sample_num'] = self.sample_num
-            self.sample_instance.metadata['parent_sample_num'] = copy.deepcopy(self.metadata['sample_num'])
-            self.sample_instance.metadata['parent_sample_type'] = copy.deepcopy(self.metadata['type'])
-            self.sample_num += 1
+            self.sample_from(self.sample_batch(1, sample_type=sample_type, b_alpha=b_alpha, b_beta=b_beta)[0])
 
         else:
             # Do nothing:
@@ -528,6 +1561,93 @@ class BTgymBaseData:
 
         return self.sample_instance
 
+    def sample_batch(self, batch_size, sample_type=0, b_alpha=1.0, b_beta=1.0, **kwargs):
+        """
+        Draws number of sample descriptors in one vectorized call, no data is sliced.
+        Descriptors are materialized by `sample_from()`; same as `sample(get_new=True, ...)` does for single one.
+
+        Args:
+            batch_size (int):               number of descriptors to draw;
+            sample_type (int or bool):      0 (train) or 1 (test) - get samples from train or test data subsets
+                                            respectively.
+            b_alpha (float):                beta-distribution sampling alpha > 0, valid for train samples.
+            b_beta (float):                 beta-distribution sampling beta > 0, valid for train samples.
+
+        Returns:
+            list of dicts: {first_row, sample_type}.
+
+        Note:
+            Draws come from instance random generator, see `get_random_state()`, `set_random_state()`.
+        """
+        try:
+            assert self.is_ready
+
+        except AssertionError:
+            self.log.exception(
+                'Sampling attempt: data not ready. Hint: forgot to call data.reset()?'
+            )
+            raise AssertionError
+
+        try:
+            assert sample_type in [0, 1]
+
+        except AssertionError:
+            self.log.exception(
+                'Sampling attempt: expected sample type be in {}, got: {}'.\
+                format([0, 1], sample_type)
+            )
+            raise AssertionError
+
+        if sample_type == 0:
+            # Beta-distributed samples in train interval:
+            interval = self.train_interval
+
+        else:
+            # Uniform samples in test interval:
+            interval = self.test_interval
+            b_alpha = 1
+            b_beta = 1
+
+        self._check_interval(interval, b_alpha, b_beta)
+
+        first_rows = self._sample_first_rows(interval, batch_size, b_alpha=b_alpha, b_beta=b_beta)
+
+        if first_rows is None:
+            msg = (
+                'No valid sample start found within interval {}. ' +
+                'Hint: check sampling params / dataset consistency.'
+            ).format(interval)
+            self.log.error(msg)
+            raise RuntimeError(msg)
+
+        return [dict(first_row=row, sample_type=sample_type) for row in first_rows.tolist()]
+
+    def sample_from(self, descriptor):
+        """
+        Makes new sample as described by `sample_batch()` output item.
+
+        Args:
+            descriptor:     dict: {first_row, sample_type}.
+
+        Returns:
+            sample instance, same as `sample(get_new=True, ...)` does.
+        """
+        sample_type = descriptor['sample_type']
+        if sample_type == 0:
+            name = 'train_' + self.sample_name
+
+        else:
+            name = 'test_' + self.sample_name
+
+        self.sample_instance = self._sample_at(descriptor['first_row'], name=name)
+        self.sample_instance.metadata['type'] = sample_type
+        self.sample_instance.metadata['sample_num'] = self.sample_num
+        self.sample_instance.metadata['parent_sample_num'] = copy.deepcopy(self.metadata['sample_num'])
+        self.sample_instance.metadata['parent_sample_type'] = copy.deepcopy(self.metadata['type'])
+        self.sample_num += 1
+
+        return self.sample_instance
+
     def _sample_random(self, name='random_sample_'):
         """
         Randomly samples continuous subset of data.
@@ -550,72 +1670,46 @@ class BTgymBaseData:
         self.log.debug('Respective number of steps: {}.'.format(self.sample_num_records))
         self.log.debug('Maximum allowed data time gap set to: {}.\n'.format(self.max_time_gap))
 
-        # Sanity check param:
-        max_attempts = 100
-        attempts = 0
-
-        # # Keep sampling random enter points until all conditions are met:
-        while attempts <= max_attempts:
-
-            # Randomly sample record (row) from entire datafeed:
-            first_row = int((self.data.shape[0] - self.sample_num_records - 1) * random.random())
-            sample_first_day = self.data[first_row:first_row + 1].index[0]
-            self.log.debug('Sample start: {}, weekday: {}.'.format(sample_first_day, sample_first_day.weekday()))
-
-            # Keep sampling until good day:
-            while not sample_first_day.weekday() in self.start_weekdays and attempts <= max_attempts:
-                self.log.debug('Not a good day to start, resampling...')
-                first_row = int((self.data.shape[0] - self.sample_num_records - 1) * random.random())
-                sample_first_day = self.data[first_row:first_row + 1].index[0]
-                self.log.debug('Sample start: {}, weekday: {}.'.format(sample_first_day, sample_first_day.weekday()))
-                attempts +=1
-
-            # Check if managed to get proper weekday:
-            assert attempts <= max_attempts, \
-                'Quitting after {} sampling attempts. Hint: check sampling params / dataset consistency.'. \
-                format(attempts)
-
-            # If 00 option set, get index of first record of that day:
-            if self.start_00:
-                adj_timedate = sample_first_day.date()
-                self.log.debug('Start time adjusted to <00:00>')
-
-            else:
-                adj_timedate = sample_first_day
-
-            first_row = self.data.index.get_loc(adj_timedate, method='nearest')
-
-            # Easy part:
-            last_row = first_row + self.sample_num_records  # + 1
-            sampled_data = self.data[first_row: last_row]
-            sample_len = (sampled_data.index[-1] - sampled_data.index[0]).to_pytimedelta()
-            self.log.debug('Actual sample duration: {}.'.format(sample_len, ))
-            self.log.debug('Total episode time gap: {}.'.format(sample_len - self.max_sample_len_delta))
-
-            # Perform data gap check:
-            if sample_len - self.max_sample_len_delta < self.max_time_gap:
-                self.log.debug('Sample accepted.')
-                # If sample OK - compose and return sample:
-                new_instance = self.nested_class_ref(**self.nested_params)
-                new_instance.filename = name + 'n{}_at_{}'.format(self.sample_num, adj_timedate)
-                self.log.info('Sample id: <{}>.'.format(new_instance.filename))
-                new_instance.data = sampled_data
-                new_instance.metadata['type'] = 'random_sample'
-                new_instance.metadata['first_row'] = first_row
-
-                return new_instance
+        first_row = self._sample_first_row([0, self.data.shape[0]])
 
-            else:
-                self.log.debug('Duration too big, resampling...\n')
-                attempts += 1
+        if first_row is None:
+            msg = 'No valid sample start found. Hint: check sampling params / dataset consistency.'
+            self.log.error(msg)
+            raise RuntimeError(msg)
 
-        # Got here -> sanity check failed:
-        msg = ('Quitting after {} sampling attempts.' +
-               'Hint: check sampling params / dataset consistency.').format(attempts)
-        self.log.error(msg)
-        raise RuntimeError(msg)
+        if self.start_00:
+            adj_timedate = self.data.index[first_row].date()
 
-    def _sample_interval(self, interval, b_alpha=1.0, b_beta=1.0, name='interval_sample_'):
+        else:
+            adj_timedate = self.data.index[first_row]
+
+        last_row = first_row + self.sample_num_records  # + 1
+        sampled_data = self.data[first_row: last_row]
+        self.log.debug(
+            'Sample start: {}, actual sample duration: {}.'.
+            format(adj_timedate, sampled_data.index[-1] - sampled_data.index[0])
+        )
+        new_instance = self.nested_class_ref(**self.nested_params)
+        new_instance.filename = name + 'n{}_at_{}'.format(self.sample_num, adj_timedate)
+        self.log.info('Sample id: <{}>.'.format(new_instance.filename))
+        new_instance.data = sampled_data
+        new_instance.segment = self._sample_segment(first_row, first_row + sampled_data.shape[0])
+        new_instance.parent_stat = self._sample_stat(first_row)
+        new_instance.set_random_seed(int(self.rng.integers(2 ** 63)))
+        new_instance.metadata['type'] = 'random_sample'
+        new_instance.metadata['first_row'] = first_row
+
+        return new_instance
+
+    def _sample_interval(
+            self,
+            interval,
+            b_alpha=1.0,
+            b_beta=1.0,
+            name='interval_sample_',
+            sample_num=None,
+            rng=None
+    ):
         """
         Samples continuous subset of data,
         such as entire episode records lie within positions specified by interval.
@@ -627,7 +1721,9 @@ class BTgymBaseData:
             b_alpha:        float > 0, sampling B-distribution alpha param, def=1;
             b_beta:         float > 0, sampling B-distribution beta param, def=1;
             name:           str, sample filename id
-
+            sample_num:     int, sample number to put in filename id, def. is current one;
+            rng:            numpy random Generator to draw start position and sample seed with,
+                            def. is instance one;
 
         Returns:
              - BTgymDataset instance such as:
@@ -635,6 +1731,24 @@ class BTgymBaseData:
                 2. actual episode start position is sampled from `interval`;
              - `False` if it is not possible to sample instance with set args.
         """
+        self._check_interval(interval, b_alpha, b_beta)
+
+        first_row = self._sample_first_row(interval, b_alpha=b_alpha, b_beta=b_beta, rng=rng)
+
+        if first_row is None:
+            msg = (
+                'No valid sample start found within interval {}. ' +
+                'Hint: check sampling params / dataset consistency.'
+            ).format(interval)
+            self.log.error(msg)
+            raise RuntimeError(msg)
+
+        return self._sample_at(first_row, name=name, sample_num=sample_num, rng=rng)
+
+    def _check_interval(self, interval, b_alpha=1.0, b_beta=1.0):
+        """
+        Validates interval sampling args against data held.
+        """
         try:
             assert not self.data.empty
 
@@ -660,101 +1774,65 @@ class BTgymBaseData:
             )
             raise AssertionError
 
-        sample_num_records = self.sample_num_records
-
         try:
             assert interval[0] < interval[-1] <= self.data.shape[0]
 
         except AssertionError:
             self.log.exception(
                 'Cannot sample with size {}, inside {} from dataset of {} records'.
-                 format(sample_num_records, interval, self.data.shape[0])
+                 format(self.sample_num_records, interval, self.data.shape[0])
             )
             raise AssertionError
 
-        self.log.debug('Maximum sample time duration set to: {}.'.format(self.max_sample_len_delta))
-        self.log.debug('Respective number of steps: {}.'.format(sample_num_records))
-        self.log.debug('Maximum allowed data time gap set to: {}.\n'.format(self.max_time_gap))
-
-        # Sanity check param:
-        max_attempts = 100
-        attempts = 0
-
-        # # Keep sampling random enter points until all conditions are met:
-        while attempts <= max_attempts:
-
-            first_row = interval[0] + int(
-                (interval[-1] - interval[0] - sample_num_records) * random_beta(a=b_alpha, b=b_beta)
-            )
-
-            #print('_sample_interval_sample_num_records: ', sample_num_records)
-            #print('_sample_interval_first_row: ', first_row)
-
-            sample_first_day = self.data[first_row:first_row + 1].index[0]
-            self.log.debug('Sample start: {}, weekday: {}.'.format(sample_first_day, sample_first_day.weekday()))
-
-            # Keep sampling until good day:
-            while not sample_first_day.weekday() in self.start_weekdays and attempts <= max_attempts:
-                self.log.debug('Not a good day to start, resampling...')
-                first_row = interval[0] + round(
-                    (interval[-1] - interval[0] - sample_num_records) * random_beta(a=b_alpha, b=b_beta)
-                )
-                #print('r_sample_interval_sample_num_records: ', sample_num_records)
-                #print('r_sample_interval_first_row: ', first_row)
-                sample_first_day = self.data[first_row:first_row + 1].index[0]
-                self.log.debug('Sample start: {}, weekday: {}.'.format(sample_first_day, sample_first_day.weekday()))
-                attempts += 1
+    def _sample_at(self, first_row, name='interval_sample_', sample_num=None, rng=None):
+        """
+        Makes sample instance starting at given row. Sample random generator is seeded from own one,
+        so entire sampling tree is reproducible by top-level instance random state.
 
-            # Check if managed to get proper weekday:
-            try:
-                assert attempts <= max_attempts
+        Args:
+            first_row:      int, valid sample start row;
+            name:           str, sample filename id
+            sample_num:     int, sample number to put in filename id, def. is current one;
+            rng:            numpy random Generator to draw sample seed with, def. is instance one;
 
-            except AssertionError:
-                self.log.exception(
-                    'Quitting after {} sampling attempts. Hint: check sampling params / dataset consistency.'.
-                    format(attempts)
-                )
-                raise RuntimeError
+        Returns:
+            BTgymDataset instance.
+        """
+        sample_num_records = self.sample_num_records
 
-            # If 00 option set, get index of first record of that day:
-            if self.start_00:
-                adj_timedate = sample_first_day.date()
-                self.log.debug('Start time adjusted to <00:00>')
+        self.log.debug('Maximum sample time duration set to: {}.'.format(self.max_sample_len_delta))
+        self.log.debug('Respective number of steps: {}.'.format(sample_num_records))
+        self.log.debug('Maximum allowed data time gap set to: {}.\n'.format(self.max_time_gap))
 
-            else:
-                adj_timedate = sample_first_day
-
-            first_row = self.data.index.get_loc(adj_timedate, method='nearest')
-
-            # Easy part:
-            last_row = first_row + sample_num_records  # + 1
-            sampled_data = self.data[first_row: last_row]
-            sample_len = (sampled_data.index[-1] - sampled_data.index[0]).to_pytimedelta()
-            self.log.debug('Actual sample duration: {}.'.format(sample_len))
-            self.log.debug('Total sample time gap: {}.'.format(sample_len - self.max_sample_len_delta))
-
-            # Perform data gap check:
-            if sample_len - self.max_sample_len_delta < self.max_time_gap:
-                self.log.debug('Sample accepted.')
-                # If sample OK - return new dataset:
-                new_instance = self.nested_class_ref(**self.nested_params)
-                new_instance.filename = name + 'num_{}_at_{}'.format(self.sample_num, adj_timedate)
-                self.log.info('New sample id: <{}>.'.format(new_instance.filename))
-                new_instance.data = sampled_data
-                new_instance.metadata['type'] = 'interval_sample'
-                new_instance.metadata['first_row'] = first_row
-
-                return new_instance
+        if self.start_00:
+            adj_timedate = self.data.index[first_row].date()
 
-            else:
-                self.log.debug('Attempt {}: duration too big, resampling, ...\n'.format(attempts))
-                attempts += 1
-
-        # Got here -> sanity check failed:
-        msg = ('Quitting after {} sampling attempts.' +
-               'Hint: check sampling params / dataset consistency.').format(attempts)
-        self.log.error(msg)
-        raise RuntimeError(msg)
+        else:
+            adj_timedate = self.data.index[first_row]
+
+        last_row = first_row + sample_num_records  # + 1
+        sampled_data = self.data[first_row: last_row]
+        self.log.debug(
+            'Sample start: {}, actual sample duration: {}.'.
+            format(adj_timedate, sampled_data.index[-1] - sampled_data.index[0])
+        )
+        new_instance = self.nested_class_ref(**self.nested_params)
+        if sample_num is None:
+            sample_num = self.sample_num
+
+        new_instance.filename = name + 'num_{}_at_{}'.format(sample_num, adj_timedate)
+        self.log.info('New sample id: <{}>.'.format(new_instance.filename))
+        new_instance.data = sampled_data
+        new_instance.segment = self._sample_segment(first_row, first_row + sampled_data.shape[0])
+        new_instance.parent_stat = self._sample_stat(first_row)
+        if rng is None:
+            rng = self.rng
+
+        new_instance.set_random_seed(int(rng.integers(2 ** 63)))
+        new_instance.metadata['type'] = 'interval_sample'
+        new_instance.metadata['first_row'] = first_row
+
+        return new_instance
 
 
 
@@ -0,0 +1,147 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Persistent binary columnar storage for parsed source data.
+
+Every cache entry is a directory holding::
+
+    index.npy   - int64 array of [n] datetime stamps, nanoseconds since epoch;
+    values.npy  - float array of [num_columns, n], every data column is contiguous;
+    meta.json   - column names and entry description.
+
+Entries can be memory-mapped, so loading a cached file costs milliseconds regardless of it's size.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+
+
+def cache_key(filename, parsing_params):
+    """
+    Computes cache entry key for source data file.
+
+    Args:
+        filename:       str, source file name;
+        parsing_params: dict, parsing options file is read with;
+
+    Returns:
+        str, hex digest; changes whenever file path, size, modification time or parsing options change.
+    """
+    stat = os.stat(filename)
+    key = dict(
+        version=CACHE_VERSION,
+        filename=os.path.abspath(filename),
+        size=stat.st_size,
+        mtime=stat.st_mtime_ns,
+        parsing_params=parsing_params,
+    )
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_frame(path, frame, dtype=None):
+    """
+    Stores dataframe as cache entry. Writing is atomic: entry either gets fully written or not written at all.
+
+    Args:
+        path:   str, entry directory name;
+        frame:  pandas dataframe indexed by datetime; all columns should be numeric;
+        dtype:  float type to store data columns as, def. is common type of frame columns.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix='.tmp_', dir=parent_dir)
+    try:
+        index = np.asarray(frame.index.values, dtype='datetime64[ns]').view(np.int64)
+        values = np.ascontiguousarray(frame.values.T, dtype=dtype)
+        np.save(os.path.join(tmp_path, 'index.npy'), index)
+        np.save(os.path.join(tmp_path, 'values.npy'), values)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(
+                dict(
+                    version=CACHE_VERSION,
+                    columns=[str(name) for name in frame.columns],
+                    index_name=frame.index.name,
+                    num_records=int(index.shape[0]),
+                ),
+                f
+            )
+        try:
+            os.rename(tmp_path, path)
+
+        except OSError:
+            # Someone has been faster, use his entry:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    except:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def read_arrays(path, mmap=True):
+    """
+    Loads cache entry arrays.
+
+    Args:
+        path:   str, entry directory name;
+        mmap:   bool, memory-map arrays instead of reading them.
+
+    Returns:
+        index as int64 array of [n], values as array of [num_columns, n], meta dictionary.
+    """
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+
+    index = np.load(os.path.join(path, 'index.npy'), mmap_mode=mmap_mode)
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode)
+
+    assert meta['version'] == CACHE_VERSION and values.shape == (len(meta['columns']), index.shape[0]), \
+        'Inconsistent cache entry <{}>'.format(path)
+
+    return index, values, meta
+
+
+def read_frame(path, mmap=True):
+    """
+    Loads cache entry as pandas dataframe.
+
+    Args:
+        path:   str, entry directory name;
+        mmap:   bool, if True - dataframe columns are read-only views of memory-mapped file.
+
+    Returns:
+        pandas dataframe.
+    """
+    index, values, meta = read_arrays(path, mmap)
+    frame = pd.DataFrame(
+        values.T,
+        index=pd.DatetimeIndex(np.asarray(index).view('datetime64[ns]'), name=meta['index_name']),
+        columns=meta['columns'],
+        copy=False,
+    )
+    return frame
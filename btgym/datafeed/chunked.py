@@ -0,0 +1,222 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Out-of-core data storage.
+
+Source files are parsed piece by piece and stored as sequence of binary cache entries (chunks).
+Only datetime index of entire dataset is kept in memory; data rows are read from memory-mapped chunks
+when slice covering them is requested.
+"""
+
+import os
+import shutil
+import tempfile
+import collections
+
+import numpy as np
+import pandas as pd
+
+from .cache import write_frame, read_frame, read_arrays
+
+
+def write_chunks(path, frames):
+    """
+    Stores sequence of dataframes as chunked entry. Writing is atomic.
+
+    Args:
+        path:       str, entry directory name;
+        frames:     iterable of pandas dataframes indexed by datetime.
+
+    Returns:
+        list of chunk paths.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix='.tmp_', dir=parent_dir)
+    try:
+        for i, frame in enumerate(frames):
+            write_frame(os.path.join(tmp_path, '{:06d}'.format(i)), frame)
+
+        try:
+            os.rename(tmp_path, path)
+
+        except OSError:
+            # Someone has been faster, use his entry:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    except:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return list_chunks(path)
+
+
+def list_chunks(path):
+    """
+    Args:
+        path:       str, chunked entry directory name.
+
+    Returns:
+        list of chunk paths, ordered.
+    """
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if not name.startswith('.')]
+
+
+class ChunkedDataFrame:
+    """
+    Read-only dataframe-like view of data stored as sequence of chunks.
+    Supports subset of pandas.DataFrame interface used by data domains:
+    `index`, `columns`, `shape`, `empty`, row slicing (returns pandas dataframe) and `describe()`.
+    """
+    def __init__(self, chunks, max_open_chunks=4):
+        """
+        Args:
+            chunks:             list of chunk paths, ordered by time;
+            max_open_chunks:    int, number of recently used chunks to keep memory-mapped.
+        """
+        self.chunks = list(chunks)
+        self.max_open_chunks = max_open_chunks
+        self._open_chunks = collections.OrderedDict()
+
+        indexes = []
+        meta = None
+        for chunk in self.chunks:
+            index, _, meta = read_arrays(chunk, mmap=True)
+            indexes.append(np.array(index))
+
+        assert meta is not None, 'No data chunks given.'
+
+        self.offsets = np.cumsum([0] + [index.shape[0] for index in indexes])
+        self.time_ranges = [(index[0], index[-1]) for index in indexes if index.shape[0] > 0]
+        self.index = pd.DatetimeIndex(np.concatenate(indexes).view('datetime64[ns]'), name=meta['index_name'])
+        self.columns = pd.Index(meta['columns'])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_open_chunks'] = collections.OrderedDict()
+        return state
+
+    @property
+    def shape(self):
+        return self.index.shape[0], self.columns.shape[0]
+
+    @property
+    def empty(self):
+        return self.index.shape[0] == 0
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def _get_chunk(self, i):
+        """
+        Returns:
+            i-th chunk as dataframe, keeps LRU of memory-mapped chunks.
+        """
+        try:
+            frame = self._open_chunks.pop(i)
+
+        except KeyError:
+            frame = read_frame(self.chunks[i], mmap=True)
+
+        self._open_chunks[i] = frame
+        while len(self._open_chunks) > self.max_open_chunks:
+            self._open_chunks.popitem(last=False)
+
+        return frame
+
+    def __getitem__(self, key):
+        """
+        Args:
+            key:    slice of rows with unit step.
+
+        Returns:
+            pandas dataframe holding requested rows; view of memory-mapped chunk if rows lie within single chunk.
+        """
+        if not isinstance(key, slice):
+            raise TypeError('Only row slicing is supported, got: {}'.format(key))
+
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError('Only unit step slicing is supported, got: {}'.format(key))
+
+        stop = max(start, stop)
+        first_chunk = max(int(np.searchsorted(self.offsets, start, side='right')) - 1, 0)
+        last_chunk = max(int(np.searchsorted(self.offsets, stop, side='left')) - 1, first_chunk)
+
+        pieces = []
+        for i in range(first_chunk, min(last_chunk + 1, len(self.chunks))):
+            offset = self.offsets[i]
+            pieces.append(self._get_chunk(i)[max(start - offset, 0): stop - offset])
+
+        if len(pieces) == 1:
+            return pieces[0]
+
+        return pd.concat(pieces)
+
+    def describe(self, percentiles=(.25, .5, .75), max_sample_size=100000):
+        """
+        Computes descriptive statistic in single pass over chunks, same layout as pandas.DataFrame.describe().
+        Count, mean, std, min and max are exact, percentiles are estimated over
+        evenly strided subsample of no more than `max_sample_size` rows.
+
+        Args:
+            percentiles:        list of percentiles to include, in [0, 1];
+            max_sample_size:    int, percentiles estimation subsample size.
+
+        Returns:
+            pandas dataframe.
+        """
+        num_columns = self.columns.shape[0]
+        count = np.zeros(num_columns)
+        total = np.zeros(num_columns)
+        total_sq = np.zeros(num_columns)
+        minimum = np.full(num_columns, np.inf)
+        maximum = np.full(num_columns, -np.inf)
+        subsample = []
+        stride = max(len(self) // max_sample_size, 1)
+
+        for i, chunk in enumerate(self.chunks):
+            _, values, _ = read_arrays(chunk, mmap=True)
+            if values.shape[1] == 0:
+                continue
+
+            values = np.asarray(values)
+            valid = ~np.isnan(values)
+            count += valid.sum(axis=1)
+            total += np.nansum(values, axis=1)
+            total_sq += np.nansum(values ** 2, axis=1)
+            minimum = np.fmin(minimum, np.nanmin(values, axis=1))
+            maximum = np.fmax(maximum, np.nanmax(values, axis=1))
+            subsample.append(values[:, (-self.offsets[i]) % stride::stride])
+
+        mean = total / np.maximum(count, 1)
+        std = np.sqrt(np.maximum(total_sq - count * mean ** 2, 0) / np.maximum(count - 1, 1))
+        subsample = np.concatenate(subsample, axis=1)
+
+        rows = [count, mean, std, minimum]
+        names = ['count', 'mean', 'std', 'min']
+        for q in percentiles:
+            rows.append(np.nanpercentile(subsample, q * 100, axis=1))
+            names.append('{:g}%'.format(q * 100))
+
+        rows.append(maximum)
+        names.append('max')
+
+        return pd.DataFrame(np.stack(rows), index=names, columns=self.columns)
@@ -125,6 +125,10 @@ class BTgymRandomDataDomain(BTgymBaseData):
             name='RndDataDomain',
             task=0,
             log_level=WARNING,
+            cache_dir=None,
+            chunked=False,
+            chunk_size=1000000,
+            compact=False,
     ):
         """
         Args:
@@ -142,6 +146,10 @@ class BTgymRandomDataDomain(BTgymBaseData):
             name:               str, optional
             task:               int, optional
             log_level:          int, logbook.level
+            cache_dir:          str, optional, directory to keep binary copies of parsed source files in;
+            chunked:            bool, optional, keep data on disk and read only records being sampled;
+            chunk_size:         int, optional, number of records per chunk in chunked mode;
+            compact:            bool, optional, store data as float32;
         """
         if parsing_params is None:
             parsing_params = dict(
@@ -211,6 +219,10 @@ class BTgymRandomDataDomain(BTgymBaseData):
             name=name,
             task=task,
             log_level=log_level,
+            cache_dir=cache_dir,
+            chunked=chunked,
+            chunk_size=chunk_size,
+            compact=compact,
             _config_stack=[episode_config, trial_config]
         )
 
@@ -258,6 +270,10 @@ class BTgymDataset(BTgymRandomDataDomain):
             test_period=None,
             name='SimpleDataSet',
             log_level=WARNING,
+            cache_dir=None,
+            chunked=False,
+            chunk_size=1000000,
+            compact=False,
             **kwargs
     ):
         """
@@ -276,6 +292,10 @@ class BTgymDataset(BTgymRandomDataDomain):
             parsing_params:     csv parsing options, see base class description for details;
             name:               str, instance name;
             log_level:          int, logbook.level;
+            cache_dir:          str, optional, directory to keep binary copies of parsed source files in;
+            chunked:            bool, optional, keep data on disk and read only records being sampled;
+            chunk_size:         int, optional, number of records per chunk in chunked mode;
+            compact:            bool, optional, store data as float32;
             **kwargs:           deprecated kwargs;
         """
         # Default sample time duration:
@@ -328,6 +348,10 @@ class BTgymDataset(BTgymRandomDataDomain):
             target_period=test_period,
             name=name,
             log_level=log_level,
+            cache_dir=cache_dir,
+            chunked=chunked,
+            chunk_size=chunk_size,
+            compact=compact,
         )
 
 
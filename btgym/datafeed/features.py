@@ -0,0 +1,150 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Dataset-level features.
+
+Features are declared in data parsing params as dictionary of specifications, e.g.::
+
+    features=dict(
+        sma_4=dict(type='sma', period=4),
+        ema_16=dict(type='ema', period=16, column='open'),
+        ret_1=dict(type='log_return'),
+    )
+
+Every feature is computed once per dataset over entire column by vectorized routine, stored as extra data
+column of same name and carried along by samples; bt.feeds made of samples expose features as data lines,
+e.g. `self.data.sma_4` in strategy. All features are causal: value at any record depends on that record
+and ones preceding it only.
+"""
+
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from .feeds import BTgymArrayData
+
+
+def sma(values, period):
+    """
+    Simple moving average; first `period - 1` values are averaged over records available.
+    """
+    cumsum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    result = np.empty(values.shape[0])
+    head = min(period - 1, values.shape[0])
+    result[:head] = cumsum[1: head + 1] / np.arange(1, head + 1)
+    result[head:] = (cumsum[period:] - cumsum[:-period]) / period
+    return result
+
+
+def ema(values, period):
+    """
+    Exponential moving average with smoothing factor 2 / (period + 1), seeded with first value.
+    """
+    if values.shape[0] == 0:
+        return np.zeros(0)
+
+    alpha = 2.0 / (period + 1)
+    result, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * values[0]])
+    return result
+
+
+def log_return(values, period=1):
+    """
+    Logarithmic return over `period` records; first `period` values are zeros.
+    """
+    result = np.zeros(values.shape[0])
+    result[period:] = np.log(values[period:] / values[:-period])
+    return result
+
+
+FEATURES = dict(
+    sma=sma,
+    ema=ema,
+    log_return=log_return,
+)
+
+
+def compute_features(frame, features, dtype=np.float64):
+    """
+    Computes declared features.
+
+    Args:
+        frame:      pandas dataframe of source data;
+        features:   dict of feature specifications: {name: dict(type, [column], **type-specific params)},
+                    `type` is one of FEATURES keys, `column` is source data column, def. is `close`;
+        dtype:      float type of features columns.
+
+    Returns:
+        pandas dataframe of features, same index as frame.
+    """
+    columns = dict()
+    for name, spec in features.items():
+        params = dict(spec)
+        function = FEATURES[params.pop('type')]
+        column = params.pop('column', 'close')
+        values = np.asarray(frame[column].values, dtype=np.float64)
+        columns[name] = function(values, **params).astype(dtype)
+
+    return pd.DataFrame(columns, index=frame.index, columns=list(features.keys()))
+
+
+def features_cache_key(source_keys, features, dtype=np.float64):
+    """
+    Args:
+        source_keys:    list of cache keys of source files features are computed over;
+        features:       dict of feature specifications;
+        dtype:          float type of features columns.
+
+    Returns:
+        str, hex digest.
+    """
+    key = dict(sources=list(source_keys), features=features, dtype=np.dtype(dtype).name)
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+_feed_classes = dict()
+
+
+def features_feed_class(names):
+    """
+    Makes bt.feed class exposing features as extra data lines, column indexes are set as
+    line-named params, same way as for standard lines.
+
+    Args:
+        names:  tuple of features names.
+
+    Returns:
+        subclass of BTgymArrayData
+    """
+    names = tuple(names)
+    try:
+        return _feed_classes[names]
+
+    except KeyError:
+        feed_class = type(
+            'BTgymFeaturesData',
+            (BTgymArrayData,),
+            dict(lines=names, params=tuple((name, -1) for name in names)),
+        )
+        _feed_classes[names] = feed_class
+        return feed_class
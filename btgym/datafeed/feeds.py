@@ -0,0 +1,133 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import numpy as np
+
+from backtrader import feed
+from backtrader.linebuffer import LineBuffer
+
+
+# Proleptic Gregorian ordinal of 01.01.1970:
+EPOCH_ORDINAL = 719163
+
+
+def date2num_array(index):
+    """
+    Vectorized `backtrader.date2num`: converts datetimes to float days since 01.01.0001 plus one.
+
+    Args:
+        index:  pandas DatetimeIndex or datetime64 array of naive UTC datetimes.
+
+    Returns:
+        float64 array.
+    """
+    stamps = np.asarray(index, dtype='datetime64[us]').view(np.int64)
+    days, remainder = np.divmod(stamps, 86400 * 10 ** 6)
+    hours, remainder = np.divmod(remainder, 3600 * 10 ** 6)
+    minutes, remainder = np.divmod(remainder, 60 * 10 ** 6)
+    seconds, microseconds = np.divmod(remainder, 10 ** 6)
+
+    # Same terms as bt.date2num sums up:
+    fraction = hours / 24.0 + minutes / 1440.0 + seconds / 86400.0 + microseconds / 86400e6
+
+    return (days + EPOCH_ORDINAL).astype(np.float64) + fraction
+
+
+class BTgymArrayData(feed.DataBase):
+    """
+    Backtrader data feed over pandas dataframe columns, configured same way as `bt.feeds.PandasDirectData`:
+    line-named params hold column positions, 0 is datetime index, negative value - line is not present.
+
+    Columns are converted to float64 arrays once on start, datetime one by vectorized `date2num`,
+    so loading a bar takes a plain lookup per line. When feed is preloaded, line buffers get filled
+    in bulk from those arrays.
+    """
+    params = (
+        ('datetime', 0),
+        ('open', 1),
+        ('high', 2),
+        ('low', 3),
+        ('close', 4),
+        ('volume', 5),
+        ('openinterest', 6),
+    )
+
+    datafields = [
+        'datetime', 'open', 'high', 'low', 'close', 'volume', 'openinterest'
+    ]
+
+    def start(self):
+        super(BTgymArrayData, self).start()
+
+        frame = self.p.dataname
+        self._num_rows = frame.shape[0]
+        self._row = -1
+        self._columns = []  # [(line, float64 array), ...]
+        for alias in self.getlinealiases():
+            colidx = getattr(self.params, alias)
+            if colidx < 0:
+                continue
+
+            if colidx == 0:
+                values = frame.index.values
+
+            else:
+                values = frame.iloc[:, colidx - 1].values
+
+            if alias == 'datetime':
+                values = date2num_array(values)
+
+            else:
+                values = np.asarray(values, dtype=np.float64)
+
+            self._columns.append((getattr(self.lines, alias), values))
+
+        # Row-wise access is faster over python floats:
+        self._rows = [(line, values.tolist()) for line, values in self._columns]
+
+    def _load(self):
+        self._row += 1
+        if self._row >= self._num_rows:
+            return False
+
+        for line, values in self._rows:
+            line[0] = values[self._row]
+
+        return True
+
+    def preload(self):
+        """
+        Fills line buffers with entire columns at once. Falls back to bar by bar loading
+        if filters, timezone conversion, date bounds or memory saving buffers are set.
+        """
+        if self._filters or self._tzinput or self.p.fromdate is not None or self.p.todate is not None or\
+                self._row >= 0 or any([line.mode != LineBuffer.UnBounded for line in self.lines]):
+            return super(BTgymArrayData, self).preload()
+
+        columns = {id(line): values for line, values in self._columns}
+        for line in self.lines:
+            values = columns.get(id(line), np.full(self._num_rows, np.nan))
+            line.array.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+            line.idx = self._num_rows - 1
+            line.lencount = self._num_rows
+
+        self._row = self._num_rows
+
+        self._last()
+        self.home()
@@ -0,0 +1,172 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Shared data segments.
+
+Segment is a memory-mapped data storage (same layout as binary cache entry) placed in shared memory filesystem
+if one is available. Data owner writes segment once; any process on same host can attach segment and get
+read-only dataframe view of it with no data copying. Attached segments are kept open per process until detached
+or removed by owner; segments left behind by dead owners are removed by `clear_stale_segments()`.
+"""
+
+import os
+import uuid
+import shutil
+import tempfile
+
+import numpy as np
+
+from .cache import write_frame, read_frame
+
+# Segments attached by current process: {path: dataframe}
+_attached = dict()
+
+_prefix = 'btgym_'
+
+
+def default_segment_dir():
+    """
+    Returns:
+        shared memory filesystem directory if available, system temporary directory otherwise.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+
+    else:
+        return tempfile.gettempdir()
+
+
+def create_segment(frame, name='data', segment_dir=None, dtype=None):
+    """
+    Writes dataframe to new shared segment.
+
+    Args:
+        frame:          pandas dataframe indexed by datetime;
+        name:           str, segment name prefix;
+        segment_dir:    str, directory to place segment in, def. is shared memory filesystem;
+        dtype:          float type to store data columns as, def. is common type of frame columns.
+
+    Returns:
+        str, segment path.
+    """
+    if segment_dir is None:
+        segment_dir = default_segment_dir()
+
+    path = os.path.join(
+        segment_dir,
+        '{}{}_{}_{}'.format(_prefix, os.getpid(), name, uuid.uuid4().hex[:8])
+    )
+    write_frame(path, frame, dtype=dtype)
+    return path
+
+
+def attach_segment(path):
+    """
+    Attaches shared segment.
+
+    Args:
+        path:   str, segment path.
+
+    Returns:
+        read-only pandas dataframe holding entire segment data.
+    """
+    try:
+        return _attached[path]
+
+    except KeyError:
+        # New segment usually means new data generation, forget ones removed by owners:
+        for attached_path in [attached_path for attached_path in _attached if not os.path.isdir(attached_path)]:
+            detach_segment(attached_path)
+
+        frame = read_frame(path, mmap=True)
+        _attached[path] = frame
+        return frame
+
+
+def detach_segment(path):
+    """
+    Forgets segment attached by current process. Its memory is unmapped once no dataframe views of it are left,
+    and freed once all processes have detached it and owner has removed it.
+
+    Args:
+        path:   str, segment path.
+    """
+    _attached.pop(path, None)
+
+
+def release_segment(path):
+    """
+    Detaches and removes shared segment. Processes already attached can still use it until detached.
+
+    Args:
+        path:   str, segment path.
+    """
+    detach_segment(path)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _owner_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        # Someone else's process:
+        return True
+
+    return True
+
+
+def clear_stale_segments(segment_dir=None):
+    """
+    Removes segments left behind by owner processes no longer running, e.g. crashed ones.
+
+    Args:
+        segment_dir:    str, directory to look for segments in, def. is shared memory filesystem.
+
+    Returns:
+        list of removed segments paths.
+    """
+    if segment_dir is None:
+        segment_dir = default_segment_dir()
+
+    removed = []
+    try:
+        names = os.listdir(segment_dir)
+
+    except OSError:
+        return removed
+
+    for name in names:
+        path = os.path.join(segment_dir, name)
+        try:
+            assert name.startswith(_prefix) and os.path.isdir(path)
+            pid = int(name[len(_prefix):].split('_', 1)[0])
+
+        except (AssertionError, ValueError):
+            continue
+
+        if not _owner_is_alive(pid):
+            release_segment(path)
+            removed.append(path)
+
+    return removed
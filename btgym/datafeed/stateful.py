@@ -20,6 +20,9 @@
 import random
 import math
 import datetime
+import threading
+
+import numpy as np
 
 from .derivative import BTgymRandomDataDomain
 
@@ -113,7 +116,7 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
         else:
             return param_0
 
-    def __init__(self, name='SeqDataDomain', **kwargs):
+    def __init__(self, name='SeqDataDomain', prefetch=0, **kwargs):
         """
         Args:
             filename:           Str or list of str, file_names containing CSV historic data;
@@ -125,6 +128,11 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
             name:               str, optional
             task:               int, optional
             log_level:          int, logbook.level
+            cache_dir:          str, optional, directory to keep binary copies of parsed source files in;
+            chunked:            bool, optional, keep data on disk and read only records being sampled;
+            chunk_size:         int, optional, number of records per chunk in chunked mode;
+            compact:            bool, optional, store data as float32;
+            prefetch:           int, number of next `Trials` to prepare in background thread, 0 - disabled;
 
         Note:
             - Total number of `Trials` (cardinality) is inferred upon args given and overall dataset size.
@@ -139,9 +147,66 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
         self.total_samples = -1
         self.sample_num = -1
         self.sample_stride = -1
+        self.trial_seed = None  # Trials random generators are seeded by this and Trial number, set on reset
+
+        self.prefetch = prefetch
+        self._prefetched = dict()  # {sample_num: trial}
+        self._prefetch_generation = 0
+        self._prefetch_condition = None
+        self._prefetch_thread = None
 
         super(BTgymSequentialDataDomain, self).__init__(name=name, **kwargs)
 
+    def __getstate__(self):
+        state = super(BTgymSequentialDataDomain, self).__getstate__()
+        state['_prefetched'] = dict()
+        state['_prefetch_condition'] = None
+        state['_prefetch_thread'] = None
+        return state
+
+    def append(self, data_filename=None):
+        """
+        Extends loaded data with new records, see base class description for details.
+        Cardinality of `Trials` grows accordingly; iteration position and `Trials` prefetched are kept.
+        Exhausted `Trials` sequence gets resumed once next `Trial` fits in data.
+
+        Args:
+            data_filename:  [opt] csv data filename or directory as string or list of such strings.
+
+        Returns:
+            int, number of records appended.
+        """
+        num_records = super(BTgymSequentialDataDomain, self).append(data_filename=data_filename)
+
+        if num_records > 0 and self.total_samples >= 0 and self.sample_index is not None:
+            if self._prefetch_condition is not None:
+                with self._prefetch_condition:
+                    self._extend_sequence()
+                    self._prefetch_condition.notify_all()
+
+            else:
+                self._extend_sequence()
+
+        return num_records
+
+    def _extend_sequence(self):
+        """
+        Updates cardinality of `Trials` after data has been appended.
+        """
+        self.total_samples = self._last_trial_num()
+        self.log.info('Cardinality: {}.'.format(self.total_samples))
+
+        if not self.is_ready and self.sample_num <= self.total_samples:
+            self.is_ready = True
+            self.log.notice('Sampling sequence resumed at {}-th Trial'.format(self.sample_num))
+
+    def _last_trial_num(self):
+        """
+        Returns:
+            number of last `Trial` entirely lying within data.
+        """
+        return int((self.data.shape[0] - 1 - self.sample_num_records) / self.sample_stride)
+
     def sample(self, **kwargs):
         """
         Iteratively samples from sequence of `Trials`.
@@ -172,6 +237,12 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
             )
             return self.sample_instance
 
+    def sample_batch(self, batch_size, **kwargs):
+        """
+        Not supported: `Trials` are sampled in sequence, use `.sample()`.
+        """
+        raise NotImplementedError('Sequential domain does not support batch sampling, use .sample()')
+
     def _get_interval(self, sample_num):
         """
         Defines exact interval and corresponding datetime stamps for Trial
@@ -186,7 +257,7 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
 
         if self.start_00:
             first_day = self.data[first_row:first_row + 1].index[0]
-            first_row = self.data.index.get_loc(first_day.date(), method='nearest')
+            first_row = int(self.data.index.searchsorted(first_day.normalize(), side='left'))
             self.log.debug('Trial train start time adjusted to <00:00>')
 
         last_row = first_row + self.sample_num_records
@@ -211,6 +282,11 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
             total_steps:    max gym environmnet steps allowed for full sweep over `Trials`;
             skip_frame:     BTGym specific, such as: `total_btgym_dataset_steps = total_steps * skip_frame`;
         """
+        if self._prefetch_condition is not None:
+            with self._prefetch_condition:
+                self._prefetched = dict()
+                self._prefetch_generation += 1
+
         self._reset(data_filename=data_filename, **kwargs)
 
         # Total gym-environment steps and step training starts with:
@@ -252,14 +328,12 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
 
         self.trial_train_range_row = int(self.trial_train_range_delta.total_seconds() / (self.timeframe * 60))
 
-        # Infer cardinality of Trials:
-        self.total_samples = int(
-            (self.data.shape[0] - self.trial_train_range_row) / self.trial_test_range_row
-        )
-
         # Set domain sample stride as duration of Trial test period:
         self.sample_stride = self.trial_test_range_row
 
+        # Infer cardinality of Trials:
+        self.total_samples = self._last_trial_num()
+
         try:
             assert self.total_samples > 0
 
@@ -272,6 +346,9 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
         # Current trial to start with:
         self.sample_num = int(self.total_samples * self.global_step / self.total_steps)
 
+        # Trials get sampled in any order by prefetching thread, so seed those by position in sequence:
+        self.trial_seed = int(self.rng.integers(2 ** 63))
+
         if self.expanding:
             t_type = 'EXPANDING'
 
@@ -293,6 +370,83 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
 
         self.is_ready = True
 
+        if self._prefetch_condition is not None:
+            # Discard anything prepared while resetting and start over:
+            with self._prefetch_condition:
+                self._prefetched = dict()
+                self._prefetch_generation += 1
+                self._prefetch_condition.notify_all()
+
+    def _make_trial(self, sample_num):
+        """
+        Samples Trial with given position in iteration sequence.
+        Trial random generator is seeded from `trial_seed` and `sample_num`, so it doesn't depend on
+        which thread samples Trial first.
+        """
+        interval, time = self._get_interval(sample_num)
+
+        self.log.notice(
+            'Trial #{} @: {} <--> {};'.format(sample_num, time[0], time[-1])
+        )
+        self.log.debug(
+            'Trial #{} rows: {} <--> {}'.
+                format(
+                sample_num,
+                interval[0],
+                interval[-1]
+            )
+        )
+        return self._sample_interval(
+            interval,
+            name='sequential_trial_',
+            sample_num=sample_num,
+            rng=np.random.default_rng([self.trial_seed, sample_num])
+        )
+
+    def _prefetch(self):
+        """
+        Prefetching thread body: keeps next `prefetch` Trials ready along with their statistic.
+        """
+        condition = self._prefetch_condition
+        failed = set()  # Trials failed to prefetch, left for main thread to report
+        failed_generation = None
+        while True:
+            with condition:
+                while True:
+                    generation = self._prefetch_generation
+                    if generation != failed_generation:
+                        failed = set()
+                        failed_generation = generation
+
+                    if self._prefetch_thread is not threading.current_thread():
+                        # Stopped or replaced:
+                        return
+
+                    sample_num = None
+                    if self.is_ready:
+                        for i in range(self.sample_num, min(self.sample_num + self.prefetch, self.total_samples + 1)):
+                            if i not in self._prefetched and i not in failed:
+                                sample_num = i
+                                break
+
+                    if sample_num is not None:
+                        break
+
+                    condition.wait()
+
+            try:
+                trial = self._make_trial(sample_num)
+                trial.describe()
+
+            except Exception as e:
+                self.log.debug('Failed to prefetch Trial #{}: {}'.format(sample_num, e))
+                failed.add(sample_num)
+                continue
+
+            with condition:
+                if generation == self._prefetch_generation and sample_num >= self.sample_num:
+                    self._prefetched[sample_num] = trial
+
     def _sample_sequential(self):
         """
         Iteratively samples Trials.
@@ -306,21 +460,56 @@ class BTgymSequentialDataDomain(BTgymRandomDataDomain):
             self.log.warning('Sampling sequence exhausted at {}-th Trial'.format(self.sample_num))
             return None
 
+        elif self.prefetch > 0:
+            if self._prefetch_thread is None:
+                self._prefetch_condition = threading.Condition()
+                self._prefetch_thread = threading.Thread(
+                    target=self._prefetch,
+                    name='BTgymSequentialPrefetch',
+                    daemon=True
+                )
+                self._prefetch_thread.start()
+
+            with self._prefetch_condition:
+                trial = self._prefetched.pop(self.sample_num, None)
+                for i in [i for i in self._prefetched if i < self.sample_num]:
+                    del self._prefetched[i]
+
+            if trial is None:
+                self.log.debug('Trial #{} not prefetched yet.'.format(self.sample_num))
+                trial = self._make_trial(self.sample_num)
+
+            with self._prefetch_condition:
+                self.sample_num += 1
+                self._prefetch_condition.notify_all()
+
+            return trial
+
         else:
-            # Get Trial:
-            interval, time = self._get_interval(self.sample_num)
+            if self._prefetch_thread is not None:
+                self.stop_prefetch()
 
-            self.log.notice(
-                'Trial #{} @: {} <--> {};'.format(self.sample_num, time[0], time[-1])
-            )
-            self.log.debug(
-                'Trial #{} rows: {} <--> {}'.
-                    format(
-                    self.sample_num,
-                    interval[0],
-                    interval[-1]
-                )
-            )
-            trial = self._sample_interval(interval, name='sequential_trial_')
+            trial = self._make_trial(self.sample_num)
             self.sample_num += 1
             return trial
+
+    def stop_prefetch(self):
+        """
+        Stops prefetching thread and discards `Trials` prepared, if any;
+        thread gets started again with next sample taken while `prefetch` > 0.
+        """
+        if self._prefetch_thread is None:
+            return
+
+        thread = self._prefetch_thread
+        with self._prefetch_condition:
+            self._prefetch_thread = None
+            self._prefetched = dict()
+            self._prefetch_generation += 1
+            self._prefetch_condition.notify_all()
+
+        if thread is not threading.current_thread():
+            thread.join()
+
+        self._prefetch_condition = None
+        self.log.debug('Prefetching stopped.')
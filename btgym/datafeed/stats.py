@@ -0,0 +1,357 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import numpy as np
+import pandas as pd
+
+
+class RangeStat:
+    """
+    Precomputed descriptive statistic of dataframe columns, answers queries for any continuous range of rows.
+
+    Keeps per-block summaries only, data itself is referenced, not copied::
+
+        - prefix counts, sums and sums of squares over blocks: count, mean and std of any range in O(block_size);
+        - sparse table over per-block minimums and maximums: min and max of any range in O(block_size);
+        - per-block quantile sketches: approximate percentiles of any range in O(num_blocks).
+
+    Statistic can be restricted to blocks covering some range of rows, see `slice()`: such statistic answers
+    queries within that range and is small enough to be passed along with data sample.
+    """
+    def __init__(self, frame, block_size=256, sketch_size=16):
+        """
+        Args:
+            frame:          pandas dataframe;
+            block_size:     int, number of rows in block for min/max and quantile summaries;
+            sketch_size:    int, number of quantiles kept per block.
+        """
+        self.columns = frame.columns
+        self.block_size = block_size
+        self.sketch_size = sketch_size
+        self.num_records = 0
+
+        # Data columns, row `i` of those stands for row `origin + i`; blocks kept start from `first_block`:
+        self.values = self._values(frame)
+        self.origin = 0
+        self.first_block = 0
+
+        # Shift by first values to keep sums of squares well conditioned:
+        self.shift = np.nan_to_num(self._rows(0, 1)[0]) if frame.shape[0] > 0 else np.zeros(frame.shape[-1])
+
+        num_columns = frame.shape[-1]
+        self.prefix_count = np.zeros((1, num_columns))
+        self.prefix_sum = np.zeros((1, num_columns))
+        self.prefix_sum_sq = np.zeros((1, num_columns))
+        self.block_min = np.zeros((0, num_columns))
+        self.block_max = np.zeros((0, num_columns))
+        self.sketch = np.zeros((0, sketch_size, num_columns))
+
+        self._extend(frame.shape[0])
+
+    @staticmethod
+    def _values(frame):
+        """
+        Returns:
+            list of frame columns values; columns are views of frame data, so no copy is made for mixed dtypes.
+        """
+        return [frame[column].values for column in frame.columns]
+
+    def __getstate__(self):
+        # Data rows are not pickled, owner of data should set them back with `attach()`;
+        # sparse tables are cheap to rebuild:
+        state = self.__dict__.copy()
+        state['values'] = None
+        state['sparse_min'] = None
+        state['sparse_max'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_sparse_tables()
+
+    def attach(self, frame, origin=0):
+        """
+        Sets data rows statistic refers to.
+
+        Args:
+            frame:  pandas dataframe, rows statistic was computed over, starting from `origin` one;
+            origin: int, row number of first frame row.
+        """
+        self.values = self._values(frame)
+        self.origin = origin
+
+    def slice(self, first_row, last_row):
+        """
+        Restricts statistic to blocks covering [first_row, last_row) range, data rows are not kept.
+        Rows numbers stay same: sliced statistic of [1000, 2000) range answers queries for [1000, 1500) range
+        and so on, once attached to those rows data with `origin=1000`.
+
+        Returns:
+            new RangeStat instance.
+        """
+        first_block = first_row // self.block_size
+        last_block = -(-last_row // self.block_size)
+        start, stop = first_block - self.first_block, last_block - self.first_block
+
+        stat = RangeStat.__new__(RangeStat)
+        stat.__dict__.update(self.__dict__)
+        stat.values = None
+        stat.origin = first_row
+        stat.first_block = first_block
+        stat.num_records = min(last_row, self.num_records)
+        stat.prefix_count = self.prefix_count[start: stop + 1]
+        stat.prefix_sum = self.prefix_sum[start: stop + 1]
+        stat.prefix_sum_sq = self.prefix_sum_sq[start: stop + 1]
+        stat.block_min = self.block_min[start: stop]
+        stat.block_max = self.block_max[start: stop]
+        stat.sketch = self.sketch[start: stop]
+        stat._build_sparse_tables()
+
+        return stat
+
+    def extend(self, frame):
+        """
+        Extends statistic to rows appended to data: only summaries of new and last incomplete blocks are computed.
+
+        Args:
+            frame:  pandas dataframe statistic was computed over, with new rows appended.
+        """
+        self.values = self._values(frame)
+        self._extend(frame.shape[0] - self.num_records)
+
+    def _extend(self, num_records, max_blocks=4096):
+        # Last block can be incomplete, so summaries are recomputed starting from it:
+        first_block = self.num_records // self.block_size
+        self.num_records += num_records
+
+        self.prefix_count = self.prefix_count[:first_block + 1]
+        self.prefix_sum = self.prefix_sum[:first_block + 1]
+        self.prefix_sum_sq = self.prefix_sum_sq[:first_block + 1]
+        self.block_min = self.block_min[:first_block]
+        self.block_max = self.block_max[:first_block]
+        self.sketch = self.sketch[:first_block]
+
+        # Few blocks at a time to keep temporary copies small:
+        for start in range(first_block * self.block_size, self.num_records, max_blocks * self.block_size):
+            self._add_blocks(self._rows(start, min(start + max_blocks * self.block_size, self.num_records)))
+
+        self._build_sparse_tables()
+
+    def _add_blocks(self, values):
+        """
+        Appends summaries of consecutive blocks, last block can be incomplete.
+        """
+        # Per-block summaries, last block padded with NaN's:
+        num_blocks = -(-values.shape[0] // self.block_size)
+        padded = np.full((num_blocks * self.block_size, values.shape[-1]), np.nan)
+        padded[:values.shape[0]] = values
+        blocks = padded.reshape(num_blocks, self.block_size, -1)
+
+        valid = ~np.isnan(blocks)
+        shifted = np.where(valid, blocks - self.shift, 0.0)
+        self.prefix_count = np.concatenate(
+            [self.prefix_count, self.prefix_count[-1] + np.cumsum(valid.sum(axis=1), axis=0)]
+        )
+        self.prefix_sum = np.concatenate(
+            [self.prefix_sum, self.prefix_sum[-1] + np.cumsum(shifted.sum(axis=1), axis=0)]
+        )
+        self.prefix_sum_sq = np.concatenate(
+            [self.prefix_sum_sq, self.prefix_sum_sq[-1] + np.cumsum((shifted ** 2).sum(axis=1), axis=0)]
+        )
+
+        # NaN's get sorted to the end of block:
+        blocks = np.sort(blocks, axis=1)
+        block_count = valid.sum(axis=1)
+        last = np.maximum(block_count - 1, 0)[:, None, :]
+        block_min = np.where(block_count > 0, blocks[:, 0, :], np.inf)
+        block_max = np.where(block_count > 0, np.take_along_axis(blocks, last, axis=1)[:, 0, :], -np.inf)
+        positions = np.rint(np.linspace(0, 1, self.sketch_size)[None, :, None] * last).astype(np.int64)
+
+        self.block_min = np.concatenate([self.block_min, block_min])
+        self.block_max = np.concatenate([self.block_max, block_max])
+        self.sketch = np.concatenate([self.sketch, np.take_along_axis(blocks, positions, axis=1)])
+
+    def _build_sparse_tables(self):
+        # Sparse tables: level k holds min/max over 2**k consecutive blocks:
+        self.sparse_min = [self.block_min]
+        self.sparse_max = [self.block_max]
+        width = 1
+        while 2 * width <= self.block_min.shape[0]:
+            self.sparse_min.append(np.fmin(self.sparse_min[-1][:-width], self.sparse_min[-1][width:]))
+            self.sparse_max.append(np.fmax(self.sparse_max[-1][:-width], self.sparse_max[-1][width:]))
+            width *= 2
+
+    def _rows(self, first_row, last_row):
+        """
+        Returns:
+            data rows of [first_row, last_row) range as float64 array.
+        """
+        return np.stack(
+            [column[first_row - self.origin: last_row - self.origin] for column in self.values],
+            axis=-1,
+        ).astype(np.float64, copy=False)
+
+    def _split(self, first_row, last_row):
+        """
+        Splits range to full blocks and edge rows ranges.
+
+        Returns:
+            first and last full blocks numbers relative to kept ones, list of edge ranges.
+        """
+        first_block = -(-first_row // self.block_size)
+        last_block = last_row // self.block_size
+
+        if first_block < last_block:
+            edges = [(first_row, first_block * self.block_size), (last_block * self.block_size, last_row)]
+            return first_block - self.first_block, last_block - self.first_block, edges
+
+        else:
+            return None, None, [(first_row, last_row)]
+
+    def _sums(self, first_row, last_row):
+        """
+        Returns:
+            count, sum and sum of squares of shifted values over [first_row, last_row) range.
+        """
+        first_block, last_block, edges = self._split(first_row, last_row)
+        if first_block is not None:
+            count = self.prefix_count[last_block] - self.prefix_count[first_block]
+            total = self.prefix_sum[last_block] - self.prefix_sum[first_block]
+            total_sq = self.prefix_sum_sq[last_block] - self.prefix_sum_sq[first_block]
+
+        else:
+            count, total, total_sq = 0.0, 0.0, 0.0
+
+        for start, stop in edges:
+            if stop > start:
+                rows = self._rows(start, stop)
+                valid = ~np.isnan(rows)
+                shifted = np.where(valid, rows - self.shift, 0.0)
+                count = count + valid.sum(axis=0)
+                total = total + shifted.sum(axis=0)
+                total_sq = total_sq + (shifted ** 2).sum(axis=0)
+
+        return count, total, total_sq
+
+    def count(self, first_row, last_row):
+        return self._sums(first_row, last_row)[0] * np.ones(self.columns.shape[0])
+
+    def mean(self, first_row, last_row):
+        count, total, _ = self._sums(first_row, last_row)
+        with np.errstate(all='ignore'):
+            return total / count + self.shift
+
+    def std(self, first_row, last_row):
+        count, total, total_sq = self._sums(first_row, last_row)
+        with np.errstate(all='ignore'):
+            return np.sqrt(np.maximum(total_sq - total ** 2 / count, 0) / (count - 1))
+
+    def _blocks_query(self, tables, reduce, first_block, last_block):
+        level = int(np.log2(last_block - first_block))
+        return reduce(tables[level][first_block], tables[level][last_block - 2 ** level])
+
+    def _range_reduce(self, first_row, last_row, tables, reduce, fill):
+        """
+        Reduces [first_row, last_row) range: full blocks from sparse table, partial ones directly.
+        """
+        result = np.full(self.columns.shape[0], fill)
+        first_block, last_block, edges = self._split(first_row, last_row)
+
+        if first_block is not None:
+            result = reduce(result, self._blocks_query(tables, reduce, first_block, last_block))
+
+        for start, stop in edges:
+            if stop > start:
+                with np.errstate(all='ignore'):
+                    result = reduce(result, reduce.reduce(self._rows(start, stop), axis=0))
+
+        # No valid values in range:
+        result[result == fill] = np.nan
+
+        return result
+
+    def min(self, first_row, last_row):
+        return self._range_reduce(first_row, last_row, self.sparse_min, np.fmin, np.inf)
+
+    def max(self, first_row, last_row):
+        return self._range_reduce(first_row, last_row, self.sparse_max, np.fmax, -np.inf)
+
+    def percentiles(self, first_row, last_row, q=(.25, .5, .75)):
+        """
+        Approximate percentiles: merges quantile sketches of full blocks with raw values of partial ones.
+        """
+        first_block, last_block, edges = self._split(first_row, last_row)
+
+        if first_block is not None:
+            sketch = self.sketch[first_block: last_block].reshape(-1, self.columns.shape[0])
+            points = np.concatenate([self._rows(*edges[0]), sketch, self._rows(*edges[-1])])
+            # Sketch points stand for block_size / sketch_size records each:
+            weights = np.ones(points.shape[0])
+            head = edges[0][-1] - edges[0][0]
+            weights[head: head + sketch.shape[0]] = self.block_size / self.sketch.shape[1]
+
+        else:
+            points = self._rows(first_row, last_row)
+            weights = np.ones(points.shape[0])
+
+        result = np.full((len(q), self.columns.shape[0]), np.nan)
+        for column in range(self.columns.shape[0]):
+            valid = ~np.isnan(points[:, column])
+            if not valid.any():
+                continue
+
+            order = np.argsort(points[valid, column], kind='mergesort')
+            column_points = points[valid, column][order]
+            cum_weights = np.cumsum(weights[valid][order])
+            # Same interpolation as unweighted case when all weights are ones:
+            positions = (cum_weights - cum_weights[0]) / max(cum_weights[-1] - cum_weights[0], 1e-10)
+            result[:, column] = np.interp(q, positions, column_points)
+
+        return result
+
+    def describe(self, first_row=0, last_row=None, percentiles=(.25, .5, .75)):
+        """
+        Descriptive statistic of [first_row, last_row) range, same layout as pandas.DataFrame.describe().
+
+        Args:
+            first_row:      int, first row of range;
+            last_row:       int, row next to last one of range, def. is number of records;
+            percentiles:    list of percentiles to include, in [0, 1], approximate; None or empty - skip.
+
+        Returns:
+            pandas dataframe.
+        """
+        if last_row is None:
+            last_row = self.num_records
+
+        rows = [
+            self.count(first_row, last_row),
+            self.mean(first_row, last_row),
+            self.std(first_row, last_row),
+            self.min(first_row, last_row),
+        ]
+        names = ['count', 'mean', 'std', 'min']
+        if percentiles:
+            rows += list(self.percentiles(first_row, last_row, percentiles))
+            names += ['{:g}%'.format(q * 100) for q in percentiles]
+
+        rows.append(self.max(first_row, last_row))
+        names.append('max')
+
+        return pd.DataFrame(np.stack(rows), index=names, columns=self.columns)
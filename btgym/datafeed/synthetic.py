@@ -0,0 +1,242 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+from logbook import WARNING
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from .derivative import BTgymRandomDataDomain
+
+
+def gbm_path(rng, num_records, start_price=1.0, drift=0.0, volatility=1e-4):
+    """
+    Geometric Brownian motion close prices; drift and volatility are per-bar.
+    """
+    increments = (drift - 0.5 * volatility ** 2) + volatility * rng.standard_normal(num_records)
+    return start_price * np.exp(np.cumsum(increments))
+
+
+def ou_path(rng, num_records, start_price=1.0, mean=1.0, theta=1e-3, volatility=1e-4):
+    """
+    Ornstein-Uhlenbeck (mean-reverting) close prices: discretized as AR(1) process, `theta` is per-bar
+    reversion rate, volatility is relative to mean.
+    """
+    decay = 1.0 - theta
+    noise = mean * volatility * rng.standard_normal(num_records)
+    deviation, _ = lfilter([1.0], [1.0, -decay], noise, zi=[decay * (start_price - mean)])
+    return mean + deviation
+
+
+def regime_switching_path(
+        rng,
+        num_records,
+        start_price=1.0,
+        drift=(1e-6, -1e-6, 0.0),
+        volatility=(5e-5, 2e-4, 1e-4),
+        switch_prob=1e-4,
+):
+    """
+    Markov regime-switching geometric random walk: every regime has its own per-bar drift and volatility,
+    regime durations are geometrically distributed with mean of 1 / switch_prob bars.
+    """
+    drift = np.asarray(drift, dtype=np.float64)
+    volatility = np.asarray(volatility, dtype=np.float64)
+    num_regimes = drift.shape[0]
+
+    # Draw regime durations until entire path is covered:
+    durations = rng.geometric(switch_prob, size=int(num_records * switch_prob) + 16)
+    while durations.sum() < num_records:
+        durations = np.concatenate([durations, rng.geometric(switch_prob, size=durations.shape[0])])
+
+    # Next regime always differs from current one:
+    if num_regimes > 1:
+        regimes = (rng.randint(num_regimes) + np.cumsum(rng.randint(1, num_regimes, size=durations.shape[0])))
+        regimes %= num_regimes
+
+    else:
+        regimes = np.zeros(durations.shape[0], dtype=np.int64)
+
+    regime = np.repeat(regimes, durations)[:num_records]
+    bar_volatility = volatility[regime]
+    increments = (drift[regime] - 0.5 * bar_volatility ** 2) + bar_volatility * rng.standard_normal(num_records)
+    return start_price * np.exp(np.cumsum(increments))
+
+
+SYNTHETIC_PROCESSES = dict(
+    gbm=gbm_path,
+    ou=ou_path,
+    regime=regime_switching_path,
+)
+
+
+def ohlcv_from_close(rng, close, open_price, range_volatility=5e-5, mean_volume=100.0):
+    """
+    Builds OHLCV bars around close prices: each bar opens at previous close,
+    high and low deviate from bar body by half-normal noise.
+
+    Returns:
+        array of [num_records, 5]
+    """
+    num_records = close.shape[0]
+    opens = np.empty(num_records)
+    opens[0] = open_price
+    opens[1:] = close[:-1]
+    body_high = np.maximum(opens, close)
+    body_low = np.minimum(opens, close)
+    spread = np.abs(rng.standard_normal((2, num_records))) * range_volatility * close
+    volume = rng.gamma(2.0, mean_volume / 2.0, size=num_records)
+    return np.stack([opens, body_high + spread[0], body_low - spread[1], close, volume], axis=-1)
+
+
+class BTgymSyntheticDataDomain(BTgymRandomDataDomain):
+    """
+    Top-level data class generating OHLCV data by stochastic process instead of loading it from CSV files.
+    Same sampling contract as BTgymRandomDataDomain::
+
+        Domain.sample() --> Trial.sample() --> Episode.to_btfeed() --> bt.Startegy
+
+    Data is generated by vectorized numpy routines when loaded (on first reset or describe),
+    same seed gives same data.
+    """
+    def __init__(
+            self,
+            process='gbm',
+            process_params=None,
+            num_records=100000,
+            start_time='2017-01-02',
+            seed=None,
+            compact=False,
+            trial_params=None,
+            episode_params=None,
+            target_period=None,
+            parsing_params=None,
+            name='SynthDataDomain',
+            task=0,
+            log_level=WARNING,
+    ):
+        """
+        Args:
+            process:            str, price process: `gbm` - geometric brownian motion, `ou` - Ornstein-Uhlenbeck,
+                                `regime` - Markov regime-switching random walk;
+            process_params:     dict, process-specific parameters, see respective `*_path` functions, may also
+                                hold `range_volatility` and `mean_volume` bar shaping params;
+            num_records:        int, number of bars to generate;
+            start_time:         str or datetime, first bar time;
+            seed:               int or None, random seed for data generation;
+            compact:            bool, store data as float32;
+            trial_params:       dict, describes trial parameters, should contain keys:
+                                {sample_duration, time_gap, start_00, start_weekdays, test_period, expanding};
+            episode_params:     dict, describes episode parameters, should contain keys:
+                                {sample_duration, time_gap, start_00, start_weekdays};
+            target_period:      dict, domain target period, def={'days': 0, 'hours': 0, 'minutes': 0};
+            parsing_params:     data columns and bt.feed mapping options, see base class description for details;
+                                `timeframe` sets bar period in minutes;
+            name:               str, optional
+            task:               int, optional
+            log_level:          int, logbook.level
+        """
+        self.process = process
+        if process_params is None:
+            self.process_params = dict()
+
+        else:
+            self.process_params = process_params
+
+        self.num_records = num_records
+        self.start_time = start_time
+        self.seed = seed
+
+        super(BTgymSyntheticDataDomain, self).__init__(
+            filename='synthetic_{}'.format(process),
+            parsing_params=parsing_params,
+            trial_params=trial_params,
+            episode_params=episode_params,
+            target_period=target_period,
+            name=name,
+            task=task,
+            log_level=log_level,
+            compact=compact,
+        )
+
+        try:
+            assert process in SYNTHETIC_PROCESSES
+
+        except AssertionError:
+            self.log.exception(
+                'Unknown process <{}>, expected one of: {}'.format(process, list(SYNTHETIC_PROCESSES.keys()))
+            )
+            raise AssertionError
+
+    def read_csv(self, data_filename=None, force_reload=False):
+        """
+        Populates instance with generated data. Overrides CSV loading, `data_filename` arg is ignored.
+
+        Args:
+            data_filename: not used.
+            force_reload:  ignore data generated before.
+        """
+        if self.data is not None and not force_reload:
+            self.log.debug('data has been already generated. Use `force_reload=True` to regenerate')
+            return
+
+        self.unshare()
+        self.range_stat = None
+        self.shard_interval = None
+        self.data = self.generate()
+
+        if self.compact:
+            self.data = self.data.astype(self._dtype())
+
+        if self.pyramid:
+            self.data = self._add_pyramid(self.data)
+
+        if self.features:
+            self.data = self._add_features(self.data)
+
+        self.data_range_delta = (self.data.index[-1] - self.data.index[0]).to_pytimedelta()
+        self.log.info('Generated {} records by <{}> process.'.format(self.data.shape[0], self.process))
+
+    def generate(self):
+        """
+        Generates OHLCV data.
+
+        Returns:
+            pandas dataframe of `num_records` bars, indexed by datetime.
+        """
+        rng = np.random.RandomState(self.seed)
+        process_params = self.process_params.copy()
+        bar_params = dict(
+            range_volatility=process_params.pop('range_volatility', 5e-5),
+            mean_volume=process_params.pop('mean_volume', 100.0),
+        )
+        close = SYNTHETIC_PROCESSES[self.process](rng, self.num_records, **process_params)
+        open_price = process_params.get('start_price', 1.0)
+
+        index = pd.date_range(
+            start=self.start_time,
+            periods=self.num_records,
+            freq='{}min'.format(self.timeframe),
+        )
+        return pd.DataFrame(
+            ohlcv_from_close(rng, close, open_price, **bar_params),
+            index=index,
+            columns=self.names[:5],
+        )
@@ -1,7 +1,20 @@
 
 import unittest
+import tempfile
+import shutil
+import os
+import pickle
+import copy
+import subprocess
+import numpy as np
+import pandas as pd
+import backtrader as bt
 from .derivative import BTgymDataset, BTgymRandomDataDomain
 from .stateful import BTgymSequentialDataDomain
+from .synthetic import BTgymSyntheticDataDomain
+from .ticks import ticks_to_bars
+from .stats import RangeStat
+from . import shared
 
 
 filename='../examples/data/DAT_ASCII_EURUSD_M1_2016.csv'
@@ -84,8 +97,8 @@ class DomainTest(unittest.TestCase):
         """
         rnd_domain = BTgymRandomDataDomain(
             filename=filename,
-            trial_params=trial_params,
-            episode_params=episode_params,
+            trial_params=copy.deepcopy(trial_params),
+            episode_params=copy.deepcopy(episode_params),
             target_period={'days': 40, 'hours': 0, 'minutes': 0},
             log_level=log_level,
         )
@@ -135,6 +148,449 @@ class DomainTest(unittest.TestCase):
                                     ):
                                         self.assertLess(e_sup_time, e_inf_time)
 
+    def test_csv_cache_consistency(self):
+        """
+        Data loaded from binary cache should be same as parsed one.
+        """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            parsed_domain = BTgymDataset(filename=filename, cache_dir=None, log_level=log_level)
+            parsed_domain.read_csv()
+
+            # First one fills cache, second one loads from it:
+            domains = [
+                BTgymDataset(filename=filename, cache_dir=cache_dir, log_level=log_level) for i in range(2)
+            ]
+            for domain in domains:
+                domain.read_csv()
+
+            self.assertGreater(len(os.listdir(cache_dir)), 0)
+            for domain in domains:
+                self.assertTrue(parsed_domain.data.index.equals(domain.data.index))
+                self.assertTrue((parsed_domain.data.values == domain.data.values).all())
+
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_shared_segment_lifecycle(self):
+        """
+        Sample pickled from shared domain should attach to same data; segment should be detached
+        once released by owner, and ones left by dead owners should get removed.
+        """
+        segment_dir = tempfile.mkdtemp()
+        try:
+            domain = BTgymDataset(filename=filename, test_period={'days': 2}, log_level=log_level)
+            domain.reset()
+            data = domain.data.copy()
+            path = domain.share(segment_dir=segment_dir)['path']
+            self.assertTrue(data.index.equals(domain.data.index))
+            self.assertTrue((data.values == domain.data.values).all())
+
+            trial = domain.sample()
+            restored_trial = pickle.loads(pickle.dumps(trial))
+            self.assertIsNone(pickle.loads(pickle.dumps(domain)).parent_stat)
+            self.assertIn(path, shared._attached)
+            self.assertTrue(restored_trial.data.index.equals(trial.data.index))
+            self.assertTrue((restored_trial.data.values == trial.data.values).all())
+
+            # New data generation replaces segment:
+            domain.unshare()
+            self.assertFalse(os.path.exists(path))
+            self.assertNotIn(path, shared._attached)
+
+            shared._attached[path] = None  # as if attached by client and removed by owner
+            new_path = domain.share(segment_dir=segment_dir)['path']
+            self.assertIn(new_path, shared._attached)
+            self.assertNotIn(path, shared._attached)
+
+            # Segment left by crashed owner:
+            process = subprocess.Popen(['true'])
+            process.wait()
+            stale_path = os.path.join(segment_dir, 'btgym_{}_data_00000000'.format(process.pid))
+            os.mkdir(stale_path)
+            self.assertEqual(shared.clear_stale_segments(segment_dir), [stale_path])
+            self.assertTrue(os.path.exists(new_path))
+
+            domain.unshare()
+            self.assertEqual(os.listdir(segment_dir), [])
+
+        finally:
+            shutil.rmtree(segment_dir)
+
+    def test_chunked_consistency(self):
+        """
+        Chunked data slices and statistic should match in-memory ones.
+        """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            domain = BTgymDataset(filename=filename, log_level=log_level)
+            domain.read_csv()
+            chunked_domain = BTgymDataset(
+                filename=filename,
+                cache_dir=cache_dir,
+                chunked=True,
+                chunk_size=domain.data.shape[0] // 5,
+                log_level=log_level,
+            )
+            chunked_domain.read_csv()
+
+            self.assertEqual(domain.data.shape, chunked_domain.data.shape)
+            for first_row in range(0, domain.data.shape[0], domain.data.shape[0] // 7):
+                last_row = first_row + chunked_domain.chunk_size
+                data = domain.data[first_row: last_row]
+                chunked_data = chunked_domain.data[first_row: last_row]
+                self.assertTrue(data.index.equals(chunked_data.index))
+                self.assertTrue((data.values == chunked_data.values).all())
+
+            stat = domain.describe().loc[['count', 'mean', 'std', 'min', 'max']]
+            chunked_stat = chunked_domain.describe().loc[['count', 'mean', 'std', 'min', 'max']]
+            self.assertTrue(((stat - chunked_stat).abs() < 1e-9).all().all())
+
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_append_consistency(self):
+        """
+        Data appended to growing source file should match data loaded at once.
+        """
+        source = filename if type(filename) == str else filename[0]
+        with open(source, 'rb') as f:
+            lines = f.read().split(b'\n')
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            growing = os.path.join(data_dir, 'growing.csv')
+            half = len(lines) // 2
+            with open(growing, 'wb') as f:
+                f.write(b'\n'.join(lines[:half]) + b'\n')
+
+            domain = BTgymDataset(filename=growing, test_period={'days': 2}, log_level=log_level)
+            domain.reset()
+            with open(growing, 'ab') as f:
+                f.write(b'\n'.join(lines[half:]))
+
+            self.assertGreater(domain.append(), 0)
+
+            full_domain = BTgymDataset(filename=source, test_period={'days': 2}, log_level=log_level)
+            full_domain.reset()
+
+            self.assertTrue(domain.data.index.equals(full_domain.data.index))
+            self.assertTrue((domain.data.values == full_domain.data.values).all())
+            self.assertTrue((domain.sample_index == full_domain.sample_index).all())
+            self.assertEqual(domain.train_interval, full_domain.train_interval)
+            self.assertEqual(domain.test_interval, full_domain.test_interval)
+
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_sequential_append_consistency(self):
+        """
+        Exhausted sequential domain should resume sampling once data appended and give same Trials as one
+        loaded at once.
+        """
+        source = filename if type(filename) == str else filename[0]
+        with open(source, 'rb') as f:
+            lines = f.read().split(b'\n')
+
+        params = dict(
+            trial_params=dict(
+                trial_params,
+                sample_duration={'days': 4, 'hours': 0, 'minutes': 0},
+                time_gap={'days': 3, 'hours': 0},
+                test_period={'days': 1, 'hours': 0, 'minutes': 0},
+            ),
+            episode_params=copy.deepcopy(episode_params),
+            log_level=log_level,
+        )
+        full_domain = BTgymSequentialDataDomain(filename=source, **copy.deepcopy(params))
+        full_domain.reset()
+        reference = [full_domain.sample().metadata['first_row'] for i in range(full_domain.total_samples)]
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            for prefetch in [0, 2]:
+                with self.subTest(prefetch=prefetch):
+                    growing = os.path.join(data_dir, 'growing_{}.csv'.format(prefetch))
+                    half = len(lines) // 2
+                    with open(growing, 'wb') as f:
+                        f.write(b'\n'.join(lines[:half]) + b'\n')
+
+                    domain = BTgymSequentialDataDomain(filename=growing, prefetch=prefetch, **copy.deepcopy(params))
+                    domain.reset()
+                    first_rows = []
+                    trial = domain.sample()
+                    while trial:
+                        first_rows.append(trial.metadata['first_row'])
+                        trial = domain.sample()
+
+                    self.assertFalse(domain.is_ready)
+
+                    with open(growing, 'ab') as f:
+                        f.write(b'\n'.join(lines[half:]))
+
+                    self.assertGreater(domain.append(), 0)
+                    self.assertTrue(domain.is_ready)
+                    while len(first_rows) < len(reference):
+                        first_rows.append(domain.sample().metadata['first_row'])
+
+                    self.assertEqual(first_rows, reference)
+                    domain.stop_prefetch()
+
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_range_stat_consistency(self):
+        """
+        Precomputed range statistic should match pandas one for any range, sampled and passed trials included.
+        """
+        columns = ['count', 'mean', 'std', 'min', 'max']
+        frame = pd.DataFrame(np.random.randn(5000, 3).cumsum(axis=0) + 100, columns=['a', 'b', 'c'])
+        frame.iloc[np.random.randint(0, frame.shape[0], 500), np.random.randint(0, 3, 500)] = np.nan
+        frame.iloc[1000: 1600, 1] = np.nan
+        range_stat = RangeStat(frame)
+        for i in range(50):
+            first_row = np.random.randint(0, frame.shape[0] - 1)
+            last_row = np.random.randint(first_row + 2, frame.shape[0] + 1)
+            with self.subTest(first_row=first_row, last_row=last_row):
+                stat = range_stat.describe(first_row, last_row).loc[columns]
+                pandas_stat = frame[first_row: last_row].describe().loc[columns]
+                self.assertTrue(np.allclose(stat.values, pandas_stat.values, rtol=1e-9, equal_nan=True))
+
+        domain = BTgymRandomDataDomain(
+            filename=filename,
+            trial_params=copy.deepcopy(trial_params),
+            episode_params=copy.deepcopy(episode_params),
+            target_period=target_period,
+            log_level=log_level,
+        )
+        domain.reset()
+        for i in range(3):
+            trial = domain.sample()
+            restored_trial = pickle.loads(pickle.dumps(trial))
+            # Passed trial should keep statistic covering own data only:
+            self.assertIsNotNone(restored_trial.parent_stat)
+            restored_trial.reset()
+            for sample in [trial, restored_trial, restored_trial.sample()]:
+                with self.subTest(trial=i, sample=sample.filename):
+                    stat = sample.describe().loc[columns]
+                    pandas_stat = sample.data.describe().loc[columns]
+                    self.assertTrue(np.allclose(stat.values, pandas_stat.values, rtol=1e-9, equal_nan=True))
+
+    def test_sequential_prefetch_consistency(self):
+        """
+        Prefetched Trials should come in same order, cover same intervals and give same episodes
+        as ones sampled in place; prefetching thread should stop once disabled.
+        """
+        domains = [
+            BTgymSequentialDataDomain(
+                filename=filename,
+                trial_params=dict(
+                    trial_params,
+                    sample_duration={'days': 4, 'hours': 0, 'minutes': 0},
+                    time_gap={'days': 3, 'hours': 0},
+                    test_period={'days': 1, 'hours': 0, 'minutes': 0},
+                ),
+                episode_params=copy.deepcopy(episode_params),
+                prefetch=prefetch,
+                log_level=log_level,
+            ) for prefetch in [0, 2]
+        ]
+        def sample_first_rows(domain, num_trials):
+            first_rows = []
+            for i in range(num_trials):
+                trial = domain.sample()
+                trial.reset()
+                first_rows.append(
+                    (
+                        trial.metadata['first_row'],
+                        [trial.sample(get_new=True).metadata['first_row'] for j in range(3)]
+                    )
+                )
+            return first_rows
+
+        first_rows = []
+        for domain in domains:
+            domain.set_random_seed(0)
+            domain.reset()
+            first_rows.append(sample_first_rows(domain, 5))
+            # Iteration restarts with reset:
+            domain.reset()
+            first_rows[-1] += sample_first_rows(domain, 3)
+
+        self.assertEqual(first_rows[0], first_rows[-1])
+
+        prefetch_thread = domains[-1]._prefetch_thread
+        self.assertTrue(prefetch_thread.is_alive())
+        domains[-1].prefetch = 0
+        self.assertEqual(domains[-1].sample().metadata['first_row'], domains[0].sample().metadata['first_row'])
+        self.assertFalse(prefetch_thread.is_alive())
+        self.assertIsNone(domains[-1]._prefetch_thread)
+
+    def test_tick_bars_consistency(self):
+        """
+        Bars aggregated from ticks should match pandas resampling.
+        """
+        stamps = np.sort(pd.Timestamp('2017-01-02').value + np.random.randint(0, 3 * 86400 * 10 ** 9, 100000))
+        price = 1 + np.cumsum(np.random.randn(stamps.shape[0])) * 1e-5
+        for timeframe in [1, 5, 60]:
+            with self.subTest(timeframe=timeframe):
+                bar_stamps, bars = ticks_to_bars(stamps, price, np.ones(stamps.shape[0]), timeframe)
+                ticks = pd.Series(price, index=pd.DatetimeIndex(stamps.view('datetime64[ns]')))
+                resampled = ticks.resample('{}min'.format(timeframe)).ohlc().dropna()
+
+                self.assertTrue((bar_stamps == resampled.index.values.view(np.int64)).all())
+                self.assertTrue((bars[:, :4] == resampled.values).all())
+
+    def test_features_consistency(self):
+        """
+        Dataset features should match pandas rolling computations and be same when loaded from cache.
+        """
+        features = dict(
+            sma_16=dict(type='sma', period=16),
+            ema_8=dict(type='ema', period=8, column='open'),
+        )
+        cache_dir = tempfile.mkdtemp()
+        try:
+            domains = [
+                BTgymDataset(
+                    filename=filename,
+                    parsing_params=dict(BTgymDataset(filename=filename).parsing_params, features=features),
+                    cache_dir=cache_dir,
+                    log_level=log_level,
+                ) for i in range(2)
+            ]
+            for domain in domains:
+                domain.read_csv()
+
+            data = domains[0].data
+            sma = data['close'].rolling(16, min_periods=1).mean()
+            ema = data['open'].ewm(span=8, adjust=False).mean()
+            self.assertTrue(((data['sma_16'] - sma).abs() < 1e-9).all())
+            self.assertTrue(((data['ema_8'] - ema).abs() < 1e-9).all())
+            self.assertTrue((domains[0].data.values == domains[1].data.values).all())
+
+            btfeed = domains[0].to_btfeed()
+            self.assertIn('sma_16', btfeed.getlinealiases())
+
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_synthetic_consistency(self):
+        """
+        Same seed should give same synthetic data and samples, timeframes pyramid should be built if set.
+        """
+        parsing_params = dict(BTgymDataset(filename=filename).parsing_params, pyramid=[5, 60])
+        for process in ['gbm', 'ou', 'regime']:
+            with self.subTest(process=process):
+                domains = [
+                    BTgymSyntheticDataDomain(
+                        process=process,
+                        num_records=20000,
+                        seed=seed,
+                        parsing_params=parsing_params,
+                        trial_params=copy.deepcopy(trial_params),
+                        episode_params=copy.deepcopy(episode_params),
+                        log_level=log_level,
+                    ) for seed in [7, 7, 8]
+                ]
+                first_rows = []
+                for domain in domains:
+                    domain.reset()
+                    domain.set_random_seed(0)
+                    first_rows.append([domain.sample().metadata['first_row'] for i in range(3)])
+
+                self.assertTrue(domains[0].data.equals(domains[1].data))
+                self.assertFalse(domains[0].data.equals(domains[-1].data))
+                self.assertEqual(first_rows[0], first_rows[1])
+
+                self.assertIn('close_60m', domains[0].data.columns)
+                self.assertTrue((domains[0].data['close_5m'] == domains[0].data['close']).all())
+                self.assertEqual(set(domains[0].to_pyramid_btfeeds().keys()), {'5m', '60m'})
+
+    def test_shards_consistency(self):
+        """
+        Domain shards should partition domain valid sample starts and sampling weights.
+        """
+        domain = BTgymDataset(filename=filename, test_period={'days': 2}, log_level=log_level)
+        domain.reset()
+
+        num_shards = 3
+        starts = []
+        weights = np.zeros(2, dtype=int)
+        for index in range(num_shards):
+            shard = BTgymDataset(filename=filename, test_period={'days': 2}, log_level=log_level)
+            shard.set_shard(index, num_shards)
+            shard.reset()
+            shard_index = shard.sample_index
+
+            # Once trimmed, data is not split again:
+            shard.reset()
+            self.assertTrue((shard.sample_index == shard_index).all())
+            self.assertLess(shard.data.shape[0], domain.data.shape[0])
+
+            starts.append(shard.sample_index + shard.shard_interval[0])
+            weights += shard.sample_weights()
+
+        self.assertTrue((np.concatenate(starts) == domain.sample_index).all())
+        self.assertEqual(list(weights), domain.sample_weights())
+
+    def test_btfeed_consistency(self):
+        """
+        Array-backed bt.feed should deliver same bars as bt.feeds.PandasDirectData, preloaded or not.
+        """
+        domain = BTgymDataset(filename=filename, log_level=log_level)
+        domain.read_csv()
+        domain.data = domain.data[:5000]
+
+        def run(btfeed, preload):
+            lines = []
+
+            class Recorder(bt.Strategy):
+                def next(self):
+                    lines.append([line[0] for line in self.data.lines])
+
+            cerebro = bt.Cerebro(stdstats=False)
+            cerebro.adddata(btfeed)
+            cerebro.addstrategy(Recorder)
+            cerebro.run(preload=preload)
+            return np.asarray(lines)
+
+        reference = run(bt.feeds.PandasDirectData(dataname=domain.data, volume=-1, openinterest=-1), preload=False)
+        for preload in [False, True]:
+            with self.subTest(preload=preload):
+                lines = run(domain.to_btfeed(), preload=preload)
+                self.assertEqual(lines.shape, reference.shape)
+                self.assertTrue(np.array_equal(lines, reference, equal_nan=True))
+
+    def test_sample_batch_consistency(self):
+        """
+        Batch sampled starts should be valid ones within sampled interval;
+        restored random state should reproduce same draws and samples.
+        """
+        domain = BTgymDataset(filename=filename, test_period={'days': 2}, log_level=log_level)
+        domain.reset()
+        domain.set_random_seed(0)
+
+        for sample_type, interval in enumerate([domain.train_interval, domain.test_interval]):
+            with self.subTest(sample_type=sample_type):
+                rows = [d['first_row'] for d in domain.sample_batch(256, sample_type=sample_type, b_alpha=2)]
+                self.assertTrue(np.isin(rows, domain.sample_index).all())
+                self.assertTrue(
+                    all([interval[0] <= row <= interval[-1] - domain.sample_num_records for row in rows])
+                )
+
+        state = domain.get_random_state()
+        descriptors = domain.sample_batch(8, b_alpha=10, b_beta=0.8)
+        trial = domain.sample_from(descriptors[0])
+        trial.reset()
+        episode = trial.sample()
+
+        domain.set_random_state(state)
+        self.assertEqual(domain.sample_batch(8, b_alpha=10, b_beta=0.8), descriptors)
+        trial = domain.sample_from(descriptors[0])
+        trial.reset()
+        self.assertTrue(trial.sample().data.equals(episode.data))
+
     def _BTgymSequentialDataDomain_sampling_bounds_consistency(self):
         """
         Any train trial mast precede any test period.
@@ -0,0 +1,355 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import os
+
+from logbook import WARNING
+
+import numpy as np
+import pandas as pd
+
+from .cache import cache_key, read_frame, write_frame
+from .derivative import BTgymRandomDataDomain
+
+
+HISTDATA_TICK_FORMAT = '%Y%m%d %H%M%S%f'
+
+
+def _days_from_civil(year, month, day):
+    """
+    Vectorized proleptic Gregorian calendar date --> days since 01.01.1970.
+    """
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_tick_datetime(values, datetime_format=HISTDATA_TICK_FORMAT):
+    """
+    Parses tick datetime strings. Fixed-width `YYYYMMDD HHMMSSmmm` strings of HistData.com tick files
+    are decoded by digit arithmetic over byte array, which is order of magnitude faster than general parsing;
+    any other format falls back to pandas.
+
+    Args:
+        values:             array of datetime strings;
+        datetime_format:    str, strftime-like format, None - infer.
+
+    Returns:
+        int64 array of datetime stamps, nanoseconds since epoch.
+    """
+    if datetime_format == HISTDATA_TICK_FORMAT:
+        try:
+            raw = np.asarray(values, dtype='S19').view(np.uint8).reshape(-1, 19)
+            digits = raw[:, [i for i in range(18) if i != 8]].astype(np.int64) - 48
+            if (raw[:, 18] == 0).all() and (raw[:, 8] == ord(' ')).all() and ((digits >= 0) & (digits <= 9)).all():
+
+                def field(first, last):
+                    return digits[:, first: last] @ (10 ** np.arange(last - first - 1, -1, -1))
+
+                days = _days_from_civil(field(0, 4), field(4, 6), field(6, 8))
+                seconds = field(8, 10) * 3600 + field(10, 12) * 60 + field(12, 14)
+                return (days * 86400 + seconds) * 10 ** 9 + field(14, 17) * 10 ** 6
+
+        except (UnicodeEncodeError, ValueError, TypeError):
+            pass
+
+    return np.asarray(pd.to_datetime(values, format=datetime_format).values, dtype='datetime64[ns]').view(np.int64)
+
+
+def ticks_to_bars(stamps, price, volume, timeframe):
+    """
+    Aggregates ticks into OHLCV bars in single vectorized pass: ticks are bucketed by bar period
+    and every bucket is reduced at once. Buckets holding no ticks produce no bars.
+
+    Args:
+        stamps:     int64 array of [n] tick datetime stamps, nanoseconds since epoch, ascending;
+        price:      array of [n] tick prices;
+        volume:     array of [n] tick volumes;
+        timeframe:  int, bar period in minutes.
+
+    Returns:
+        int64 array of [num_bars] bar open stamps, array of [num_bars, 5] OHLCV values.
+    """
+    if stamps.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 5), dtype=price.dtype)
+
+    period = pd.Timedelta(minutes=timeframe).value
+    bucket = stamps // period
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    ends = np.concatenate([starts[1:], [stamps.shape[0]]]) - 1
+
+    bars = np.stack(
+        [
+            price[starts],
+            np.maximum.reduceat(price, starts),
+            np.minimum.reduceat(price, starts),
+            price[ends],
+            np.add.reduceat(volume, starts).astype(price.dtype),
+        ],
+        axis=-1
+    )
+    return bucket[starts] * period, bars
+
+
+class BTgymTickDataDomain(BTgymRandomDataDomain):
+    """
+    Top-level data class loading tick data and sampling bars aggregated from it.
+    Same sampling contract as BTgymRandomDataDomain::
+
+        Domain.sample() --> Trial.sample() --> Episode.to_btfeed() --> bt.Startegy
+
+    Ticks are kept as compact float32 arrays (and binary cache entries, if `cache_dir` is set);
+    bars of `timeframe` minutes are aggregated from ticks when loaded. Bar period can be changed
+    on reset, e.g. `reset(timeframe=5)` or `env.reset_data(timeframe=5)` for data server, with no reparsing.
+    """
+    def __init__(
+            self,
+            filename=None,
+            tick_params=None,
+            timeframe=1,
+            trial_params=None,
+            episode_params=None,
+            target_period=None,
+            name='TickDataDomain',
+            task=0,
+            log_level=WARNING,
+            cache_dir=None,
+            compact=False,
+    ):
+        """
+        Args:
+            filename:           Str or list of str, file_names containing CSV tick data;
+            tick_params:        dict, tick CSV parsing options, def. parses www.HistData.com generic ASCII tick files:
+                                sep=',', header=None, names=['datetime', 'bid', 'ask', 'volume'] (first is datetime),
+                                datetime_format=HISTDATA_TICK_FORMAT (None - infer),
+                                price='mid' - price column name or `mid` for mean of `bid` and `ask`,
+                                volume='volume' - volume column name or None;
+            timeframe:          int, bar period in minutes;
+            trial_params:       dict, describes trial parameters, should contain keys:
+                                {sample_duration, time_gap, start_00, start_weekdays, test_period, expanding};
+            episode_params:     dict, describes episode parameters, should contain keys:
+                                {sample_duration, time_gap, start_00, start_weekdays};
+            target_period:      dict, domain target period, def={'days': 0, 'hours': 0, 'minutes': 0};
+            name:               str, optional
+            task:               int, optional
+            log_level:          int, logbook.level
+            cache_dir:          str, optional, directory to keep binary copies of parsed tick files in;
+            compact:            bool, optional, keep bars as float32;
+        """
+        self.tick_params = dict(
+            sep=',',
+            header=None,
+            names=['datetime', 'bid', 'ask', 'volume'],
+            datetime_format=HISTDATA_TICK_FORMAT,
+            price='mid',
+            volume='volume',
+        )
+        if tick_params is not None:
+            self.tick_params.update(tick_params)
+
+        self.ticks = None  # Will hold tick data as pandas dataframe of [price, volume] float32 columns
+
+        parsing_params = dict(
+            # Bars columns:
+            names=['open', 'high', 'low', 'close', 'volume'],
+
+            # Pandas to BT.feeds params:
+            timeframe=timeframe,
+            datetime=0,
+            open=1,
+            high=2,
+            low=3,
+            close=4,
+            volume=5,
+            openinterest=-1,
+        )
+
+        super(BTgymTickDataDomain, self).__init__(
+            filename=filename,
+            parsing_params=parsing_params,
+            trial_params=trial_params,
+            episode_params=episode_params,
+            target_period=target_period,
+            name=name,
+            task=task,
+            log_level=log_level,
+            cache_dir=cache_dir,
+            compact=compact,
+        )
+
+    def _reset(self, data_filename=None, timeframe=None, **kwargs):
+        """
+        Args:
+            data_filename:  [opt] string or list of strings;
+            timeframe:      [opt] int, new bar period in minutes; bars get re-aggregated from ticks loaded.
+        """
+        if timeframe is not None and timeframe != self.timeframe:
+            self.set_timeframe(timeframe)
+
+        super(BTgymTickDataDomain, self)._reset(data_filename=data_filename, **kwargs)
+
+    def set_timeframe(self, timeframe):
+        """
+        Sets bar period for instance and samples to come, re-aggregates bars if ticks are loaded.
+
+        Args:
+            timeframe:  int, bar period in minutes.
+        """
+        self.timeframe = timeframe
+        self.parsing_params = dict(self.parsing_params, timeframe=timeframe)
+        self.params['timeframe'] = timeframe
+
+        # Nested samples configurations hold own copies of parsing params:
+        configs = [dict(kwargs=self.nested_params)] + list(self._config_stack or [])
+        for config in configs:
+            config['kwargs']['parsing_params'] = dict(config['kwargs']['parsing_params'], timeframe=timeframe)
+
+        if self.ticks is not None:
+            self.unshare()
+            self.range_stat = None
+            self.sample_index = None
+            self.shard_interval = None
+            self.is_ready = False
+            self.data = self.aggregate(timeframe)
+            self.data_range_delta = (self.data.index[-1] - self.data.index[0]).to_pytimedelta()
+            self.log.info('Aggregated {} bars of {} min.'.format(self.data.shape[0], timeframe))
+
+    def read_csv(self, data_filename=None, force_reload=False):
+        """
+        Populates instance by loading tick data: CSV file --> ticks --> bars.
+
+        Args:
+            data_filename: [opt] csv tick data filename as string or list of such strings.
+            force_reload:  ignore loaded data.
+        """
+        if self.data is not None and not force_reload:
+            self.log.debug('data has been already loaded. Use `force_reload=True` to reload')
+            return
+
+        if data_filename:
+            self.filename = data_filename
+
+        if type(self.filename) == str:
+            self.filename = [self.filename]
+
+        self.unshare()
+        self.range_stat = None
+        self.shard_interval = None
+
+        ticks = []
+        for filename in self._source_files(self.filename):
+            try:
+                assert filename and os.path.isfile(filename)
+                ticks.append(self._read_ticks(filename))
+                self.log.info('Loaded {} ticks from <{}>.'.format(ticks[-1].shape[0], filename))
+
+            except (AssertionError, OSError, ValueError, KeyError) as e:
+                msg = 'Tick data file <{}> not specified / not found / not parsed: {}'.format(str(filename), e)
+                self.log.error(msg)
+                raise FileNotFoundError(msg)
+
+        self.ticks = pd.concat(ticks)
+        if not self.ticks.index.is_monotonic_increasing:
+            self.log.warning('Tick data files are not listed ascending by time, merging.')
+            self.ticks = self.ticks.sort_index(kind='mergesort')
+
+        self.data = self.aggregate(self.timeframe)
+        self.data_range_delta = (self.data.index[-1] - self.data.index[0]).to_pytimedelta()
+        self.log.info('Aggregated {} bars of {} min.'.format(self.data.shape[0], self.timeframe))
+
+    def _read_ticks(self, filename):
+        """
+        Loads single tick source file, from binary cache if possible.
+
+        Args:
+            filename:   csv tick data filename as string.
+
+        Returns:
+            pandas dataframe of float32 [price, volume] columns indexed by tick datetime.
+        """
+        cache_path = None
+        if self.cache_dir is not None:
+            cache_path = os.path.join(self.cache_dir, cache_key(filename, dict(ticks=True, **self.tick_params)))
+            cached = self._read_cached(filename, cache_path)
+            if cached is not None:
+                return cached
+
+        params = self.tick_params
+        frame = pd.read_csv(filename, sep=params['sep'], header=params['header'], names=params['names'])
+        stamps = parse_tick_datetime(frame[params['names'][0]].values, params['datetime_format'])
+        index = pd.DatetimeIndex(stamps.view('datetime64[ns]'))
+
+        if params['price'] == 'mid':
+            price = (frame['bid'].values + frame['ask'].values) / 2
+
+        else:
+            price = frame[params['price']].values
+
+        if params['volume'] is not None:
+            volume = frame[params['volume']].values
+
+        else:
+            volume = np.zeros(frame.shape[0])
+
+        ticks = pd.DataFrame(
+            dict(price=price.astype(np.float32), volume=volume.astype(np.float32)),
+            index=index,
+        )
+        if cache_path is not None:
+            try:
+                write_frame(cache_path, ticks)
+                ticks = read_frame(cache_path, mmap=True)
+
+            except (OSError, ValueError, TypeError) as e:
+                self.log.warning('Failed to cache <{}>: {}'.format(filename, e))
+
+        return ticks
+
+    def aggregate(self, timeframe):
+        """
+        Aggregates loaded ticks into bars.
+
+        Args:
+            timeframe:  int, bar period in minutes.
+
+        Returns:
+            pandas dataframe of OHLCV bars indexed by bar open datetime.
+        """
+        stamps = np.asarray(self.ticks.index.values, dtype='datetime64[ns]').view(np.int64)
+        bar_stamps, bars = ticks_to_bars(
+            stamps,
+            np.asarray(self.ticks['price'].values),
+            np.asarray(self.ticks['volume'].values),
+            timeframe,
+        )
+        return pd.DataFrame(
+            bars if self.compact else bars.astype(np.float64),
+            index=pd.DatetimeIndex(bar_stamps.view('datetime64[ns]')),
+            columns=self.names[:5],
+        )
+
+    def append(self, data_filename=None):
+        """
+        Not supported for tick data, reload instead.
+        """
+        self.log.warning('Appending to tick data is not supported, reload it instead.')
+        return 0
@@ -18,10 +18,243 @@
 ###############################################################################
 
 import multiprocessing
+import threading
+import collections
+import pickle
+import time
 import copy
 import zmq
 
-from .datafeed import DataSampleConfig
+from .datafeed import DataSampleConfig, BTgymSequentialDataDomain
+from .datafeed.shared import clear_stale_segments
+
+
+class BTgymPreSampler:
+    """
+    Keeps bounded queues of ready samples for most recently requested sample configurations
+    and refills them in background thread.
+
+    Note:
+        Stateful domains (`BTgymSequentialDataDomain`) are sampled on demand only: every sample drawn in advance
+        takes place in domain sampling sequence, so samples queued for one configuration would be skipped
+        or served out of order by others.
+    """
+    def __init__(self, dataset, size=0, max_configs=8, log=None):
+        """
+        Args:
+            dataset:        data domain instance to sample from;
+            size:           int, number of ready samples to keep per sample configuration, 0 - sample on demand;
+            max_configs:    int, number of distinct sample configurations to keep samples for,
+                            least recently used one gets evicted;
+            log:            logbook.Logger
+        """
+        self.dataset = dataset
+        if isinstance(dataset, BTgymSequentialDataDomain):
+            size = 0
+
+        self.size = size
+        self.max_configs = max_configs
+        self.log = log
+
+        self.dataset_lock = threading.RLock()  # guards dataset state
+        self.condition = threading.Condition()  # guards queues
+        self.queues = collections.OrderedDict()  # {config_key: (config, deque of samples)}, LRU order
+        self.generation = 0
+        self.last_sample = None
+        self.running = False
+        self.thread = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(sample_config):
+        return tuple(sorted(sample_config.items()))
+
+    def start(self):
+        """
+        Starts refilling thread.
+        """
+        if self.size > 0 and self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._fill, name='BTgymPreSampler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops refilling thread.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def flush(self):
+        """
+        Discards all ready samples, including ones being prepared now.
+        """
+        with self.condition:
+            self.queues.clear()
+            self.generation += 1
+            self.last_sample = None
+
+    def reset(self, **kwargs):
+        """
+        Resets dataset and discards ready samples.
+
+        Args:
+            kwargs:     passed through to dataset .reset() method.
+        """
+        with self.dataset_lock:
+            self.flush()
+            self.dataset.reset(**kwargs)
+
+    @property
+    def is_ready(self):
+        with self.condition:
+            return self.dataset.is_ready or any(len(queue) > 0 for _, queue in self.queues.values())
+
+    def get(self, sample_config):
+        """
+        Returns ready sample for given configuration if there is one, samples dataset otherwise.
+
+        Args:
+            sample_config:  sampling parameters configuration dictionary
+
+        Returns:
+            sample
+        """
+        if not sample_config.get('get_new', True):
+            # Same sample requested; dataset own last sample can be pre-sampled one, so keep track here:
+            if self.last_sample is None:
+                with self.dataset_lock:
+                    self.last_sample = self.dataset.sample(**sample_config)
+
+            return self.last_sample
+
+        if self.size == 0:
+            with self.dataset_lock:
+                self.last_sample = self.dataset.sample(**sample_config)
+
+            return self.last_sample
+
+        key = self._key(sample_config)
+        with self.condition:
+            try:
+                queue = self.queues[key][-1]
+                self.queues.move_to_end(key)
+
+            except KeyError:
+                queue = collections.deque()
+                self.queues[key] = (copy.deepcopy(sample_config), queue)
+                while len(self.queues) > self.max_configs:
+                    self.queues.popitem(last=False)
+
+            if len(queue) > 0:
+                self.hits += 1
+                sample = queue.popleft()
+
+            else:
+                self.misses += 1
+                sample = None
+
+            self.condition.notify_all()
+
+        if sample is None:
+            with self.dataset_lock:
+                # Refilling thread could have queued sample meanwhile, take it to keep domain sampling order:
+                with self.condition:
+                    if key in self.queues and self.queues[key][-1] is queue and len(queue) > 0:
+                        sample = queue.popleft()
+                        self.condition.notify_all()
+
+                if sample is None:
+                    sample = self.dataset.sample(**sample_config)
+
+        self.last_sample = sample
+        return sample
+
+    def _next_config(self):
+        """
+        Returns:
+            most recently used sample configuration which queue is not full and number of samples
+            it lacks, None if all are full.
+        """
+        for key in reversed(self.queues):
+            config, queue = self.queues[key]
+            if len(queue) < self.size:
+                return key, config, self.size - len(queue)
+
+        return None
+
+    def _sample_batch(self, config, batch_size):
+        """
+        Samples dataset in one vectorized draw if dataset supports batch sampling, one by one otherwise.
+
+        Returns:
+            list of samples
+        """
+        try:
+            descriptors = self.dataset.sample_batch(batch_size, **config)
+
+        except NotImplementedError:
+            return [self.dataset.sample(**config)]
+
+        return [self.dataset.sample_from(descriptor) for descriptor in descriptors]
+
+    def _fill(self):
+        """
+        Refilling thread body.
+        """
+        while True:
+            with self.condition:
+                while self.running and (self._next_config() is None or not self.dataset.is_ready):
+                    self.condition.wait(timeout=1.0)
+
+                if not self.running:
+                    return
+
+                key, config, num_missing = self._next_config()
+                generation = self.generation
+
+            with self.dataset_lock:
+                if generation != self.generation or not self.dataset.is_ready:
+                    continue
+
+                try:
+                    samples = [sample for sample in self._sample_batch(config, num_missing) if sample]
+
+                except Exception as e:
+                    if self.log is not None:
+                        self.log.warning('Pre-sampling failed with: {}'.format(e))
+                    samples = []
+
+                # Queue samples before anyone samples dataset again:
+                with self.condition:
+                    is_queued = len(samples) > 0 and generation == self.generation and key in self.queues
+                    if is_queued:
+                        self.queues[key][-1].extend(samples)
+
+            if not is_queued:
+                # Exhausted, discarded or failed:
+                with self.condition:
+                    self.condition.wait(timeout=1.0)
+
+    def stat(self):
+        """
+        Returns:
+            dictionary of pre-sampling statistic.
+        """
+        with self.condition:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / (self.hits + self.misses + 1e-10),
+                ready={str(dict(config)): len(queue) for config, queue in self.queues.values()},
+            )
 
 
 class BTgymDataFeedServer(multiprocessing.Process):
@@ -32,7 +265,18 @@ class BTgymDataFeedServer(multiprocessing.Process):
     process = None
     dataset_stat = None
 
-    def __init__(self, dataset=None, network_address=None, log_level=None, task=0):
+    def __init__(
+            self,
+            dataset=None,
+            network_address=None,
+            log_level=None,
+            task=0,
+            share_data=False,
+            pre_sample_size=0,
+            pre_sample_configs=8,
+            num_workers=0,
+            shard=None,
+    ):
         """
         Configures data server instance.
 
@@ -41,6 +285,19 @@ class BTgymDataFeedServer(multiprocessing.Process):
             network_address:    ...to bind to.
             log_level:          int, logbook.level
             task:               id
+            share_data:         bool, if True - keep dataset in shared memory segment and send samples as
+                                lightweight segment descriptors; clients should run on same host.
+            pre_sample_size:    int, number of samples to prepare in advance per sample configuration,
+                                0 disables pre-sampling; not used with stateful domains, see `BTgymPreSampler`;
+            pre_sample_configs: int, number of distinct sample configurations to prepare samples for;
+            num_workers:        int, if positive - serve requests via ROUTER socket with given number of worker
+                                threads, so control requests and requests served from pre-sampled queues
+                                don't wait for ones being sampled; note that sampling itself is done under
+                                single dataset lock, so requests missing pre-sampled queues are still served
+                                one by one; 0 - serve all requests one by one;
+            shard:              tuple (shard_index, num_shards), if given - hold and sample only that time-range
+                                shard of dataset, see `BTgymBaseData.set_shard()`; clients should pick among
+                                shard servers by `sample_weights` reported.
         """
         super(BTgymDataFeedServer, self).__init__()
 
@@ -50,71 +307,265 @@ class BTgymDataFeedServer(multiprocessing.Process):
         self.local_step = 0
         self.dataset = dataset
         self.network_address = network_address
-        self.pre_sample = None
-        self.pre_sample_config = copy.deepcopy(DataSampleConfig)
-
-        self.debug_pre_sample_fails = 0
-        self.debug_pre_sample_attempts = 0
+        self.share_data = share_data
+        self.pre_sample_size = pre_sample_size
+        self.pre_sample_configs = pre_sample_configs
+        self.num_workers = num_workers
+        self.shard = shard
+        self.sample_weights = None  # [train, test] sampling weights of dataset held, set on reset
+        self.pre_sampler = None
+        self.step_lock = None  # guards local_step updated by worker threads, set on start
+        self.client_stat = dict()  # {client_id: dict(requests, mean_latency, max_latency)}
 
     def get_data(self, sample_config=None):
         """
         Get Trial sample according to parameters received.
-        If no parameters being passed - just makes and stores pre-sample.
 
         Args:
             sample_config:   sampling parameters configuration dictionary
 
         Returns:
-            sample:     if `sample_params` arg has been passed and dataset is ready
+            sample:     if dataset is ready
             None:       otherwise
 
         Notes:
-            Some heuristic used here to enable parallelism: as training usually requires long series of similar samples,
-            we pre-sample data with most probable parameters;
-            first guessed sample gets type =`Train`, b_alpha=1, b_beta=1, and subsequent ones get actual
-            sampling params of previous accepted sample. If newly received parameters doesnt match pre-sampled ones -
-            we discard our guess and sample again with actual params.
-            TODO: should be switched off if using decaying `b_alpha` and `b_beta` params.
-        """
-        if self.dataset.is_ready:
-            if sample_config is not None:
-                if self.pre_sample is None or not self.pre_sample_config == sample_config:
-                    self.log.debug('Pre-sampling guess failed, resampling.')
-                    self.pre_sample_config = copy.deepcopy(sample_config)
-                    sample = self.dataset.sample(**sample_config)
+            Training usually requires long series of similar samples, so with `pre_sample_size` set we keep
+            several samples ready for every recently requested sampling configuration; those get refilled
+            in background. Configurations with decaying `b_alpha` and `b_beta` params will mostly miss, in that case
+            sample is drawn on demand and samples prepared for configurations no longer used get wasted.
+        """
+        if sample_config is None:
+            sample_config = copy.deepcopy(DataSampleConfig)
 
-                    self.debug_pre_sample_fails += 1
+        if self.pre_sampler.is_ready:
+            sample = self.pre_sampler.get(sample_config)
+            with self.step_lock:
+                self.local_step += 1
+                local_step = self.local_step
 
-                else:
-                    self.log.debug('Pre-sampling guess succeeded.')
-                    sample = self.pre_sample
+            # Debug:
+            if local_step % 100 == 0:
+                self.log.debug('Pre-sampling: {}'.format(self.pre_sampler.stat()))
 
-            else:
-                self.log.debug('Guessing sample with params: {}'.format(self.pre_sample_config))
-                self.pre_sample = self.dataset.sample(**self.pre_sample_config)
+        else:
+            # Dataset not ready, make dummy:
+            sample = None
+
+        return sample
 
-                self.debug_pre_sample_attempts += 1
+    def _get_data_message(self, sample_config):
+        """
+        Composes response to `_get_data` request.
 
-                return None
+        Args:
+            sample_config:  sampling parameters configuration dictionary
 
-            self.local_step += 1
+        Returns:
+            response dictionary
+        """
+        if self.pre_sampler.is_ready:
+            sample = self.get_data(sample_config=sample_config)
+            self.log.debug('Sending sample_#{}.'.format(self.local_step))
+            message = {
+                'sample': sample,
+                'stat': self.dataset_stat,
+                'sample_weights': self.sample_weights,
+                'origin': 'data_server',
+            }
 
-            # Debug:
-            if self.local_step % 100 == 0:
-                self.log.debug(
-                    'Pre_samples: {}, failed: {}, fails/attempts: {}'.
-                        format(
-                        self.debug_pre_sample_attempts,
-                        self.debug_pre_sample_fails,
-                        self.debug_pre_sample_fails / (self.debug_pre_sample_attempts + 1e-10)
-                    )
+        else:
+            message = {'ctrl': 'Dataset not ready, waiting for control key <_reset_data>'}
+            self.log.debug('Sent: ' + str(message))
+
+        return message
+
+    def _get_response(self, service_input):
+        """
+        Composes response to any request but `_stop`.
+
+        Args:
+            service_input:  request dictionary
+
+        Returns:
+            response dictionary
+        """
+        if 'ctrl' in service_input:
+            # Reset datafeed:
+            if service_input['ctrl'] == '_reset_data':
+                try:
+                    kwargs = service_input['kwargs']
+
+                except KeyError:
+                    kwargs = {}
+
+                with self.pre_sampler.dataset_lock:
+                    self.pre_sampler.reset(**kwargs)
+                    if self.share_data:
+                        self.dataset.share()
+
+                    self.sample_weights = self.dataset.sample_weights()
+
+                message = {'ctrl': 'Reset with kwargs: {}'.format(kwargs)}
+                self.log.debug('Data_is_ready: {}'.format(self.dataset.is_ready))
+                with self.step_lock:
+                    self.local_step = 0
+
+            # Extend dataset with new records, keep serving:
+            elif service_input['ctrl'] == '_append_data':
+                try:
+                    kwargs = service_input['kwargs']
+
+                except KeyError:
+                    kwargs = {}
+
+                with self.pre_sampler.dataset_lock:
+                    num_records = self.dataset.append(**kwargs)
+                    if num_records > 0:
+                        if self.pre_sampler.size > 0:
+                            # Samples prepared in advance hold no new records; stateful domains are never
+                            # pre-sampled, so no place in their sampling sequence gets lost here:
+                            self.pre_sampler.flush()
+
+                        self.dataset_stat = self.dataset.describe()
+
+                message = {'ctrl': 'Appended {} records.'.format(num_records), 'num_records': num_records}
+                self.log.debug(message['ctrl'])
+
+            # Send dataset sample:
+            elif service_input['ctrl'] == '_get_data':
+                message = self._get_data_message(service_input['kwargs'])
+
+            # Send dataset statisitc:
+            elif service_input['ctrl'] == '_get_info':
+                self.log.debug('Sending info for #{}.'.format(self.local_step))
+                # Compose response:
+                message = dict(
+                    dataset_stat=self.dataset_stat,
+                    dataset_columns=list(self.dataset.names),
+                    pid=self.process.pid,
+                    dataset_is_ready=self.pre_sampler.is_ready,
+                    sample_weights=self.sample_weights,
+                    pre_sampling=self.pre_sampler.stat(),
+                    # Worker threads sample under single dataset lock, only pre-sampled requests overlap:
+                    workers=dict(num_workers=self.num_workers, concurrent_sampling=False),
+                    clients=self.client_stat,
                 )
+
+            else:  # ignore any other input
+                # NOTE: response dictionary must include 'ctrl' key
+                message = {
+                    'ctrl': 'waiting for control keys:  <_reset_data>, <_append_data>, <_get_data>, <_get_info>, ' +
+                            '<_stop>.'
+                }
+                self.log.debug('Sent: ' + str(message))
+
         else:
-            # Dataset not ready, make dummy:
-            sample = None
-            self.pre_sample = None
+            message = {'ctrl': 'No <ctrl> key received, got:\n{}'.format(service_input)}
+            self.log.debug(str(message))
 
-        return sample
+        return message
+
+    def _update_client_stat(self, client, latency):
+        """
+        Accumulates per-client request statistic.
+
+        Args:
+            client:     str, client id;
+            latency:    float, request service time in seconds.
+        """
+        try:
+            stat = self.client_stat[client]
+
+        except KeyError:
+            stat = dict(requests=0, mean_latency=0.0, max_latency=0.0)
+            self.client_stat[client] = stat
+
+        stat['requests'] += 1
+        stat['mean_latency'] += (latency - stat['mean_latency']) / stat['requests']
+        stat['max_latency'] = max(stat['max_latency'], latency)
+
+    def _sampling_worker(self, context, worker_id):
+        """
+        Sampling worker thread body: serves `_get_data` requests passed by router loop.
+        """
+        tasks = context.socket(zmq.PULL)
+        tasks.connect('inproc://btgym_data_tasks')
+        results = context.socket(zmq.PUSH)
+        results.connect('inproc://btgym_data_results')
+
+        while True:
+            frames = tasks.recv_multipart()
+            if len(frames) == 1:
+                # Stop signal:
+                break
+
+            client, start_time, request = frames
+            message = self._get_data_message(pickle.loads(request)['kwargs'])
+            results.send_multipart([client, start_time, pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)])
+
+        tasks.close()
+        results.close()
+
+    def _run_router(self, context, socket):
+        """
+        Serves requests via ROUTER socket: `_get_data` requests are passed to pool of sampling worker threads
+        and get served concurrently, control requests are served in order.
+        Returns when `_stop` request received.
+        """
+        tasks = context.socket(zmq.PUSH)
+        tasks.bind('inproc://btgym_data_tasks')
+        results = context.socket(zmq.PULL)
+        results.bind('inproc://btgym_data_results')
+
+        workers = [
+            threading.Thread(target=self._sampling_worker, args=(context, i), name='BTgymDataWorker_{}'.format(i))
+            for i in range(self.num_workers)
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        poller.register(results, zmq.POLLIN)
+
+        while True:
+            events = dict(poller.poll())
+
+            # Forward samples prepared by workers:
+            if results in events:
+                client, start_time, payload = results.recv_multipart()
+                socket.send_multipart([client, b'', payload])
+                self._update_client_stat(client.hex(), time.time() - float(start_time))
+
+            if socket in events:
+                client, _, request = socket.recv_multipart()
+                start_time = time.time()
+                service_input = pickle.loads(request)
+                self.log.debug('Received <{}> from <{}>'.format(service_input, client.hex()))
+
+                if service_input.get('ctrl') == '_get_data' and self.pre_sampler.is_ready:
+                    tasks.send_multipart([client, str(start_time).encode(), request])
+                    continue
+
+                if service_input.get('ctrl') == '_stop':
+                    message = {'ctrl': 'Exiting.'}
+                    self.log.info(str(message))
+                    socket.send_multipart([client, b'', pickle.dumps(message)])
+                    break
+
+                message = self._get_response(service_input)
+                socket.send_multipart([client, b'', pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)])
+                self._update_client_stat(client.hex(), time.time() - start_time)
+
+        for worker in workers:
+            tasks.send_multipart([b'_stop'])
+
+        for worker in workers:
+            worker.join()
+
+        tasks.close()
+        results.close()
 
     def run(self):
         """
@@ -130,12 +581,21 @@ class BTgymDataFeedServer(multiprocessing.Process):
 
         self.process = multiprocessing.current_process()
         self.log.info('PID: {}'.format(self.process.pid))
+        self.step_lock = threading.Lock()
 
         # Set up a comm. channel for server as ZMQ socket:
         context = zmq.Context()
-        socket = context.socket(zmq.REP)
+        if self.num_workers > 0:
+            socket = context.socket(zmq.ROUTER)
+
+        else:
+            socket = context.socket(zmq.REP)
+
         socket.bind(self.network_address)
 
+        if self.shard is not None:
+            self.dataset.set_shard(*self.shard)
+
         # Actually load data to BTgymDataset instance, will reset it later on:
         try:
             assert not self.dataset.data.empty
@@ -143,90 +603,46 @@ class BTgymDataFeedServer(multiprocessing.Process):
         except (AssertionError, AttributeError) as e:
             self.dataset.read_csv()
 
+        if self.share_data:
+            removed = clear_stale_segments()
+            if len(removed) > 0:
+                self.log.info('Removed {} shared segments left by dead processes.'.format(len(removed)))
+
+            self.dataset.share()
+
         # Describe dataset:
         self.dataset_stat = self.dataset.describe()
 
-        # Main loop:
-        get_new = True
+        self.pre_sampler = BTgymPreSampler(
+            self.dataset,
+            size=self.pre_sample_size,
+            max_configs=self.pre_sample_configs,
+            log=self.log
+        )
+        self.pre_sampler.start()
 
-        while True:
-            if get_new:
-            # Guess sample:
-                self.get_data()
-                get_new = False
+        if self.num_workers > 0:
+            self._run_router(context, socket)
 
-            # Stick here with data in hand until receive any request:
-            service_input = socket.recv_pyobj()
-            self.log.debug('Received <{}>'.format(service_input))
+        else:
+            # Main loop:
+            while True:
+                # Stick here with data in hand until receive any request:
+                service_input = socket.recv_pyobj()
+                self.log.debug('Received <{}>'.format(service_input))
 
-            if 'ctrl' in service_input:
                 # It's time to exit:
-                if service_input['ctrl'] == '_stop':
-                    # Server shutdown logic:
-                    # send last run statistic, release comm channel and exit:
+                if service_input.get('ctrl') == '_stop':
                     message = {'ctrl': 'Exiting.'}
                     self.log.info(str(message))
                     socket.send_pyobj(message)
-                    socket.close()
-                    context.destroy()
-                    return None
-
-                # Reset datafeed:
-                elif service_input['ctrl'] == '_reset_data':
-                    try:
-                        kwargs = service_input['kwargs']
+                    break
 
-                    except KeyError:
-                        kwargs = {}
+                socket.send_pyobj(self._get_response(service_input))  # pairs any input
 
-                    self.dataset.reset(**kwargs)
-                    message = {'ctrl': 'Reset with kwargs: {}'.format(kwargs)}
-                    self.log.debug('Data_is_ready: {}'.format(self.dataset.is_ready))
-                    socket.send_pyobj(message)
-                    self.local_step = 0
-                    get_new = True
-
-                # Send dataset sample:
-                elif service_input['ctrl'] == '_get_data':
-                    if self.dataset.is_ready:
-                        # Call _get_data to verify sampling guess or resample:
-                        sample = self.get_data(sample_config=service_input['kwargs'])
-                        message = 'Sending sample_#{}.'.format(self.local_step)
-                        self.log.debug(message)
-                        socket.send_pyobj(
-                            {
-                                'sample': sample,
-                                'stat': self.dataset_stat,
-                                'origin': 'data_server',
-                            }
-                        )
-                        get_new = True
-
-                    else:
-                        message = {'ctrl': 'Dataset not ready, waiting for control key <_reset_data>'}
-                        self.log.debug('Sent: ' + str(message))
-                        socket.send_pyobj(message)  # pairs any other input
-
-                # Send dataset statisitc:
-                elif service_input['ctrl'] == '_get_info':
-                    message = 'Sending info for #{}.'.format(self.local_step)
-                    self.log.debug(message)
-                    # Compose response:
-                    info_dict = dict(
-                        dataset_stat=self.dataset_stat,
-                        dataset_columns=list(self.dataset.names),
-                        pid=self.process.pid,
-                        dataset_is_ready=self.dataset.is_ready
-                    )
-                    socket.send_pyobj(info_dict)
-
-                else:  # ignore any other input
-                    # NOTE: response dictionary must include 'ctrl' key
-                    message = {'ctrl': 'waiting for control keys:  <_reset_data>, <_get_data>, <_get_info>, <_stop>.'}
-                    self.log.debug('Sent: ' + str(message))
-                    socket.send_pyobj(message)  # pairs any other input
-
-            else:
-                message = {'ctrl': 'No <ctrl> key received, got:\n{}'.format(service_input)}
-                self.log.debug(str(message))
-                socket.send_pyobj(message) # pairs input
+        # Server shutdown logic: release comm channel and exit:
+        socket.close()
+        context.destroy()
+        self.pre_sampler.stop()
+        self.dataset.unshare()
+        return None
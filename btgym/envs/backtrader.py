@@ -36,6 +36,8 @@ import backtrader as bt
 from btgym import BTgymServer, BTgymBaseStrategy, BTgymDataset, BTgymRendering, BTgymDataFeedServer, DictSpace
 
 from btgym.rendering import BTgymNullRendering
+from btgym.protocol import state_layout, encode_message, encode_step_request, decode_step_response
+from btgym.protocol import make_address, clear_address, InProcessChannel
 
 ############################## OpenAI Gym Environment  ##############################
 
@@ -53,6 +55,11 @@ class BTgymEnv(gym.Env):
     data_context = None
     data_socket = None
     data_server_response = None
+    share_data = False  # pass data samples via shared memory segments instead of pickling
+    data_workers = 0  # number of data_server sampling threads, 0 - serve requests one by one
+    data_shards = 1  # number of data_servers holding time-range shards of dataset
+    data_servers = []  # data_server processes, one per shard
+    data_sockets = []
 
     # Dataset:
     dataset = None  # BTgymDataset instance.
@@ -70,7 +77,12 @@ class BTgymEnv(gym.Env):
     socket = None  # ZMQ socket, client side.
     port = 5500  # network port to use.
     network_address = 'tcp://127.0.0.1:'  # using localhost.
-    ctrl_actions = ('_done', '_reset', '_stop', '_getstat', '_render')  # server control messages.
+    transport = 'auto'  # `tcp`, `ipc` or `auto` - Unix domain sockets for local servers, tcp otherwise
+    in_process = False  # run server as coroutine-like thread within this process instead of separate process
+    episode_gc = True  # let server run garbage collection after every episode
+    prepare_episodes = False  # let server prepare next episode while current one is running
+    # Server control messages:
+    ctrl_actions = ('_done', '_reset', '_reset_step', '_reset_data', '_stop', '_getstat', '_render')
     server_response = None
 
     # Connection timeout:
@@ -111,9 +123,29 @@ class BTgymEnv(gym.Env):
                                                             overrides `strategy` arg.
             network_address=`tcp://127.0.0.1:` (str):       BTGym_server address.
             port=5500 (int):                                network port to use for server - API_shell communication.
+            transport=`auto` (str):                         `ipc` - talk to server and data_server via Unix domain
+                                                            sockets keyed by port numbers, `tcp` - via network,
+                                                            `auto` - use `ipc` for local addresses if supported.
+            in_process=False (bool):                        run server within environment process, taking turns
+                                                            with it: no server process, socket or pickling involved;
+                                                            for debugging and small-scale training.
+            episode_gc=True (bool):                         run garbage collection pass after every episode;
+                                                            disabling it cuts reset time for short episodes.
+            prepare_episodes=False (bool):                  let server sample next episode and build its data feed
+                                                            in background while current episode is running;
+                                                            reset with same kwargs starts prepared one at once.
             data_master=True (bool):                        let this environment control over data_server;
             data_network_address=`tcp://127.0.0.1:` (str):  data_server address.
             data_port=4999 (int):                           network port to use for server -- data_server communication.
+            share_data=False (bool):                        keep dataset in shared memory and pass samples to server
+                                                            as segment descriptors; valid for local data_server only.
+            data_workers=0 (int):                           if positive, data_server serves concurrent requests
+                                                            with given number of worker threads; sampling itself
+                                                            is serialized, see `BTgymDataFeedServer`.
+            data_shards=1 (int):                            number of data_servers to split dataset among by time
+                                                            range, served at `data_port`, `data_port - 1`, ...;
+                                                            trials are requested from shards in proportion to
+                                                            number of samples they hold.
             connect_timeout=60 (int):                       server connection timeout in seconds.
             render_enabled=True (bool):                     enable rendering for this environment;
             render_modes=['human', 'episode'] (list):       `episode` - plotted episode results;
@@ -224,8 +256,17 @@ class BTgymEnv(gym.Env):
             self.log = Logger('BTgymAPIshell_{}'.format(self.task), level=self.log_level)
 
         # Network parameters:
-        self.network_address += str(self.port)
-        self.data_network_address += str(self.data_port)
+        self.network_address = make_address(self.network_address, self.port, self.transport)
+        self.data_network_addresses = [
+            make_address(self.data_network_address, self.data_port - shard, self.transport)
+            for shard in range(self.data_shards)
+        ]
+        self.data_network_address = self.data_network_addresses[0]
+
+        # Step round-trip time statistic, seconds:
+        self.step_latency = None  # mean over last finished episode
+        self._step_time = 0.0
+        self._step_count = 0
 
         # Set server rendering:
         if self.render_enabled:
@@ -354,16 +395,23 @@ class BTgymEnv(gym.Env):
             #print('self.engine.strats[0][0][2]:', self.engine.strats[0][0][2])
             #print('self.engine.strats[0][0][0].params:', self.engine.strats[0][0][0].params._gettuple())
 
-            # Override with absolute price min and max values:
+            # Override with absolute price min and max values, rounded to space dtype same way
+            # observations get rounded, so those stay within bounds:
             self.params['strategy']['state_shape']['raw_state'].low =\
                 self.engine.strats[0][0][2]['state_shape']['raw_state'].low =\
-                np.zeros(self.params['strategy']['state_shape']['raw_state'].shape) +\
-                self.dataset_stat.loc['min', self.dataset_columns].min()
+                np.full(
+                    self.params['strategy']['state_shape']['raw_state'].shape,
+                    self.dataset_stat.loc['min', self.dataset_columns].min(),
+                    dtype=self.params['strategy']['state_shape']['raw_state'].dtype,
+                )
 
             self.params['strategy']['state_shape']['raw_state'].high = \
                 self.engine.strats[0][0][2]['state_shape']['raw_state'].high = \
-                np.zeros(self.params['strategy']['state_shape']['raw_state'].shape) + \
-                self.dataset_stat.loc['max', self.dataset_columns].max()
+                np.full(
+                    self.params['strategy']['state_shape']['raw_state'].shape,
+                    self.dataset_stat.loc['max', self.dataset_columns].max(),
+                    dtype=self.params['strategy']['state_shape']['raw_state'].dtype,
+                )
 
             self.log.info('Inferring `state_raw` high/low values form dataset: {:.6f} / {:.6f}.'.
                           format(self.dataset_stat.loc['min', self.dataset_columns].min(),
@@ -382,6 +430,7 @@ class BTgymEnv(gym.Env):
         # Finally:
         self.server_response = None
         self.env_response = None
+        self.state_layout = None  # Observation arrays layout for binary step protocol, set by reset()
 
         #if not self.data_master:
         self._start_server()
@@ -446,6 +495,49 @@ class BTgymEnv(gym.Env):
 
         return response
 
+    @staticmethod
+    def _step_with_timeout(socket, frames, layout):
+        """
+        Exchanges binary step request and response via socket, timeout sensitive.
+
+        Args:
+            socket: zmq connected socket to communicate via;
+            frames: step request frames;
+            layout: observation state layout, None if responses are expected to be pickled.
+
+        Returns:
+            dictionary, same as `_comm_with_timeout()`.
+        """
+        response = dict(
+            status='ok',
+            message=None,
+        )
+        try:
+            socket.send_multipart(frames)
+
+        except zmq.ZMQError as e:
+            if e.errno == zmq.EAGAIN:
+                response['status'] = 'send_failed_due_to_connect_timeout'
+
+            else:
+                response['status'] = 'send_failed_for_unknown_reason'
+            return response
+
+        start = time.time()
+        try:
+            response['message'] = decode_step_response(layout, socket.recv_multipart(copy=False))
+            response['time'] = time.time() - start
+
+        except zmq.ZMQError as e:
+            if e.errno == zmq.EAGAIN:
+                response['status'] = 'receive_failed_due_to_connect_timeout'
+
+            else:
+                response['status'] = 'receive_failed_for_unknown_reason'
+            return response
+
+        return response
+
     def _start_server(self):
         """
         Configures backtrader REQ/REP server instance and starts server process.
@@ -457,31 +549,44 @@ class BTgymEnv(gym.Env):
             self.context.destroy()
             self.socket = None
 
-        # 2. Kill any process using server port:
-        cmd = "kill $( lsof -i:{} -t ) > /dev/null 2>&1".format(self.port)
-        os.system(cmd)
+        if self.in_process:
+            # Channel stands for both context and socket:
+            self.context = InProcessChannel()
+            self.socket = self.context.client
+            self.socket.setsockopt(zmq.RCVTIMEO, self.connect_timeout * 1000)
 
-        # Set up client channel:
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.setsockopt(zmq.RCVTIMEO, self.connect_timeout * 1000)
-        self.socket.setsockopt(zmq.SNDTIMEO, self.connect_timeout * 1000)
-        self.socket.connect(self.network_address)
+        else:
+            # 2. Kill any process using server port:
+            clear_address(self.network_address, self.port)
+
+            # Set up client channel:
+            self.context = zmq.Context()
+            self.socket = self.context.socket(zmq.REQ)
+            self.socket.setsockopt(zmq.RCVTIMEO, self.connect_timeout * 1000)
+            self.socket.setsockopt(zmq.SNDTIMEO, self.connect_timeout * 1000)
+            self.socket.connect(self.network_address)
 
         # Configure and start server:
         self.server = BTgymServer(
             cerebro=self.engine,
             render=self.renderer,
             network_address=self.network_address,
-            data_network_address=self.data_network_address,
+            data_network_address=self.data_network_addresses,
             connect_timeout=self.connect_timeout,
             log_level=self.log_level,
             task=self.task,
+            channel=self.context if self.in_process else None,
+            episode_gc=self.episode_gc,
+            prepare_episodes=self.prepare_episodes,
         )
-        self.server.daemon = False
-        self.server.start()
-        # Wait for server to startup:
-        time.sleep(1)
+        if self.in_process:
+            self.server.start_in_process()
+
+        else:
+            self.server.daemon = False
+            self.server.start()
+            # Wait for server to startup:
+            time.sleep(1)
 
         # Check connection:
         self.log.info('Server started, pinging {} ...'.format(self.network_address))
@@ -512,6 +617,10 @@ class BTgymEnv(gym.Env):
                 self.socket.send_pyobj({'ctrl': '_stop'})
                 self.server_response = self.socket.recv_pyobj()
 
+            elif self.server.thread is not None:
+                # In-process server thread is gone already:
+                self.server_response = 'Server thread is not running.'
+
             else:
                 self.server.terminate()
                 self.server.join()
@@ -635,79 +744,146 @@ class BTgymEnv(gym.Env):
                     b_beta=1
                 )
 
+        """
+        self._prepare_reset()
+
+        # Single round-trip: server terminates running episode, if any, starts new one
+        # and replies with its first step response or dataset status:
+        return self._accept_reset_response(self._reset_step(kwargs), kwargs)
+
+    def _prepare_reset(self):
+        """
+        Ensures servers are running, updates step latency statistic.
         """
         # Data Server check:
         if self.data_master:
-            if not self.data_server or not self.data_server.is_alive():
+            if not self._data_servers_alive():
                 self.log.info('No running data_server found, starting...')
                 self._start_data_server()
 
-            # Domain dataset status check:
-            self.data_server_response = self._comm_with_timeout(
-                socket=self.data_socket,
-                message={'ctrl': '_get_info'}
-            )
-            if not self.data_server_response['message']['dataset_is_ready']:
-                self.log.info(
-                    'Data domain `reset()` called prior to `reset_data()` with [possibly inconsistent] defaults.'
-                )
-                self.reset_data()
-
         # Server process check:
         if not self.server or not self.server.is_alive():
             self.log.info('No running server found, starting...')
             self._start_server()
 
-        if self._force_control_mode():
-            self.server_response = self._comm_with_timeout(
-                socket=self.socket,
-                message={'ctrl': '_reset', 'kwargs': kwargs}
+        if self._step_count > 0:
+            self.step_latency = self._step_time / self._step_count
+            self.log.info(
+                'Step round-trip via {}: {:.3f} ms mean over {} steps.'.format(
+                    self.network_address.split('://')[0],
+                    self.step_latency * 1e3,
+                    self._step_count,
+                )
             )
-            # Get initial environment response:
-            self.env_response = self.step(0)
+            self._step_time = 0.0
+            self._step_count = 0
 
-            # Check (once) if it is really (o,r,d,i) tuple:
-            self._assert_response(self.env_response)
+    def _accept_reset_response(self, response, kwargs):
+        """
+        Checks server response to combined reset request, resets data and retries if domain dataset is not ready.
 
-            # Check (once) if state_space is as expected:
-            try:
-                assert self.observation_space.contains(self.env_response[0])
-
-            except (AssertionError, AttributeError) as e:
-                msg1 = self._print_space(self.observation_space.spaces)
-                msg2 = self._print_space(self.env_response[0])
-                msg3 = ''
-                for step_info in self.env_response[-1]:
-                    msg3 += '{}\n'.format(step_info)
-                msg = (
-                    '\nState observation shape/range mismatch!\n' +
-                    'Space set by env: \n{}\n' +
-                    'Space returned by server: \n{}\n' +
-                    'Full response:\n{}\n' +
-                    'Reward: {}\n' +
-                    'Done: {}\n' +
-                    'Info:\n{}\n' +
-                    'Hint: Wrong Strategy.get_state() parameters?'
-                ).format(
-                    msg1,
-                    msg2,
-                    self.env_response[0],
-                    self.env_response[1],
-                    self.env_response[2],
-                    msg3,
-                )
-                self.log.exception(msg)
-                self._stop_server()
-                raise AssertionError(msg)
+        Args:
+            response:   server response to `_reset_message()`;
+            kwargs:     env.reset() kwargs
 
-            return self.env_response[0]
+        Returns:
+            initial observation
+        """
+        self.env_response = response
 
+        if self.data_master and type(self.env_response) == dict and \
+                not self.env_response.get('dataset_is_ready', True):
+            self.log.info(
+                'Data domain `reset()` called prior to `reset_data()` with [possibly inconsistent] defaults.'
+            )
+            self.reset_data()
+            self.env_response = self._reset_step(kwargs)
 
-        else:
+        # Check (once) if it is really (o,r,d,i) tuple:
+        self._assert_response(self.env_response)
+
+        # Check (once) if state_space is as expected:
+        try:
+            assert self.observation_space.contains(self.env_response[0])
+
+        except (AssertionError, AttributeError) as e:
+            msg1 = self._print_space(self.observation_space.spaces)
+            msg2 = self._print_space(self.env_response[0])
+            msg3 = ''
+            for step_info in self.env_response[-1]:
+                msg3 += '{}\n'.format(step_info)
+            msg = (
+                '\nState observation shape/range mismatch!\n' +
+                'Space set by env: \n{}\n' +
+                'Space returned by server: \n{}\n' +
+                'Full response:\n{}\n' +
+                'Reward: {}\n' +
+                'Done: {}\n' +
+                'Info:\n{}\n' +
+                'Hint: Wrong Strategy.get_state() parameters?'
+            ).format(
+                msg1,
+                msg2,
+                self.env_response[0],
+                self.env_response[1],
+                self.env_response[2],
+                msg3,
+            )
+            self.log.exception(msg)
+            self._stop_server()
+            raise AssertionError(msg)
+
+        # Observation layout for binary step responses, same as server derives:
+        self.state_layout = state_layout(self.env_response[0])
+
+        return self.env_response[0]
+
+    def _reset_message(self, kwargs):
+        """
+        Makes combined reset request: server puts itself to control mode, starts new episode
+        and replies with response to first `hold` step.
+
+        Args:
+            kwargs:     env.reset() kwargs
+
+        Returns:
+            message dictionary
+        """
+        if not self.server or not self.server.is_alive() or not self.context or self.context.closed:
             msg = 'Something went wrong. env.reset() can not get response from server.'
             self.log.exception(msg)
             raise ChildProcessError(msg)
 
+        return {
+            'ctrl': '_reset_step',
+            'kwargs': kwargs,
+            'action': self.server_actions[0],
+            'data_master': self.data_master,
+        }
+
+    def _reset_step(self, kwargs):
+        """
+        Exchanges combined reset request and response.
+
+        Args:
+            kwargs:     env.reset() kwargs
+
+        Returns:
+            first step response as (o, r, d, i) tuple or server message.
+        """
+        response = self._comm_with_timeout(
+            socket=self.socket,
+            message=self._reset_message(kwargs)
+        )
+        if not response['status'] in 'ok':
+            msg = '.reset(): server unreachable with status: <{}>.'.format(response['status'])
+            self.log.error(msg)
+            raise ConnectionError(msg)
+
+        self.server_response = response['message']
+
+        return response['message']
+
     def step(self, action):
         """
         Implementation of OpenAI Gym env.step() method.
@@ -720,6 +896,23 @@ class BTgymEnv(gym.Env):
             tuple (Observation, Reward, Info, Done)
 
         """
+        # Send action to backtrader engine, receive environment response
+        start = time.time()
+        env_response = self._step_with_timeout(self.socket, self._step_request(action), self.state_layout)
+        if not env_response['status'] in 'ok':
+            msg = '.step(): server unreachable with status: <{}>.'.format(env_response['status'])
+            self.log.error(msg)
+            raise ConnectionError(msg)
+
+        return self._accept_step_response(env_response['message'], time.time() - start)
+
+    def _step_request(self, action):
+        """
+        Checks action and environment state.
+
+        Returns:
+            step request frames, binary if observation layout is known.
+        """
         # Are you in the list, ready to go and all that?
         if self.action_space.contains(action)\
             and not self._closed\
@@ -742,17 +935,22 @@ class BTgymEnv(gym.Env):
             self.log.exception(msg)
             raise AssertionError(msg)
 
-        # Send action to backtrader engine, receive environment response
-        env_response = self._comm_with_timeout(
-            socket=self.socket,
-            message={'action': self.server_actions[action]}
-        )
-        if not env_response['status'] in 'ok':
-            msg = '.step(): server unreachable with status: <{}>.'.format(env_response['status'])
-            self.log.error(msg)
-            raise ConnectionError(msg)
+        frames = None
+        if self.state_layout is not None:
+            frames = encode_step_request(self.server_actions[action])
+
+        if frames is None:
+            frames = encode_message({'action': self.server_actions[action]})
 
-        self.env_response = env_response ['message']
+        return frames
+
+    def _accept_step_response(self, response, elapsed):
+        """
+        Stores step response and round-trip time.
+        """
+        self.env_response = response
+        self._step_time += elapsed
+        self._step_count += 1
 
         return self.env_response
 
@@ -846,54 +1044,69 @@ class BTgymEnv(gym.Env):
             - establishes network connection to existing data_server.
         """
         self.data_server = None
+        self.data_servers = []
 
         # Ensure network resources:
         # 1. Release client-side, if any:
         if self.data_context:
             self.data_context.destroy()
             self.data_socket = None
+            self.data_sockets = []
 
         # Only data_master launches/stops data_server process:
         if self.data_master:
-            # 2. Kill any process using server port:
-            cmd = "kill $( lsof -i:{} -t ) > /dev/null 2>&1".format(self.data_port)
-            os.system(cmd)
-
-            # Configure and start server:
-            self.data_server = BTgymDataFeedServer(
-                dataset=self.dataset,
-                network_address=self.data_network_address,
-                log_level=self.log_level,
-                task=self.task
-            )
-            self.data_server.daemon = False
-            self.data_server.start()
+            for shard, data_network_address in enumerate(self.data_network_addresses):
+                # 2. Kill any process using server port:
+                clear_address(data_network_address, self.data_port - shard)
+
+                # Configure and start server:
+                data_server = BTgymDataFeedServer(
+                    dataset=self.dataset,
+                    network_address=data_network_address,
+                    log_level=self.log_level,
+                    task=self.task,
+                    share_data=self.share_data,
+                    num_workers=self.data_workers,
+                    shard=(shard, self.data_shards) if self.data_shards > 1 else None,
+                )
+                data_server.daemon = False
+                data_server.start()
+                self.data_servers.append(data_server)
+
+            self.data_server = self.data_servers[0]
             # Wait for server to startup
             time.sleep(1)
 
         # Set up client channel:
         self.data_context = zmq.Context()
-        self.data_socket = self.data_context.socket(zmq.REQ)
-        self.data_socket.setsockopt(zmq.RCVTIMEO, self.connect_timeout * 1000)
-        self.data_socket.setsockopt(zmq.SNDTIMEO, self.connect_timeout * 1000)
-        self.data_socket.connect(self.data_network_address)
+        self.data_sockets = []
+        for data_network_address in self.data_network_addresses:
+            data_socket = self.data_context.socket(zmq.REQ)
+            data_socket.setsockopt(zmq.RCVTIMEO, self.connect_timeout * 1000)
+            data_socket.setsockopt(zmq.SNDTIMEO, self.connect_timeout * 1000)
+            data_socket.connect(data_network_address)
 
-        # Check connection:
-        self.log.debug('Pinging data_server at: {} ...'.format(self.data_network_address))
+            # Check connection:
+            self.log.debug('Pinging data_server at: {} ...'.format(data_network_address))
 
-        self.data_server_response = self._comm_with_timeout(
-            socket=self.data_socket,
-            message={'ctrl': 'ping!'}
-        )
-        if self.data_server_response['status'] in 'ok':
-            self.log.debug('Data_server seems ready with response: <{}>'.
-                          format(self.data_server_response['message']))
+            self.data_server_response = self._comm_with_timeout(
+                socket=data_socket,
+                message={'ctrl': 'ping!'}
+            )
+            if self.data_server_response['status'] in 'ok':
+                self.log.debug('Data_server seems ready with response: <{}>'.
+                              format(self.data_server_response['message']))
 
-        else:
-            msg = 'Data_server unreachable with status: <{}>.'.\
-                format(self.data_server_response['status'])
-            self.log.error(msg)
-            raise ConnectionError(msg)
+            else:
+                msg = 'Data_server unreachable with status: <{}>.'.\
+                    format(self.data_server_response['status'])
+                self.log.error(msg)
+                raise ConnectionError(msg)
+
+            self.data_sockets.append(data_socket)
+
+        # Statistic is same for every shard:
+        self.data_socket = self.data_sockets[0]
 
         # Get info and statistic:
         self.dataset_stat, self.dataset_columns, self.data_server_pid = self._get_dataset_info()
@@ -904,21 +1117,73 @@ class BTgymEnv(gym.Env):
             - stops BT server process, releases network resources.
         """
         if self.data_master:
-            if self.data_server is not None and self.data_server.is_alive():
-                # In case server is running and is ok:
-                self.data_socket.send_pyobj({'ctrl': '_stop'})
-                self.data_server_response = self.data_socket.recv_pyobj()
+            for data_server, data_socket in zip(self.data_servers, self.data_sockets):
+                if data_server.is_alive():
+                    # In case server is running and is ok:
+                    data_socket.send_pyobj({'ctrl': '_stop'})
+                    self.data_server_response = data_socket.recv_pyobj()
 
-            else:
-                self.data_server.terminate()
-                self.data_server.join()
-                self.data_server_response = 'Data_server process terminated.'
+                else:
+                    data_server.terminate()
+                    data_server.join()
+                    self.data_server_response = 'Data_server process terminated.'
 
-            self.log.info('{} Exit code: {}'.format(self.data_server_response, self.data_server.exitcode))
+                self.log.info('{} Exit code: {}'.format(self.data_server_response, data_server.exitcode))
 
         if self.data_context:
             self.data_context.destroy()
             self.data_socket = None
+            self.data_sockets = []
+
+    def _data_servers_alive(self):
+        """
+        Returns:
+            True if every data_server process is running, False otherwise.
+        """
+        return len(self.data_servers) > 0 and all([data_server.is_alive() for data_server in self.data_servers])
+
+    def _comm_data_servers(self, message):
+        """
+        Sends request to every data_server first and collects responses after, so shards serve it concurrently.
+
+        Args:
+            message: message to send;
+
+        Returns:
+            list of response dictionaries, one per data_server, see `_comm_with_timeout()`.
+        """
+        responses = []
+        for data_socket in self.data_sockets:
+            response = dict(status='ok', message=None)
+            try:
+                data_socket.send_pyobj(message)
+
+            except zmq.ZMQError as e:
+                if e.errno == zmq.EAGAIN:
+                    response['status'] = 'send_failed_due_to_connect_timeout'
+
+                else:
+                    response['status'] = 'send_failed_for_unknown_reason'
+
+            responses.append(response)
+
+        start = time.time()
+        for data_socket, response in zip(self.data_sockets, responses):
+            if response['status'] != 'ok':
+                continue
+
+            try:
+                response['message'] = data_socket.recv_pyobj()
+                response['time'] = time.time() - start
+
+            except zmq.ZMQError as e:
+                if e.errno == zmq.EAGAIN:
+                    response['status'] = 'receive_failed_due_to_connect_timeout'
+
+                else:
+                    response['status'] = 'receive_failed_for_unknown_reason'
+
+        return responses
 
     def _restart_data_server(self):
         """
@@ -928,6 +1193,54 @@ class BTgymEnv(gym.Env):
             self._stop_data_server()
             self._start_data_server()
 
+    def append_data(self, **kwargs):
+        """
+        Makes data_server extend its dataset with new records, e.g. appended to source files since it has been loaded.
+        Data server keeps serving meanwhile: running episode is not affected, samples drawn since include new data.
+        Observation space `raw_state` bounds get updated to new price range. Environments other than data_master
+        only update their bounds, so call it for every environment sharing data_server.
+
+        Args:
+            **kwargs:   data provider class .append() method specific.
+
+        Returns:
+            int, number of records appended.
+        """
+        num_records = 0
+        if self.data_master:
+            for response in self._comm_data_servers({'ctrl': '_append_data', 'kwargs': kwargs}):
+                self.data_server_response = response
+                if response['status'] in 'ok':
+                    self.log.debug('Data_server responded with: <{}>'.format(response['message']))
+
+                else:
+                    msg = 'Data_server unreachable with status: <{}>.'.format(response['status'])
+                    self.log.error(msg)
+                    raise SystemExit(msg)
+
+                num_records += response['message']['num_records']
+
+        self._update_raw_state_bounds()
+
+        return num_records
+
+    def _update_raw_state_bounds(self):
+        """
+        Sets `raw_state` observation space bounds to price range of data_server dataset.
+        """
+        if 'raw_state' not in self.observation_space.spaces.keys():
+            return
+
+        self.dataset_stat, _, self.data_server_pid = self._get_dataset_info()
+        raw_state = self.observation_space.spaces['raw_state']
+        # Rounded to space dtype, see __init__():
+        raw_state.low = np.full(
+            raw_state.shape, self.dataset_stat.loc['min', self.dataset_columns].min(), dtype=raw_state.dtype
+        )
+        raw_state.high = np.full(
+            raw_state.shape, self.dataset_stat.loc['max', self.dataset_columns].max(), dtype=raw_state.dtype
+        )
+
     def _get_dataset_info(self):
         """
         Retrieves dataset descriptive statistic.
@@ -959,23 +1272,25 @@ class BTgymEnv(gym.Env):
         else:
             _ = self._force_control_mode()
 
+        # Episode server prepared in background comes from data being reset; it is discarded first,
+        # so server doesn't take trial from new data meanwhile:
+        if self.server and self.server.is_alive() and self.context and not self.context.closed:
+            self._comm_with_timeout(socket=self.socket, message={'ctrl': '_reset_data'})
+
         if self.data_master:
-            if self.data_server is None or not self.data_server.is_alive():
+            if not self._data_servers_alive():
                 self._restart_data_server()
 
-            self.data_server_response = self._comm_with_timeout(
-                socket=self.data_socket,
-                message={'ctrl': '_reset_data', 'kwargs': kwargs}
-            )
-            if self.data_server_response['status'] in 'ok':
-                self.log.debug('Dataset seems ready with response: <{}>'.
-                               format(self.data_server_response['message']))
+            # Shards get reset concurrently:
+            for response in self._comm_data_servers({'ctrl': '_reset_data', 'kwargs': kwargs}):
+                self.data_server_response = response
+                if response['status'] in 'ok':
+                    self.log.debug('Dataset seems ready with response: <{}>'.format(response['message']))
 
-            else:
-                msg = 'Data_server unreachable with status: <{}>.'. \
-                    format(self.data_server_response['status'])
-                self.log.error(msg)
-                raise SystemExit(msg)
+                else:
+                    msg = 'Data_server unreachable with status: <{}>.'.format(response['status'])
+                    self.log.error(msg)
+                    raise SystemExit(msg)
 
         else:
             pass
@@ -0,0 +1,251 @@
+###############################################################################
+#
+# Copyright (C) 2017 Andrew Muzikin, muzikinae@gmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import time
+import zmq
+
+import numpy as np
+
+from btgym.envs.backtrader import BTgymEnv
+from btgym.protocol import encode_message, decode_step_response
+
+
+class BTgymVecEnv:
+    """
+    Vectorized environment: holds number of BTgym environments, every one running its own server process,
+    and steps them concurrently. Requests are sent to all servers at once and replies are collected
+    as they arrive, so backtrader episodes advance in parallel while agent computes next actions for entire batch::
+
+        env = BTgymVecEnv(num_envs=4, filename='../examples/data/DAT_ASCII_EURUSD_M1_2016.csv')
+        observations = env.reset_all()
+        while ...:
+            env.step_async(actions)
+            observations, rewards, dones, infos = env.step_wait()
+
+    Observations are returned stacked along first dimension, keeping observation space dictionary structure.
+    Finished environments are not restarted automatically: use `reset_at()` or `reset_all()`.
+    """
+    def __init__(self, envs=None, num_envs=2, **kwargs):
+        """
+        Args:
+            envs:       list of BTgymEnv instances to use; if given, other args are ignored;
+            num_envs:   int, number of environments to make;
+            kwargs:     BTgymEnv kwargs; first environment is made data_master, others are given
+                        consecutive ports and get data from it, rendering is enabled for first one only.
+
+        Note:
+            Environments with `in_process` server are not supported: those have no sockets to poll
+            and take turns with their servers, so can't be stepped concurrently anyway.
+        """
+        if kwargs.get('in_process', False) or (envs is not None and any(env.in_process for env in envs)):
+            raise ValueError('Vectorized environment expects servers running in own processes, got `in_process=True`.')
+
+        if envs is None:
+            port = kwargs.pop('port', BTgymEnv.port)
+            render_enabled = kwargs.pop('render_enabled', True)
+            kwargs.pop('data_master', None)
+            envs = []
+            for index in range(num_envs):
+                envs.append(
+                    BTgymEnv(
+                        port=port + index,
+                        data_master=index == 0,
+                        render_enabled=render_enabled and index == 0,
+                        **kwargs
+                    )
+                )
+
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.observation_space = envs[0].observation_space
+        self.action_space = envs[0].action_space
+        self.log = envs[0].log
+        self.connect_timeout = max([env.connect_timeout for env in envs])
+
+        self.waiting = False
+        self._step_start = None
+        self._poller = None
+        self._poller_sockets = None
+
+    def _gather(self, indices, accept):
+        """
+        Polls sockets of given environments, passes every reply to `accept(index, frames)` as soon as it arrives.
+        """
+        sockets = tuple([env.socket for env in self.envs])
+        if sockets != self._poller_sockets:
+            # Servers restarted, sockets are new:
+            self._poller = zmq.Poller()
+            for socket in sockets:
+                self._poller.register(socket, zmq.POLLIN)
+
+            self._poller_sockets = sockets
+
+        # Only sockets with requests sent can get replies:
+        pending = {self.envs[index].socket: index for index in indices}
+
+        while len(pending) > 0:
+            events = self._poller.poll(self.connect_timeout * 1000)
+            if len(events) == 0:
+                msg = 'Servers of environments {} unreachable: receive timeout.'.format(sorted(pending.values()))
+                self.log.error(msg)
+                raise ConnectionError(msg)
+
+            for socket, _ in events:
+                index = pending.pop(socket)
+                accept(index, socket.recv_multipart(copy=False))
+
+    @staticmethod
+    def _stack(items):
+        """
+        Stacks [nested] dictionaries of arrays along new first dimension.
+        """
+        if isinstance(items[0], dict):
+            return {key: BTgymVecEnv._stack([item[key] for item in items]) for key in items[0].keys()}
+
+        return np.stack(items)
+
+    def reset_at(self, indices, **kwargs):
+        """
+        Resets given environments concurrently.
+
+        Args:
+            indices:    list of environment numbers;
+            kwargs:     env.reset() kwargs, same for every environment;
+
+        Returns:
+            stacked initial observations, in `indices` order.
+        """
+        try:
+            assert not self.waiting
+
+        except AssertionError:
+            msg = 'Reset attempt while waiting for step responses. Hint: forgot to call step_wait()?'
+            self.log.exception(msg)
+            raise AssertionError(msg)
+
+        for index in indices:
+            self.envs[index]._prepare_reset()
+
+        for index in indices:
+            env = self.envs[index]
+            env.socket.send_multipart(encode_message(env._reset_message(kwargs)))
+
+        observations = dict()
+
+        def accept(index, frames):
+            # Data master may reset dataset right here, data slaves are waiting for it:
+            observations[index] = self.envs[index]._accept_reset_response(decode_step_response(None, frames), kwargs)
+
+        self._gather(indices, accept)
+
+        return self._stack([observations[index] for index in indices])
+
+    def reset_all(self, **kwargs):
+        """
+        Resets every environment.
+
+        Returns:
+            stacked initial observations.
+        """
+        return self.reset_at(list(range(self.num_envs)), **kwargs)
+
+    def step_async(self, actions):
+        """
+        Sends actions to every environment, does not wait for responses.
+
+        Args:
+            actions:    iterable of actions, one per environment.
+        """
+        try:
+            assert not self.waiting and len(actions) == self.num_envs
+
+        except AssertionError:
+            msg = 'Expected {} actions and no pending steps, got: {} actions, waiting: {}.'.format(
+                self.num_envs,
+                len(actions),
+                self.waiting,
+            )
+            self.log.exception(msg)
+            raise AssertionError(msg)
+
+        requests = [env._step_request(action) for env, action in zip(self.envs, actions)]
+        self._step_start = time.time()
+        for env, frames in zip(self.envs, requests):
+            env.socket.send_multipart(frames)
+
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Collects responses to actions sent by `step_async()`.
+
+        Returns:
+            stacked observations, rewards array, dones array, list of infos.
+        """
+        try:
+            assert self.waiting
+
+        except AssertionError:
+            msg = 'No pending steps. Hint: forgot to call step_async()?'
+            self.log.exception(msg)
+            raise AssertionError(msg)
+
+        responses = [None] * self.num_envs
+
+        def accept(index, frames):
+            env = self.envs[index]
+            # Observations get copied when stacked:
+            responses[index] = env._accept_step_response(
+                decode_step_response(env.state_layout, frames, copy=False),
+                time.time() - self._step_start
+            )
+            if type(responses[index]) != tuple:
+                env._assert_response(responses[index])
+
+        try:
+            self._gather(list(range(self.num_envs)), accept)
+
+        finally:
+            self.waiting = False
+
+        observations, rewards, dones, infos = zip(*responses)
+
+        return (
+            self._stack(observations),
+            np.asarray(rewards, dtype=np.float64),
+            np.asarray(dones, dtype=bool),
+            list(infos),
+        )
+
+    def step(self, actions):
+        """
+        Makes a step in every environment.
+
+        Returns:
+            stacked observations, rewards array, dones array, list of infos.
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """
+        Closes every environment, data_master one last.
+        """
+        for env in reversed(self.envs):
+            env.close()
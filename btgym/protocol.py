@@ -0,0 +1,319 @@
+###############################################################################
+#
+# Copyright (C) 2017-2018 Andrew Muzikin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Environment <-> server transport addresses and binary in-episode step protocol.
+
+Co-located environment, server and data server talk via Unix domain sockets (`ipc://` transport)
+instead of TCP loopback, see `make_address()`; server running within environment process
+is served by `InProcessChannel` without any socket at all.
+
+Step request is two frames: [STEP_REQUEST, action as utf-8 string].
+Step response is multipart message::
+
+    [header, pickled info, observation array, observation array, ...]
+
+where header holds response kind, done flag and reward, and every observation array goes as raw
+bytes frame. Arrays order, dtypes and shapes (state layout) are not sent: both sides derive layout from
+first episode observation, which goes as pickled response to reset request.
+
+Response of `PICKLED` kind carries entire pickled (o, r, d, i) tuple as second frame;
+it is used when observation does not fit layout.
+
+Any other single-frame message is pickled python object, as sent by `socket.send_pyobj()`.
+"""
+
+import os
+import pickle
+import queue
+import struct
+import tempfile
+
+import numpy as np
+import zmq
+
+# Pickled message frame always starts with b'\x80' protocol opcode, so tags can't be confused with it:
+STEP_REQUEST = b'\x00btgym_step'
+
+BINARY = 0
+PICKLED = 1
+
+_header = struct.Struct('<BBd')  # kind, done, reward
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '0.0.0.0', '*')
+
+
+def ipc_path(port):
+    """
+    Returns:
+        Unix domain socket filename standing for given local port; filenames are distinct per user,
+        since temporary directory is usually shared.
+    """
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), 'btgym_{}_{}.ipc'.format(uid, port))
+
+
+def make_address(address, port, transport='auto'):
+    """
+    Composes zmq endpoint address.
+
+    Args:
+        address:    str, tcp address prefix, e.g. `tcp://127.0.0.1:`;
+        port:       int, port number; for `ipc` transport it keys socket filename, see `ipc_path()`;
+        transport:  str, `tcp`, `ipc` or `auto` - use `ipc` if host is local one and platform supports it,
+                    `tcp` otherwise;
+
+    Returns:
+        str, endpoint address.
+    """
+    if transport not in ['auto', 'tcp', 'ipc']:
+        raise ValueError('Expected transport be one of: `auto`, `tcp`, `ipc`, got: {}'.format(transport))
+
+    if transport == 'auto':
+        host = address.split('://')[-1].rsplit(':', 1)[0]
+        if address.startswith('tcp://') and host in LOCAL_HOSTS and zmq.has('ipc'):
+            transport = 'ipc'
+
+        else:
+            transport = 'tcp'
+
+    if transport == 'ipc':
+        return 'ipc://' + ipc_path(port)
+
+    return address + str(port)
+
+
+def clear_address(address, port):
+    """
+    Kills any process holding endpoint.
+    """
+    if address.startswith('ipc://'):
+        cmd = "kill $( lsof -t {} 2> /dev/null ) > /dev/null 2>&1".format(address[len('ipc://'):])
+
+    else:
+        cmd = "kill $( lsof -i:{} -t ) > /dev/null 2>&1".format(port)
+
+    os.system(cmd)
+
+
+def state_layout(state, _path=()):
+    """
+    Describes observation as flat list of arrays.
+
+    Args:
+        state:  [nested] dictionary of numpy arrays.
+
+    Returns:
+        tuple of (key path, dtype, shape) in transmission order;
+        None, if state holds something other than arrays.
+    """
+    if not isinstance(state, dict):
+        return None
+
+    layout = []
+    for key in sorted(state.keys()):
+        value = state[key]
+        if isinstance(value, dict):
+            nested = state_layout(value, _path + (key,))
+            if nested is None:
+                return None
+
+            layout += nested
+
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            layout.append((_path + (key,), value.dtype, value.shape))
+
+        else:
+            return None
+
+    return tuple(layout)
+
+
+def _get(state, path):
+    for key in path:
+        state = state[key]
+
+    return state
+
+
+class ObjectFrame:
+    """
+    Python object passed by reference within process, stands for pickled message frame.
+    """
+    __slots__ = ['obj']
+
+    def __init__(self, obj):
+        self.obj = obj
+
+
+class _InProcessEndpoint:
+    """
+    One side of `InProcessChannel`, mimics zmq socket methods used by environment and server.
+    """
+    in_process = True
+
+    def __init__(self, send_queue, recv_queue):
+        self._send_queue = send_queue
+        self._recv_queue = recv_queue
+        self.timeout = None
+        self.closed = False
+
+    def setsockopt(self, option, value):
+        if option == zmq.RCVTIMEO:
+            self.timeout = value / 1000 if value >= 0 else None
+
+    def send_multipart(self, frames, copy=True):
+        self._send_queue.put(list(frames))
+
+    def send_pyobj(self, obj):
+        self._send_queue.put([ObjectFrame(obj)])
+
+    def recv_multipart(self, copy=True):
+        try:
+            return self._recv_queue.get(timeout=self.timeout)
+
+        except queue.Empty:
+            raise zmq.Again(zmq.EAGAIN)
+
+    def recv_pyobj(self):
+        return decode_message(self.recv_multipart())
+
+    def close(self):
+        self.closed = True
+
+
+class InProcessChannel:
+    """
+    Connected pair of in-process endpoints standing for zmq REQ/REP sockets and their context:
+    messages are passed by reference, nothing gets copied or pickled.
+    Receiving side blocks until message arrives, so environment and server thread hand control
+    to each other same way coroutines do.
+    """
+    def __init__(self):
+        requests = queue.Queue()
+        replies = queue.Queue()
+        self.client = _InProcessEndpoint(requests, replies)
+        self.server = _InProcessEndpoint(replies, requests)
+        self.closed = False
+
+    def destroy(self):
+        self.client.close()
+        self.server.close()
+        self.closed = True
+
+
+def encode_message(message):
+    """
+    Returns:
+        single frame list, same as `socket.send_pyobj(message)` sends.
+    """
+    return [pickle.dumps(message, -1)]
+
+
+def decode_message(frames):
+    """
+    Returns:
+        object sent as single frame message.
+    """
+    if isinstance(frames[0], ObjectFrame):
+        return frames[0].obj
+
+    return pickle.loads(frames[0])
+
+
+def encode_step_request(action):
+    """
+    Returns:
+        list of frames, None if action can't go binary.
+    """
+    if not isinstance(action, str):
+        return None
+
+    return [STEP_REQUEST, action.encode('utf-8')]
+
+
+def decode_step_request(frames):
+    """
+    Returns:
+        message dictionary; binary step request is decoded as {'action': action} one.
+        Bool, True if request was binary step one.
+    """
+    if len(frames) == 2 and frames[0] == STEP_REQUEST:
+        return {'action': frames[1].decode('utf-8')}, True
+
+    return decode_message(frames), False
+
+
+def encode_step_response(layout, state, reward, is_done, info):
+    """
+    Makes step response frames, falls back to pickled response if state doesn't match layout.
+
+    Returns:
+        list of frames, arrays are passed as is and can be sent without copying.
+    """
+    if layout is not None:
+        try:
+            arrays = []
+            for path, dtype, shape in layout:
+                array = _get(state, path)
+                assert array.dtype == dtype and array.shape == shape
+                arrays.append(np.ascontiguousarray(array))
+
+            return [_header.pack(BINARY, bool(is_done), float(reward)), pickle.dumps(info, -1)] + arrays
+
+        except (AssertionError, AttributeError, KeyError, TypeError, ValueError):
+            pass
+
+    return [_header.pack(PICKLED, bool(is_done), 0.0), pickle.dumps((state, reward, is_done, info), -1)]
+
+
+def decode_step_response(layout, frames, copy=True):
+    """
+    Restores step response from frames.
+
+    Args:
+        layout:     state layout, as returned by `state_layout()`;
+        frames:     list of received frames, zmq.Frame or bytes;
+        copy:       bool, if False - observation arrays are views of received frames, not copies;
+                    such arrays are read-only and keep frames memory alive.
+
+    Returns:
+        (o, r, d, i) tuple or unpickled single-frame message.
+    """
+    if len(frames) == 1:
+        # Not a step response, e.g. server control mode message or in-process response:
+        return decode_message(frames)
+
+    frames = [memoryview(frame) for frame in frames]
+
+    kind, is_done, reward = _header.unpack(frames[0])
+    if kind == PICKLED:
+        return pickle.loads(frames[1])
+
+    state = dict()
+    for (path, dtype, shape), frame in zip(layout, frames[2:]):
+        node = state
+        for key in path[:-1]:
+            node = node.setdefault(key, dict())
+
+        node[path[-1]] = np.frombuffer(frame, dtype=dtype).reshape(shape)
+        if copy:
+            node[path[-1]] = node[path[-1]].copy()
+
+    return state, reward, bool(is_done), pickle.loads(frames[1])
@@ -402,6 +402,26 @@ class DevStrat_4_7(DevStrat_4_6):
 
         return self.reward
 
+    @classmethod
+    def sma_features(cls, periods):
+        """
+        Returns dataset features specification for SMA data lines of given periods, to be precomputed once
+        per dataset instead of running indicators in every episode, e.g.::
+
+            BTgymDataset(..., parsing_params=dict(..., features=DevStrat_4_9.sma_features(DevStrat_4_9.sma_periods)))
+        """
+        return {'sma_{}'.format(period): dict(type='sma', period=period) for period in periods}
+
+    def set_sma_datalines(self, periods):
+        """
+        Adds `sma_<period>` data lines; ones precomputed by dataset are used as is.
+        """
+        aliases = self.data.getlinealiases()
+        for period in periods:
+            name = 'sma_{}'.format(period)
+            if name not in aliases:
+                setattr(self.data, name, btind.SimpleMovingAverage(self.datas[0], period=period))
+
 
 class DevStrat_4_8(DevStrat_4_7):
     """
@@ -531,6 +551,9 @@ class DevStrat_4_9(DevStrat_4_7):
 
     reward_scale = 1  # reward multiplicator, touchy!
 
+    # SMA data lines periods, see `sma_features()`:
+    sma_periods = (4, 8, 16, 32, 64, 128, 256)
+
     params = dict(
         # Note: fake `Width` dimension to use 2d conv etc.:
         state_shape=
@@ -584,13 +607,7 @@ class DevStrat_4_9(DevStrat_4_7):
     )
 
     def set_datalines(self):
-        self.data.sma_4 = btind.SimpleMovingAverage(self.datas[0], period=4)
-        self.data.sma_8 = btind.SimpleMovingAverage(self.datas[0], period=8)
-        self.data.sma_16 = btind.SimpleMovingAverage(self.datas[0], period=16)
-        self.data.sma_32 = btind.SimpleMovingAverage(self.datas[0], period=32)
-        self.data.sma_64 = btind.SimpleMovingAverage(self.datas[0], period=64)
-        self.data.sma_128 = btind.SimpleMovingAverage(self.datas[0], period=128)
-        self.data.sma_256 = btind.SimpleMovingAverage(self.datas[0], period=256)
+        self.set_sma_datalines(self.sma_periods)
 
         self.data.dim_sma = btind.SimpleMovingAverage(
             self.datas[0],
@@ -728,6 +745,9 @@ class DevStrat_4_11(DevStrat_4_10):
 
     reward_scale = 1  # reward multiplicator
 
+    # SMA data lines periods, see `sma_features()`:
+    sma_periods = (16, 32, 64, 128, 256)
+
     state_ext_scale = np.linspace(3e3, 1e3, num=5)
 
     params = dict(
@@ -783,11 +803,7 @@ class DevStrat_4_11(DevStrat_4_10):
     )
 
     def set_datalines(self):
-        self.data.sma_16 = btind.SimpleMovingAverage(self.datas[0], period=16)
-        self.data.sma_32 = btind.SimpleMovingAverage(self.datas[0], period=32)
-        self.data.sma_64 = btind.SimpleMovingAverage(self.datas[0], period=64)
-        self.data.sma_128 = btind.SimpleMovingAverage(self.datas[0], period=128)
-        self.data.sma_256 = btind.SimpleMovingAverage(self.datas[0], period=256)
+        self.set_sma_datalines(self.sma_periods)
 
         self.data.dim_sma = btind.SimpleMovingAverage(
             self.datas[0],
@@ -853,6 +869,9 @@ class DevStrat_4_12(DevStrat_4_11):
 
     reward_scale = 1  # reward multiplicator
 
+    # SMA data lines periods, see `sma_features()`:
+    sma_periods = (8, 16, 32, 64, 128, 256)
+
     state_ext_scale = np.linspace(3e3, 1e3, num=6)
 
     params = dict(
@@ -908,12 +927,7 @@ class DevStrat_4_12(DevStrat_4_11):
     )
 
     def set_datalines(self):
-        self.data.sma_8 = btind.SimpleMovingAverage(self.datas[0], period=8)
-        self.data.sma_16 = btind.SimpleMovingAverage(self.datas[0], period=16)
-        self.data.sma_32 = btind.SimpleMovingAverage(self.datas[0], period=32)
-        self.data.sma_64 = btind.SimpleMovingAverage(self.datas[0], period=64)
-        self.data.sma_128 = btind.SimpleMovingAverage(self.datas[0], period=128)
-        self.data.sma_256 = btind.SimpleMovingAverage(self.datas[0], period=256)
+        self.set_sma_datalines(self.sma_periods)
 
         self.data.dim_sma = btind.SimpleMovingAverage(
             self.datas[0],
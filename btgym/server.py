@@ -18,9 +18,11 @@
 ###############################################################################
 
 import multiprocessing
+import threading
 import gc
 
 import itertools
+import collections
 import zmq
 import copy
 
@@ -31,6 +33,7 @@ from datetime import timedelta
 import backtrader as bt
 from .datafeed import DataSampleConfig, EnvResetConfig
 from .strategy.observers import NormPnL, Position, Reward
+from .protocol import state_layout, decode_step_request, encode_step_response
 
 ###################### BT Server in-episode communocation method ##############
 
@@ -68,6 +71,20 @@ class _BTgymAnalyzer(bt.Analyzer):
 
         self.info_list = []
 
+        # Binary step protocol: observation layout is set by first step of episode:
+        self.state_layout = None
+        self.binary_reply = False
+
+        # In-process channel passes response by reference, it needs no encoding:
+        self.in_process = getattr(self.socket, 'in_process', False)
+
+    def _recv(self):
+        """
+        Receives either binary step request or pickled message.
+        """
+        self.message, self.binary_reply = decode_step_request(self.socket.recv_multipart())
+        return self.message
+
     def prenext(self):
         pass
 
@@ -111,8 +128,15 @@ class _BTgymAnalyzer(bt.Analyzer):
 
             reward = self.strategy.get_reward()
 
-            # Halt and wait to receive message from outer world:
-            self.message = self.socket.recv_pyobj()
+            # Halt and wait to receive message from outer world,
+            # first step of episode answers combined reset request, if any:
+            if self.strategy.env._reset_request is not None:
+                self.message = {'action': self.strategy.env._reset_request['action']}
+                self.strategy.env._reset_request = None
+
+            else:
+                self._recv()
+
             msg = 'COMM recieved: {}'.format(self.message)
             self.log.debug(msg)
 
@@ -133,6 +157,12 @@ class _BTgymAnalyzer(bt.Analyzer):
                     self.early_stop()
                     return None
 
+                # New episode requested, reply goes with its first step:
+                elif self.message['ctrl'] == '_reset_step':
+                    self.strategy.env._next_request = self.message
+                    self.early_stop()
+                    return None
+
                 elif self.message['ctrl'] == '_get_data':
                     self.socket.send_pyobj(self.get_current_trial())
 
@@ -147,7 +177,7 @@ class _BTgymAnalyzer(bt.Analyzer):
                     self.socket.send_pyobj(message)
 
                 # Halt again:
-                self.message = self.socket.recv_pyobj()
+                self._recv()
                 msg = 'COMM recieved: {}'.format(self.message)
                 self.log.debug(msg)
 
@@ -163,7 +193,17 @@ class _BTgymAnalyzer(bt.Analyzer):
             # Send response as <o, r, d, i> tuple (Gym convention),
             # opt to send entire info_list or just latest part:
             info = [self.info_list[-1]]
-            self.socket.send_pyobj((state, reward, is_done, info))
+            if self.state_layout is None:
+                self.state_layout = state_layout(state)
+
+            if self.binary_reply and not self.in_process:
+                self.socket.send_multipart(
+                    encode_step_response(self.state_layout, state, reward, is_done, info),
+                    copy=False
+                )
+
+            else:
+                self.socket.send_pyobj((state, reward, is_done, info))
 
             # Back up step information for rendering.
             # It pays when using skip-frames: will'll get future state otherwise.
@@ -194,6 +234,8 @@ class BTgymServer(multiprocessing.Process):
 
         dict(action=<control action, type=str>,), where control action is:
         '_reset' - rewinds backtrader engine and runs new episode;
+        '_reset_step' - same as above, but reply is deferred: it is first step response of new episode,
+                        see `BTgymEnv.reset()`; accepted within episode as well;
         '_getstat' - retrieve episode results and statistics;
         '_stop' - server shut-down.
 
@@ -229,6 +271,9 @@ class BTgymServer(multiprocessing.Process):
         connect_timeout=90,
         log_level=None,
         task=0,
+        channel=None,
+        episode_gc=True,
+        prepare_episodes=False,
     ):
         """
 
@@ -236,9 +281,15 @@ class BTgymServer(multiprocessing.Process):
             cerebro:                backtrader.cerebro engine class.
             render:                 render class
             network_address:        environmnet communication, str
-            data_network_address:   data communication, str
+            data_network_address:   data communication, str or list of str; several addresses are taken as
+                                    data servers holding time-range shards of data domain, see `get_trial()`
             connect_timeout:        seconds, int
             log_level:              int, logbook.level
+            channel:                btgym.protocol.InProcessChannel to serve environment through instead of binding
+                                    socket at `network_address`, see `start_in_process()`
+            episode_gc:             bool, run garbage collection pass after every episode
+            prepare_episodes:       bool, prepare next episode in background while current one runs,
+                                    see `_start_episode_preparation()`; def. is False
         """
 
         super(BTgymServer, self).__init__()
@@ -249,7 +300,12 @@ class BTgymServer(multiprocessing.Process):
         self.cerebro = cerebro
         self.network_address = network_address
         self.render = render
-        self.data_network_address = data_network_address
+        if isinstance(data_network_address, str):
+            data_network_address = [data_network_address]
+
+        self.data_network_addresses = list(data_network_address)
+        self.data_network_address = self.data_network_addresses[0]
+        self.data_shard_weights = None  # [train, test] sampling weights reported by every data server
         self.connect_timeout = connect_timeout # server connection timeout in seconds.
         self.connect_timeout_step = 0.01
 
@@ -257,6 +313,87 @@ class BTgymServer(multiprocessing.Process):
         self.trial_stat = None
         self.dataset_stat = None
 
+        self.channel = channel
+        self.context = None
+        self.thread = None
+
+        self.episode_gc = episode_gc
+        self.prepare_episodes = prepare_episodes
+        self.prepared_episode = None
+        self.spare_trial = None  # (trial_config, trial) fetched in background but not used yet
+        self.data_lock = None
+
+    def start_in_process(self):
+        """
+        Runs server within calling process as background thread served via `channel`: no process is spawn, no socket
+        is used and no pickling is done. Environment and server thread take turns, so per-step cost
+        is reduced to strategy computations. Intended for single environment debugging and small-scale training.
+        """
+        self.thread = threading.Thread(target=self.run, name='BTgymServer_{}'.format(self.task), daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        if self.thread is not None:
+            return self.thread.is_alive()
+
+        return super(BTgymServer, self).is_alive()
+
+    def _release(self):
+        """
+        Releases environment communication channel.
+        """
+        self.socket.close()
+        if self.context is not None:
+            self.context.destroy()
+
+    def _make_cerebro_template(self, aux_observers):
+        """
+        Prepares engine all episodes are started from: copy of `cerebro` with auxiliary observers
+        and communication analyzer added and broker set up. Done once per server run.
+        """
+        template = copy.deepcopy(self.cerebro)
+
+        # Add auxillary observers, if not already:
+        for aux in aux_observers:
+            is_added = False
+            for observer in template.observers:
+                if aux in observer:
+                    is_added = True
+            if not is_added:
+                template.addobserver(aux)
+
+        # Add communication utility:
+        template.addanalyzer(_BTgymAnalyzer, _name='_env_analyzer',)
+
+        # Set nice broker cash plotting:
+        template.broker.set_shortcash(False)
+
+        return template
+
+    @staticmethod
+    def _make_episode_cerebro(template):
+        """
+        Makes episode engine from template without deep copying it: strategy, observers and analyzers
+        specifications are shared, data feeds and strategy params are new. Broker is shallow copy, its
+        cash, orders and positions get reinitialized by `cerebro.run()`; params and commission schemes are not,
+        so those get copied as strategy can change them, e.g. by `broker.set_cash()`.
+        """
+        cerebro = copy.copy(template)
+        cerebro.datas = list()
+        cerebro.datasbyname = collections.OrderedDict()
+        cerebro.feeds = list()
+        cerebro.stores = list(template.stores)
+        cerebro._dataid = itertools.count(1)
+        cerebro.strats = [
+            [(strategy, args, dict(kwargs)) for strategy, args, kwargs in strats] for strats in template.strats
+        ]
+        cerebro._broker = copy.copy(template._broker)
+        cerebro._broker.params = cerebro._broker.p = copy.deepcopy(template._broker.p)
+        cerebro._broker.comminfo = copy.deepcopy(template._broker.comminfo)
+        cerebro._broker.cerebro = cerebro
+
+        return cerebro
+
     @staticmethod
     def _comm_with_timeout(socket, message):
         """
@@ -300,11 +437,15 @@ class BTgymServer(multiprocessing.Process):
 
         return response
 
-    def get_dataset_stat(self):
-        data_server_response = self._comm_with_timeout(
-            socket=self.data_socket,
-            message={'ctrl': '_get_info'}
-        )
+    def get_dataset_stat(self, socket=None):
+        if socket is None:
+            socket = self.data_socket
+
+        with self.data_lock:
+            data_server_response = self._comm_with_timeout(
+                socket=socket,
+                message={'ctrl': '_get_info'}
+            )
         if data_server_response['status'] in 'ok':
             self.log.debug('Data_server @{} responded with dataset statistic in about {} seconds.'.
                            format(self.data_network_address, data_server_response['time']))
@@ -317,35 +458,91 @@ class BTgymServer(multiprocessing.Process):
             self.log.error(msg)
             raise ConnectionError(msg)
 
-    def get_trial(self, **reset_kwargs):
+    def _choose_data_shard(self, sample_config):
+        """
+        Picks data server to request sample from: shard is chosen with probability proportional to number of valid
+        sample starts it holds, so domain sampling distribution is preserved.
+        For beta-distributed train sampling shard is picked by beta-distributed position over valid starts of entire
+        domain and sampled uniformly within, i.e. distribution is kept up to piecewise-uniform approximation.
+
+        Args:
+            sample_config:  sampling parameters configuration dictionary
+
+        Returns:
+            shard number, sampling parameters configuration to pass to shard data server
+        """
+        if len(self.data_sockets) == 1:
+            return 0, sample_config
+
+        if self.data_shard_weights is None or None in self.data_shard_weights:
+            self.data_shard_weights = [
+                self.get_dataset_stat(socket).get('sample_weights') for socket in self.data_sockets
+            ]
+
+        if None in self.data_shard_weights:
+            # Some shard is not ready yet, sampling waits for it anyway:
+            return random.randrange(len(self.data_sockets)), sample_config
+
+        sample_type = int(sample_config.get('sample_type', 0))
+        weights = [shard_weights[sample_type] for shard_weights in self.data_shard_weights]
+        b_alpha = sample_config.get('b_alpha', 1)
+        b_beta = sample_config.get('b_beta', 1)
+
+        if sample_type == 0 and (b_alpha != 1 or b_beta != 1):
+            position = random.betavariate(b_alpha, b_beta) * sum(weights)
+            sample_config = dict(sample_config, b_alpha=1, b_beta=1)
+
+        else:
+            position = random.random() * sum(weights)
+
+        for shard, weight in enumerate(weights):
+            if position < weight:
+                break
+
+            position -= weight
+
+        return shard, sample_config
+
+    def get_trial(self, wait_for_data=True, **reset_kwargs):
         """
 
         Args:
+            wait_for_data:  bool, if True - wait for domain dataset to get ready, return immediately otherwise;
             reset_kwargs:   dictionary of args to pass to parent data iterator
 
         Returns:
-            trial_sample, trial_stat, dataset_stat
+            trial_sample, trial_stat, dataset_stat, origin;
+            None, if dataset is not ready and `wait_for_data` is False.
         """
         wait = 0
         while True:
             # Get new data subset:
-            data_server_response = self._comm_with_timeout(
-                socket=self.data_socket,
-                message={'ctrl': '_get_data', 'kwargs': reset_kwargs}
-            )
+            with self.data_lock:
+                shard, sample_config = self._choose_data_shard(reset_kwargs)
+                data_server_response = self._comm_with_timeout(
+                    socket=self.data_sockets[shard],
+                    message={'ctrl': '_get_data', 'kwargs': sample_config}
+                )
             if data_server_response['status'] in 'ok':
                 self.log.debug('Data_server @{} responded in ~{:1.6f} seconds.'.
-                               format(self.data_network_address, data_server_response['time']))
+                               format(self.data_network_addresses[shard], data_server_response['time']))
 
             else:
                 msg = 'BtgymServer_sampling_attempt: data_server @{} unreachable with status: <{}>.'. \
-                    format(self.data_network_address, data_server_response['status'])
+                    format(self.data_network_addresses[shard], data_server_response['status'])
                 self.log.error(msg)
                 raise ConnectionError(msg)
 
+            if len(self.data_sockets) > 1:
+                # Keep shard weights up to date, not ready shard makes all get requested again:
+                self.data_shard_weights[shard] = data_server_response['message'].get('sample_weights')
+
             # Ready or not?
             try:
                 assert 'Dataset not ready' in data_server_response['message']['ctrl']
+                if not wait_for_data:
+                    return None
+
                 if wait <= self.wait_for_data_reset:
                     pause = random.random() * 2
                     time.sleep(pause)
@@ -355,19 +552,19 @@ class BTgymServer(multiprocessing.Process):
                     )
                 else:
                     data_server_response = self._comm_with_timeout(
-                        socket=self.data_socket,
+                        socket=self.data_sockets[shard],
                         message={'ctrl': '_stop'}
                     )
-                    self.socket.close()
-                    self.context.destroy()
+                    self._release()
                     raise RuntimeError('Failed to assert Domain dataset is ready. Exiting.')
 
             except (AssertionError, KeyError) as e:
                 break
         # Get trial instance:
         trial_sample = data_server_response['message']['sample']
-        trial_stat = trial_sample.describe()
+        # Reset first: prepares range statistic trial and its episodes are described with:
         trial_sample.reset()
+        trial_stat = trial_sample.describe()
         dataset_stat = data_server_response['message']['stat']
         origin = data_server_response['message']['origin']
 
@@ -395,6 +592,138 @@ class BTgymServer(multiprocessing.Process):
 
         return message
 
+    def _fetch_trial(self, sample_config, wait_for_data=True):
+        """
+        Gets new trial as `get_trial()` does.
+
+        Returns:
+            trial_sample, trial_stat, dataset_stat;
+            None, if dataset is not ready and `wait_for_data` is False.
+        """
+        if self.spare_trial is not None and self.spare_trial[0] == sample_config['trial_config']:
+            # Trial fetched in background for episode not run goes first:
+            trial = self.spare_trial[-1]
+            self.spare_trial = None
+            self.log.info('Got spare Trial: <{}>'.format(trial[0].filename))
+            return trial
+
+        self.log.info(
+            'Requesting new Trial sample with args: {}'.format(sample_config['trial_config'])
+        )
+        trial = self.get_trial(wait_for_data=wait_for_data, **sample_config['trial_config'])
+        if trial is None:
+            return None
+
+        trial_sample, trial_stat, dataset_stat, origin = trial
+
+        if origin in 'data_server':
+            trial_sample.set_logger(self.log_level, self.task)
+
+        self.log.info('Got new Trial: <{}>'.format(trial_sample.filename))
+
+        return trial_sample, trial_stat, dataset_stat
+
+    def _sample_episode(self, trial_sample, sample_config):
+        """
+        Samples episode from trial, describes it and converts to backtrader data feeds.
+
+        Returns:
+            episode_sample, episode_stat, list of (name, data feed) pairs, base timeframe feed goes first
+            with None name; coarse timeframes, if any, go as extra feeds, accessible by name,
+            e.g. `getdatabyname('60m')`.
+        """
+        self.log.info(
+            'Requesting episode from <{}> with args: {}'.
+                format(trial_sample.filename, sample_config['episode_config'])
+        )
+        episode_sample = trial_sample.sample(**sample_config['episode_config'])
+        self.log.info('Got new Episode: <{}>'.format(episode_sample.filename))
+
+        feeds = [(None, episode_sample.to_btfeed())] + list(episode_sample.to_pyramid_btfeeds().items())
+
+        return episode_sample, episode_sample.describe(), feeds
+
+    def _prepare_episode(self, job):
+        """
+        Background thread body: gets new trial if configuration requests one, samples episode and
+        prepares its statistic and data feeds. Current trial is reused as copy with its own random
+        generator, so it is left untouched until prepared episode is taken.
+        """
+        try:
+            sample_config = job['sample_config']
+            if sample_config['trial_config']['get_new']:
+                trial = self._fetch_trial(sample_config, wait_for_data=False)
+                if trial is None:
+                    return
+
+            else:
+                trial_sample = copy.copy(self.trial_sample)
+                random_state = self.trial_sample.get_random_state()
+                trial_sample.set_random_seed()
+                trial_sample.set_random_state(random_state)
+                trial = (trial_sample, self.trial_stat, self.dataset_stat)
+
+            job['result'] = trial, self._sample_episode(trial[0], sample_config)
+
+        except Exception as e:
+            # Episode will be prepared on `_reset` then:
+            self.log.warning('Failed to prepare next episode in background: {}'.format(e))
+
+    def _start_episode_preparation(self, sample_config, data_master=False):
+        """
+        Starts preparing next episode while current one runs, assuming next `_reset` comes with same kwargs.
+        Backtrader engine runs in this thread, so preparation proceeds while it waits for agent actions.
+
+        New trial is fetched in advance by data master only: data slave gets trial its master runs,
+        so one fetched now would be one its master is done with by next `_reset`.
+        """
+        if sample_config['trial_config']['get_new'] and not data_master:
+            return
+
+        job = dict(sample_config=sample_config, result=None)
+        job['thread'] = threading.Thread(
+            target=self._prepare_episode,
+            args=(job,),
+            name='BTgymServer_{}_prepare'.format(self.task),
+            daemon=True,
+        )
+        job['thread'].start()
+        self.prepared_episode = job
+
+    def _take_prepared_episode(self, sample_config):
+        """
+        Returns:
+            (trial_sample, trial_stat, dataset_stat), (episode_sample, episode_stat, feeds) prepared in background
+            for given sampling configuration; None, if nothing was prepared or configuration differs.
+
+        Note:
+            New trial prepared for other configuration is kept as spare one and taken by next trial request
+            with same trial configuration, so iterating data domains do not skip it.
+        """
+        job = self.prepared_episode
+        self.prepared_episode = None
+        if job is None:
+            return None
+
+        job['thread'].join()
+        if job['result'] is None or job['sample_config'] == sample_config:
+            return job['result']
+
+        if job['sample_config']['trial_config']['get_new']:
+            self.spare_trial = job['sample_config']['trial_config'], job['result'][0]
+
+        return None
+
+    def _drop_prepared_episode(self):
+        """
+        Discards episode and trial prepared in background, if any.
+        """
+        if self.prepared_episode is not None:
+            self.prepared_episode['thread'].join()
+            self.prepared_episode = None
+
+        self.spare_trial = None
+
     def run(self):
         """
         Server process runtime body. This method is invoked by env._start_server().
@@ -402,7 +731,10 @@ class BTgymServer(multiprocessing.Process):
         # Logging:
         from logbook import Logger, StreamHandler, WARNING
         import sys
-        StreamHandler(sys.stdout).push_application()
+        if self.channel is None:
+            # In-process server shares environment logging setup:
+            StreamHandler(sys.stdout).push_application()
+
         if self.log_level is None:
             self.log_level = WARNING
         self.log = Logger('BTgymServer_{}'.format(self.task), level=self.log_level)
@@ -410,6 +742,9 @@ class BTgymServer(multiprocessing.Process):
         self.process = multiprocessing.current_process()
         self.log.info('PID: {}'.format(self.process.pid))
 
+        # Data sockets are shared with episode preparation thread:
+        self.data_lock = threading.RLock()
+
         # Runtime Housekeeping:
         cerebro = None
         episode_result = dict()
@@ -423,34 +758,46 @@ class BTgymServer(multiprocessing.Process):
         # Set up a comm. channel for server as ZMQ socket
         # to carry both service and data signal
         # !! Reminder: Since we use REQ/REP - messages do go in pairs !!
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
-        self.socket.setsockopt(zmq.RCVTIMEO, -1)
-        self.socket.setsockopt(zmq.SNDTIMEO, connect_timeout * 1000)
-        self.socket.bind(self.network_address)
+        if self.channel is not None:
+            # In-process mode, same REQ/REP discipline:
+            self.socket = self.channel.server
+
+        else:
+            self.context = zmq.Context()
+            self.socket = self.context.socket(zmq.REP)
+            self.socket.setsockopt(zmq.RCVTIMEO, -1)
+            self.socket.setsockopt(zmq.SNDTIMEO, connect_timeout * 1000)
+            self.socket.bind(self.network_address)
 
         self.data_context = zmq.Context()
-        self.data_socket = self.data_context.socket(zmq.REQ)
-        self.data_socket.setsockopt(zmq.RCVTIMEO, connect_timeout * 1000)
-        self.data_socket.setsockopt(zmq.SNDTIMEO, connect_timeout * 1000)
-        self.data_socket.connect(self.data_network_address)
+        self.data_sockets = []
+        for data_network_address in self.data_network_addresses:
+            data_socket = self.data_context.socket(zmq.REQ)
+            data_socket.setsockopt(zmq.RCVTIMEO, connect_timeout * 1000)
+            data_socket.setsockopt(zmq.SNDTIMEO, connect_timeout * 1000)
+            data_socket.connect(data_network_address)
 
-        # Check connection:
-        self.log.debug('Pinging data_server at: {} ...'.format(self.data_network_address))
+            # Check connection:
+            self.log.debug('Pinging data_server at: {} ...'.format(data_network_address))
 
-        data_server_response = self._comm_with_timeout(
-            socket=self.data_socket,
-            message={'ctrl': 'ping!'}
-        )
-        if data_server_response['status'] in 'ok':
-            self.log.debug('Data_server seems ready with response: <{}>'.
-                          format(data_server_response['message']))
+            data_server_response = self._comm_with_timeout(
+                socket=data_socket,
+                message={'ctrl': 'ping!'}
+            )
+            if data_server_response['status'] in 'ok':
+                self.log.debug('Data_server seems ready with response: <{}>'.
+                              format(data_server_response['message']))
 
-        else:
-            msg = 'Data_server unreachable with status: <{}>.'.\
-                format(data_server_response['status'])
-            self.log.error(msg)
-            raise ConnectionError(msg)
+            else:
+                msg = 'Data_server unreachable with status: <{}>.'.\
+                    format(data_server_response['status'])
+                self.log.error(msg)
+                raise ConnectionError(msg)
+
+            self.data_sockets.append(data_socket)
+
+        # Dataset statistic and control requests go to first one:
+        self.data_socket = self.data_sockets[0]
 
         # Init renderer:
         self.render.initialize_pyplot()
@@ -463,11 +810,22 @@ class BTgymServer(multiprocessing.Process):
         else:
             aux_obsrevers = [bt.observers.DrawDown]
 
+        cerebro_template = self._make_cerebro_template(aux_obsrevers)
+
+        # Combined reset request received while episode was running:
+        next_request = None
+
         # Server 'Control Mode' loop:
         for episode_number in itertools.count(0):
             while True:
                 # Stuck here until '_reset' or '_stop':
-                service_input = self.socket.recv_pyobj()
+                if next_request is not None:
+                    service_input = next_request
+                    next_request = None
+
+                else:
+                    # Stray binary step requests get decoded and answered as any other non-control input:
+                    service_input, _ = decode_step_request(self.socket.recv_multipart())
                 msg = 'Control mode: received <{}>'.format(service_input)
                 self.log.debug(msg)
 
@@ -478,9 +836,12 @@ class BTgymServer(multiprocessing.Process):
                         # send last run statistic, release comm channel and exit:
                         message = 'Exiting.'
                         self.log.info(message)
+                        if self.prepared_episode is not None:
+                            # Let it finish talking to data server:
+                            self.prepared_episode['thread'].join()
+
                         self.socket.send_pyobj(message)
-                        self.socket.close()
-                        self.context.destroy()
+                        self._release()
                         return None
 
                     # Start episode:
@@ -490,6 +851,20 @@ class BTgymServer(multiprocessing.Process):
                         self.socket.send_pyobj(message)  # pairs '_reset'
                         break
 
+                    # Start episode, reply with first step:
+                    elif service_input['ctrl'] == '_reset_step':
+                        self.log.debug(
+                            'Preparing new episode with kwargs: {}, first step to follow'.format(service_input['kwargs'])
+                        )
+                        break
+
+                    # Data is being reset, anything prepared from old one is void:
+                    elif service_input['ctrl'] == '_reset_data':
+                        self._drop_prepared_episode()
+                        message = {'ctrl': 'Prepared data discarded.'}
+                        self.log.debug(message['ctrl'])
+                        self.socket.send_pyobj(message)
+
                     # Retrieve statistic:
                     elif service_input['ctrl'] == '_getstat':
                         self.socket.send_pyobj(episode_result)
@@ -527,27 +902,24 @@ class BTgymServer(multiprocessing.Process):
 
             # Got '_reset' signal -> prepare Cerebro subclass and run episode:
             start_time = time.time()
-            cerebro = copy.deepcopy(self.cerebro)
+            cerebro = self._make_episode_cerebro(cerebro_template)
             cerebro._socket = self.socket
             cerebro._log = self.log
             cerebro._render = self.render
 
+            # Request to be answered by first episode step and one to start next episode with:
+            if service_input['ctrl'] == '_reset_step':
+                cerebro._reset_request = service_input
+
+            else:
+                cerebro._reset_request = None
+
+            cerebro._next_request = None
+
             # Pass methods for serving capabilities:
             cerebro._get_data = self.get_trial_message
             cerebro._get_info = self.get_dataset_stat
 
-            # Add auxillary observers, if not already:
-            for aux in aux_obsrevers:
-                is_added = False
-                for observer in cerebro.observers:
-                    if aux in observer:
-                        is_added = True
-                if not is_added:
-                    cerebro.addobserver(aux)
-
-            # Add communication utility:
-            cerebro.addanalyzer(_BTgymAnalyzer, _name='_env_analyzer',)
-
             # Data preparation:
             # Parse args we got with _reset call:
             sample_config = dict(
@@ -563,48 +935,64 @@ class BTgymServer(multiprocessing.Process):
                         '_reset <{}> kwarg not found, using default values: {}'.format(key, config)
                     )
 
-            # Get new Trial from data_server if requested,
-            # despite bult-in new/reuse data object sampling option, perform checks here to avoid
-            # redundant traffic:
-            if sample_config['trial_config']['get_new'] or self.trial_sample is None:
-                self.log.info(
-                    'Requesting new Trial sample with args: {}'.format(sample_config['trial_config'])
-                )
-                self.trial_sample, self.trial_stat, self.dataset_stat, origin =\
-                    self.get_trial(**sample_config['trial_config'])
+            # Episode prepared while previous one was running is taken if sampling configuration is same:
+            prepared = self._take_prepared_episode(sample_config)
+            if prepared is not None:
+                (self.trial_sample, self.trial_stat, self.dataset_stat), episode_data = prepared
+                self.log.info('Got prepared Episode: <{}>'.format(episode_data[0].filename))
 
-                if origin in 'data_server':
-                    self.trial_sample.set_logger(self.log_level, self.task)
+            else:
+                # Get new Trial from data_server if requested,
+                # despite bult-in new/reuse data object sampling option, perform checks here to avoid
+                # redundant traffic:
+                if sample_config['trial_config']['get_new'] or self.trial_sample is None:
+                    trial = self._fetch_trial(
+                        sample_config,
+                        wait_for_data=not service_input.get('data_master', False),
+                    )
+                    if trial is None:
+                        # Data master environment resets dataset itself:
+                        message = {'ctrl': 'Dataset not ready, waiting for control key <_reset_data>',
+                                   'dataset_is_ready': False}
+                        self.log.debug('Sent: ' + str(message))
+                        self.socket.send_pyobj(message)  # pairs '_reset_step'
+                        continue
 
-                self.log.info('Got new Trial: <{}>'.format(self.trial_sample.filename))
+                    self.trial_sample, self.trial_stat, self.dataset_stat = trial
 
-            else:
-                self.log.info('Reusing Trial <{}>'.format(self.trial_sample.filename))
+                else:
+                    self.log.info('Reusing Trial <{}>'.format(self.trial_sample.filename))
 
-            # Get episode:
-            self.log.info(
-                'Requesting episode from <{}> with args: {}'.
-                    format(self.trial_sample.filename, sample_config['episode_config'])
-            )
-            episode_sample = self.trial_sample.sample(**sample_config['episode_config'])
-            self.log.info('Got new Episode: <{}>'.format(episode_sample.filename))
+                # Get episode:
+                episode_data = self._sample_episode(self.trial_sample, sample_config)
+
+            episode_sample, episode_stat, feeds = episode_data
 
             # Get episode data statistic and pass it to strategy params:
             cerebro.strats[0][0][2]['trial_stat'] = self.trial_stat
             cerebro.strats[0][0][2]['trial_metadata'] = self.trial_sample.metadata
             cerebro.strats[0][0][2]['dataset_stat'] = self.dataset_stat
-            cerebro.strats[0][0][2]['episode_stat'] = episode_sample.describe()
+            cerebro.strats[0][0][2]['episode_stat'] = episode_stat
             cerebro.strats[0][0][2]['metadata'] = episode_sample.metadata
 
-            # Set nice broker cash plotting:
-            cerebro.broker.set_shortcash(False)
+            # Add data to engine:
+            for name, btfeed in feeds:
+                cerebro.adddata(btfeed, name=name)
 
-            # Convert and add data to engine:
-            cerebro.adddata(episode_sample.to_btfeed())
+            if self.prepare_episodes:
+                self._start_episode_preparation(sample_config, data_master=service_input.get('data_master', False))
 
             # Finally:
             episode = cerebro.run(stdstats=True, preload=False, oldbuysell=True)[0]
 
+            if cerebro._reset_request is not None:
+                # Episode ended before its first step:
+                message = {'ctrl': 'Episode is over before first step. Hint: check data sampling params'}
+                self.log.warning(message['ctrl'])
+                self.socket.send_pyobj(message)  # pairs '_reset_step'
+
+            next_request = cerebro._next_request
+
             # Update episode rendering:
             _ = self.render.render('just_render', cerebro=cerebro)
             _ = None
@@ -623,7 +1011,8 @@ class BTgymServer(multiprocessing.Process):
             for name in analyzers_list:
                 episode_result[name] = episode.analyzers.getbyname(name).get_analysis()
 
-            gc.collect()
+            if self.episode_gc:
+                gc.collect()
 
         # Just in case -- we actually shouldn't get there except by some error:
         return None
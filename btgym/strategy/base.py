@@ -346,17 +346,17 @@ class BTgymBaseStrategy(bt.Strategy):
                 n - time-embedding length  == state_shape[0] == <set by user>.
 
         Note:
-            `self.raw_state` is used to render environment `human` mode and should not be modified.
+            `self.raw_state` is used to render environment `human` mode and should not be modified;
+            it is composed directly in `state_shape['raw_state']` space dtype (float32 by default).
 
         """
-        self.raw_state = np.row_stack(
-            (
-                np.frombuffer(self.data.open.get(size=self.time_dim)),
-                np.frombuffer(self.data.high.get(size=self.time_dim)),
-                np.frombuffer(self.data.low.get(size=self.time_dim)),
-                np.frombuffer(self.data.close.get(size=self.time_dim)),
-            )
-        ).T
+        lines = [
+            np.frombuffer(line.get(size=self.time_dim))
+            for line in (self.data.open, self.data.high, self.data.low, self.data.close)
+        ]
+        self.raw_state = np.empty((lines[0].shape[0], 4), dtype=self.p.state_shape['raw_state'].dtype)
+        for i, values in enumerate(lines):
+            self.raw_state[:, i] = values
 
         return self.raw_state
 
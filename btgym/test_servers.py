@@ -0,0 +1,444 @@
+
+import unittest
+import time
+import copy
+import numpy as np
+import zmq
+from .datafeed import BTgymDataset, BTgymSequentialDataDomain
+from .dataserver import BTgymPreSampler, BTgymDataFeedServer
+from .protocol import make_address, state_layout, encode_message, encode_step_request, decode_step_request
+from .protocol import encode_step_response, decode_step_response
+from .envs.backtrader import BTgymEnv
+from .envs.vector import BTgymVecEnv
+from .strategy.base import BTgymBaseStrategy
+
+
+filename = '../examples/data/DAT_ASCII_EURUSD_M1_201703.csv'
+
+trial_params = dict(
+    start_weekdays={0, 1, 2, 3, 4, 5, 6},
+    sample_duration={'days': 4, 'hours': 0, 'minutes': 0},
+    start_00=False,
+    time_gap={'days': 3, 'hours': 0},
+    test_period={'days': 1, 'hours': 0, 'minutes': 0},
+)
+
+episode_params = dict(
+    start_weekdays={0, 1, 2, 3, 4, 5, 6},
+    sample_duration={'days': 0, 'hours': 12, 'minutes': 0},
+    start_00=False,
+    time_gap={'days': 0, 'hours': 6},
+)
+
+log_level = 13
+
+
+class BrokerChangingStrategy(BTgymBaseStrategy):
+    """
+    Changes broker cash and commission in course of episode.
+    """
+    def next(self):
+        super(BrokerChangingStrategy, self).next()
+        if self.iteration == 5:
+            self.broker.set_cash(self.broker.get_cash() * 2)
+            self.broker.setcommission(commission=0.01)
+
+
+class TrialInfoStrategy(BTgymBaseStrategy):
+    """
+    Reports number of trial running episode comes from.
+    """
+    def __init__(self, trial_metadata=None, **kwargs):
+        super(TrialInfoStrategy, self).__init__(**kwargs)
+        self.trial_num = trial_metadata['sample_num']
+
+    def get_info(self):
+        return dict(super(TrialInfoStrategy, self).get_info(), trial_num=self.trial_num)
+
+
+def make_env(**kwargs):
+    params = dict(
+        filename=filename,
+        episode_duration={'days': 1, 'hours': 0, 'minutes': 0},
+        render_enabled=False,
+        verbose=0,
+    )
+    params.update(kwargs)
+    return BTgymEnv(**params)
+
+
+def make_sequential_domain():
+    return BTgymSequentialDataDomain(
+        filename=filename,
+        trial_params=copy.deepcopy(trial_params),
+        episode_params=copy.deepcopy(episode_params),
+        log_level=log_level,
+    )
+
+
+class ProtocolTest(unittest.TestCase):
+    """Testing environment <-> server messages encoding"""
+
+    def make_state(self):
+        return dict(
+            raw_state=np.random.randn(30, 4).astype(np.float32),
+            external=dict(
+                prices=np.random.randn(30, 1, 5),
+                counts=np.arange(6, dtype=np.int64).reshape(2, 3),
+            ),
+        )
+
+    def assertStatesEqual(self, state, decoded):
+        self.assertEqual(state_layout(state), state_layout(decoded))
+        for path, dtype, shape in state_layout(state):
+            array, decoded_array = state, decoded
+            for key in path:
+                array, decoded_array = array[key], decoded_array[key]
+
+            self.assertTrue(np.array_equal(array, decoded_array))
+
+    def test_step_response_round_trip(self):
+        """
+        Decoded step response should match encoded one: binary if state fits layout, pickled otherwise.
+        """
+        state = self.make_state()
+        layout = state_layout(state)
+        info = [dict(step=1, broker_value=100.0)]
+
+        other_states = [
+            # Layout mismatch, goes pickled:
+            dict(state, raw_state=np.zeros((10, 4), dtype=np.float32)),
+            dict(state, raw_state=np.zeros((30, 4))),
+            dict(raw_state=state['raw_state']),
+            'not a state',
+        ]
+        for layout_used, current_state in [(layout, state), (None, state)] + [(layout, s) for s in other_states]:
+            with self.subTest(layout=layout_used is not None, state=str(current_state)[:20]):
+                frames = encode_step_response(layout_used, current_state, 0.5, True, info)
+                self.assertEqual(len(frames) > 2, layout_used is not None and current_state is state)
+
+                # As received from socket:
+                frames = [bytes(frame) for frame in frames]
+                decoded_state, reward, is_done, decoded_info = decode_step_response(layout, frames)
+                self.assertEqual((reward, is_done, decoded_info), (0.5, True, info))
+
+                if isinstance(current_state, dict):
+                    self.assertStatesEqual(current_state, decoded_state)
+
+                else:
+                    self.assertEqual(current_state, decoded_state)
+
+        # Decoded arrays are writable copies unless views are asked for:
+        frames = [bytes(frame) for frame in encode_step_response(layout, state, 0.0, False, info)]
+        decoded_state = decode_step_response(layout, frames)[0]
+        decoded_state['raw_state'][0, 0] = 1.0
+        self.assertFalse(decode_step_response(layout, frames, copy=False)[0]['raw_state'].flags.writeable)
+
+    def test_socket_round_trip(self):
+        """
+        Step requests and responses sent via zmq socket should be same once received.
+        """
+        state = self.make_state()
+        layout = state_layout(state)
+        context = zmq.Context()
+        try:
+            sender = context.socket(zmq.PAIR)
+            sender.bind('inproc://protocol_test')
+            receiver = context.socket(zmq.PAIR)
+            receiver.connect('inproc://protocol_test')
+
+            sender.send_multipart(encode_step_request('buy'))
+            self.assertEqual(decode_step_request(receiver.recv_multipart()), ({'action': 'buy'}, True))
+
+            sender.send_multipart(encode_message({'ctrl': '_done'}))
+            self.assertEqual(decode_step_request(receiver.recv_multipart()), ({'ctrl': '_done'}, False))
+
+            for copy in [True, False]:
+                sender.send_multipart(encode_step_response(layout, state, -1.0, False, ['info']), copy=False)
+                decoded_state, reward, is_done, info = decode_step_response(
+                    layout,
+                    receiver.recv_multipart(copy=False),
+                    copy=copy,
+                )
+                self.assertStatesEqual(state, decoded_state)
+                self.assertEqual((reward, is_done, info), (-1.0, False, ['info']))
+
+            # Control mode message goes as single frame:
+            sender.send_pyobj({'ctrl': 'Reset with kwargs: {}'})
+            self.assertEqual(decode_step_response(layout, receiver.recv_multipart()), {'ctrl': 'Reset with kwargs: {}'})
+
+        finally:
+            context.destroy(linger=0)
+
+
+class DataServerTest(unittest.TestCase):
+    """Testing data server"""
+
+    def test_pre_sampler_order(self):
+        """
+        Pre-sampled trials should come in domain sampling order, reset should discard ones prepared.
+        """
+        domain = make_sequential_domain()
+        domain.reset()
+        reference = [domain.sample().data.index[0] for i in range(6)]
+
+        pre_sampler = BTgymPreSampler(make_sequential_domain(), size=3)
+        pre_sampler.reset()
+        pre_sampler.start()
+        try:
+            for i in range(10):
+                with self.subTest(reset=i):
+                    first_rows = []
+                    for j in range(len(reference)):
+                        # Alternating configurations should not reorder or skip trials:
+                        sample_config = dict(get_new=True, b_alpha=1 + j % 2)
+                        first_rows.append(pre_sampler.get(sample_config).data.index[0])
+                        # Let refilling thread race for dataset with ones sampled on demand:
+                        time.sleep(np.random.choice([0, 0.001, 0.01]))
+
+                    self.assertEqual(first_rows, reference)
+
+                    # Reset is expected to restart sequence and discard samples prepared:
+                    pre_sampler.reset()
+
+            # Sequential domain is sampled on demand only:
+            self.assertEqual(pre_sampler.size, 0)
+            self.assertEqual(sum(pre_sampler.stat()['ready'].values()), 0)
+
+        finally:
+            pre_sampler.stop()
+
+    def test_router_replies(self):
+        """
+        Concurrent data server should send every reply to client made request, whatever the order served in.
+        """
+        address = make_address('tcp://127.0.0.1:', 4890)
+        server = BTgymDataFeedServer(
+            dataset=BTgymDataset(filename=filename, test_period={'days': 5}, log_level=log_level),
+            network_address=address,
+            log_level=log_level,
+            num_workers=2,
+        )
+        server.start()
+        context = zmq.Context()
+        try:
+            clients = []
+            for i in range(3):
+                socket = context.socket(zmq.REQ)
+                socket.setsockopt(zmq.RCVTIMEO, 60 * 1000)
+                socket.connect(address)
+                clients.append(socket)
+
+            clients[0].send_pyobj({'ctrl': '_reset_data'})
+            self.assertIn('Reset', clients[0].recv_pyobj()['ctrl'])
+
+            for i in range(10):
+                # Train and test trials are requested concurrently with control request:
+                clients[0].send_pyobj({'ctrl': '_get_data', 'kwargs': dict(get_new=True, sample_type=0)})
+                clients[1].send_pyobj({'ctrl': '_get_data', 'kwargs': dict(get_new=True, sample_type=1)})
+                clients[2].send_pyobj({'ctrl': '_get_info'})
+
+                for socket in reversed(clients):
+                    message = socket.recv_pyobj()
+                    if socket is clients[2]:
+                        self.assertTrue(message['dataset_is_ready'])
+
+                    else:
+                        self.assertEqual(message['sample'].metadata['type'], clients.index(socket))
+
+            clients[0].send_pyobj({'ctrl': '_stop'})
+            clients[0].recv_pyobj()
+            server.join(timeout=60)
+            self.assertFalse(server.is_alive())
+
+        finally:
+            context.destroy(linger=0)
+            if server.is_alive():
+                server.terminate()
+
+
+class EnvTest(unittest.TestCase):
+    """Testing environment and server communication"""
+
+    def test_reset_retry(self):
+        """
+        Reset prior to reset_data() should get dataset status in reply, reset data and retry once;
+        following resets should take single round-trip.
+        """
+        env = make_env(port=5700, data_port=4900)
+        try:
+            responses = []
+            reset_step = env._reset_step
+
+            def recording_reset_step(kwargs):
+                responses.append(reset_step(kwargs))
+                return responses[-1]
+
+            env._reset_step = recording_reset_step
+
+            observation = env.reset()
+            self.assertEqual(len(responses), 2)
+            self.assertFalse(responses[0]['dataset_is_ready'])
+            self.assertIsInstance(responses[-1], tuple)
+            self.assertTrue(env.observation_space.contains(observation))
+
+            for i in range(2):
+                env.step(env.action_space.sample())
+                observation = env.reset()
+                self.assertEqual(len(responses), 3 + i)
+                self.assertIsInstance(responses[-1], tuple)
+                self.assertTrue(env.observation_space.contains(observation))
+
+        finally:
+            env.close()
+
+    def test_in_process_round_trip(self):
+        """
+        Environment with server running in own thread should reset, step and close same way.
+        """
+        env = make_env(port=5705, data_port=4905, in_process=True)
+        try:
+            for i in range(2):
+                observation = env.reset()
+                self.assertTrue(env.observation_space.contains(observation))
+                for j in range(10):
+                    observation, reward, done, info = env.step(env.action_space.sample())
+                    self.assertTrue(env.observation_space.contains(observation))
+                    self.assertIsInstance(info, list)
+
+            self.assertIn('episode', env.get_stat())
+
+        finally:
+            env.close()
+
+        self.assertFalse(env.server.is_alive())
+        self.assertTrue(env.context is None or env.context.closed)
+
+        with self.assertRaises(ValueError):
+            BTgymVecEnv(num_envs=2, in_process=True)
+
+    def test_episode_broker_state(self):
+        """
+        Consecutive episodes should start with same broker state, whatever strategy did to broker before.
+        """
+        env = make_env(port=5715, data_port=4915, strategy=BrokerChangingStrategy)
+        try:
+            start_infos = []
+            for i in range(3):
+                env.reset()
+                start_infos.append(env.env_response[-1][-1])
+                for j in range(10):
+                    observation, reward, done, info = env.step(env.action_space.sample())
+                    if done:
+                        # Doubled cash can hit broker value target:
+                        break
+
+                self.assertNotEqual(info[-1]['broker_cash'], start_infos[-1]['broker_cash'])
+
+            for info in start_infos[1:]:
+                self.assertEqual(info['broker_cash'], start_infos[0]['broker_cash'])
+                self.assertEqual(info['broker_value'], start_infos[0]['broker_value'])
+
+        finally:
+            env.close()
+
+    def test_prepared_episode_reset_data(self):
+        """
+        Episode prepared in background should be discarded once data is reset.
+        """
+        domain = make_sequential_domain()
+        domain.reset(global_step=30, total_steps=60)
+        trial = domain.sample()
+
+        env = make_env(port=5720, data_port=4920, dataset=make_sequential_domain(), prepare_episodes=True)
+        try:
+            env.reset_data()
+            env.reset()
+            for i in range(10):
+                env.step(env.action_space.sample())
+
+            # Next trial is prepared by now, but iteration restarts from other one:
+            env.reset_data(global_step=30, total_steps=60)
+            env.reset()
+            start_time = env.env_response[-1][-1]['time']
+            self.assertTrue(trial.data.index[0] <= start_time <= trial.data.index[-1])
+
+        finally:
+            env.close()
+
+    def test_prepared_trials_order(self):
+        """
+        Trial prepared in background for other sampling configuration should not be skipped.
+        """
+        env = make_env(
+            port=5725,
+            data_port=4925,
+            dataset=make_sequential_domain(),
+            strategy=TrialInfoStrategy,
+            prepare_episodes=True,
+        )
+        try:
+            env.reset_data()
+            trial_nums = []
+            for i in range(6):
+                # Every other reset comes with episode sampling configuration changed:
+                env.reset(episode_config=dict(b_alpha=1 + i % 2))
+                trial_nums.append(env.env_response[-1][-1]['trial_num'])
+                for j in range(5):
+                    env.step(env.action_space.sample())
+
+            self.assertEqual(trial_nums, list(range(trial_nums[0], trial_nums[0] + 6)))
+
+        finally:
+            env.close()
+
+
+class VecEnvTest(unittest.TestCase):
+    """Testing vectorized environment"""
+
+    def assertStacked(self, observations, indices, envs):
+        self.assertEqual(observations['raw_state'].shape[0], len(indices))
+        for row, index in enumerate(indices):
+            self.assertTrue(np.array_equal(observations['raw_state'][row], envs[index].env_response[0]['raw_state']))
+
+    def test_stacking_order(self):
+        """
+        Observations should be stacked in order environments were given, whatever order replies arrive in.
+        """
+        vec_env = BTgymVecEnv(
+            num_envs=3,
+            filename=filename,
+            episode_duration={'days': 1, 'hours': 0, 'minutes': 0},
+            render_enabled=False,
+            verbose=0,
+            port=5710,
+            data_port=4910,
+        )
+        try:
+            # Data slave goes first, data master resets data meanwhile:
+            for indices in [[2, 0], [1], [0, 1, 2]]:
+                with self.subTest(indices=indices):
+                    observations = vec_env.reset_at(indices)
+                    self.assertStacked(observations, indices, vec_env.envs)
+                    space = vec_env.observation_space.spaces['raw_state']
+                    self.assertTrue(all(space.contains(observation) for observation in observations['raw_state']))
+
+            for i in range(5):
+                observations, rewards, dones, infos = vec_env.step(
+                    [vec_env.action_space.sample() for env in vec_env.envs]
+                )
+                self.assertStacked(observations, [0, 1, 2], vec_env.envs)
+                self.assertEqual((rewards.shape, dones.shape, len(infos)), ((3,), (3,), 3))
+                self.assertEqual(list(rewards), [env.env_response[1] for env in vec_env.envs])
+
+            # Nested observations keep structure:
+            stacked = BTgymVecEnv._stack([dict(a=np.zeros(2) + i, b=dict(c=np.ones((2, 2)) * i)) for i in range(3)])
+            self.assertEqual((stacked['a'].shape, stacked['b']['c'].shape), ((3, 2), (3, 2, 2)))
+            self.assertEqual(list(stacked['b']['c'][:, 0, 0]), [0, 1, 2])
+
+        finally:
+            vec_env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()